@@ -0,0 +1,340 @@
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [TelegramClient] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class TokenBucket:
+    """
+    Classic token bucket; `reserve()` takes one token and returns how long
+    the caller must wait for it (tokens may go negative, which queues the
+    callers in order instead of letting them race).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        # Depois de um 429, `_updated` fica no fim do bloqueio: o bucket só volta a encher a partir dali
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        self._tokens -= 1
+        wait = (0.0 if self._tokens >= 0 else -self._tokens / self.rate) + (self._updated - now)
+        return max(wait, self._blocked_until - now)
+
+    def block(self, now: float, seconds: float):
+        """
+        Honours a 429 `retry_after`: nothing goes out before it expires, and
+        the bucket restarts empty at that moment, so the callers queued
+        during the block are spaced at `rate` instead of firing together.
+        """
+        until = now + seconds
+        self._blocked_until = max(self._blocked_until, until)
+        if until > self._updated:
+            # Reservas já feitas continuam devendo (tokens < 0); o saldo positivo é descartado
+            self._tokens = min(0.0, self._tokens)
+            self._updated = until
+
+
+class TelegramRateLimiter:
+    """
+    Bot API limits shared by every sender (sync and async) of every process.
+
+    - global:  ~30 messages/second per bot
+    - groups/channels (chat_id starting with '-'): 20 messages/minute each
+    - private chats: ~1 message/second each
+
+    ML, Amazon, Kabum and Shopee run as separate PM2 processes and post to
+    the same group, so the buckets live in the state store (`rate_buckets`)
+    and every reservation is one short SQLite write transaction: the
+    combined rate to a chat stays under the limit no matter which process
+    sends. If the store fails the limiter falls back to in-process buckets.
+
+    Env knobs:
+    - TELEGRAM_GLOBAL_RATE     (default: 30)   => msgs/second per bot
+    - TELEGRAM_GROUP_PER_MIN   (default: 20)   => msgs/minute per group/channel
+    - TELEGRAM_PRIVATE_RATE    (default: 1)    => msgs/second per private chat
+    - TELEGRAM_RATE_SHARED     (default: true) => share the buckets across processes
+    """
+
+    def __init__(self, store=None):
+        self.global_rate = max(0.1, _env_float("TELEGRAM_GLOBAL_RATE", 30.0))
+        self.group_rate = max(0.1, _env_float("TELEGRAM_GROUP_PER_MIN", 20.0)) / 60.0
+        self.private_rate = max(0.1, _env_float("TELEGRAM_PRIVATE_RATE", 1.0))
+        self.shared = os.getenv("TELEGRAM_RATE_SHARED", "true").lower() == "true"
+        self._store = store
+        self._lock = threading.Lock()
+        self._local = {}
+
+    @staticmethod
+    def _bot_id(bot_token) -> str:
+        # Só o id numérico do bot (antes do ':') vai para o banco
+        return (bot_token or "").split(":", 1)[0] or "*"
+
+    def _buckets(self, chat_id, bot_token):
+        """(key, rate, capacity) of the buckets a send to `chat_id` draws from."""
+        bot = self._bot_id(bot_token)
+        buckets = [(f"telegram:{bot}", self.global_rate, self.global_rate)]
+        if chat_id is not None:
+            key = str(chat_id)
+            if key.startswith("-"):
+                # Grupos: permite uma pequena rajada e depois 20/min
+                buckets.append((f"telegram:{bot}:{key}", self.group_rate, 3))
+            else:
+                buckets.append((f"telegram:{bot}:{key}", self.private_rate, 1))
+        return buckets
+
+    def _shared_store(self):
+        if not self.shared:
+            return None
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def _local_bucket(self, key, rate, capacity):
+        bucket = self._local.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            self._local[key] = bucket
+        return bucket
+
+    def _fallback(self, e):
+        log(f"Limite compartilhado indisponível, usando só o deste processo: {e}")
+        self.shared = False
+
+    def reserve(self, chat_id=None, bot_token=None) -> float:
+        """Seconds to wait before sending to `chat_id` (None = global only)."""
+        buckets = self._buckets(chat_id, bot_token)
+        store = self._shared_store()
+        if store is not None:
+            try:
+                return store.reserve_tokens(buckets)
+            except Exception as e:
+                self._fallback(e)
+        with self._lock:
+            now = time.monotonic()
+            return max(self._local_bucket(*bucket).reserve(now) for bucket in buckets)
+
+    def retry_after(self, chat_id, seconds: float, bot_token=None):
+        """Pauses the chat (or the whole bot when `chat_id` is None) for `seconds`."""
+        key, rate, capacity = self._buckets(chat_id, bot_token)[-1]
+        store = self._shared_store()
+        if store is not None:
+            try:
+                store.block_bucket(key, time.time() + seconds)
+                return
+            except Exception as e:
+                self._fallback(e)
+        with self._lock:
+            self._local_bucket(key, rate, capacity).block(time.monotonic(), seconds)
+
+
+class TelegramMetrics:
+    """
+    Queue depth (callers waiting on the rate limiter or in flight) and send
+    latency of the Bot API calls, logged every TELEGRAM_METRICS_EVERY calls.
+    """
+
+    def __init__(self):
+        self.every = max(0, _env_int("TELEGRAM_METRICS_EVERY", 50))
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+
+    def enter(self):
+        with self._lock:
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+
+    def leave(self, latency: float, ok: bool):
+        with self._lock:
+            self.depth -= 1
+            self._latencies.append(latency)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            due = self.every and (self.sent + self.failed) % self.every == 0
+        if due:
+            log(self.summary())
+
+    def note_throttled(self):
+        with self._lock:
+            self.throttled += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            p50 = latencies[len(latencies) // 2] if latencies else 0.0
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+            return {
+                "queue_depth": self.depth,
+                "max_queue_depth": self.max_depth,
+                "sent": self.sent,
+                "failed": self.failed,
+                "throttled": self.throttled,
+                "latency_p50": p50,
+                "latency_p95": p95,
+            }
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return (
+            f"fila={s['queue_depth']} (máx {s['max_queue_depth']}) enviados={s['sent']} "
+            f"falhas={s['failed']} 429={s['throttled']} "
+            f"latência p50={s['latency_p50']:.2f}s p95={s['latency_p95']:.2f}s"
+        )
+
+
+_LIMITER = TelegramRateLimiter()
+_METRICS = TelegramMetrics()
+
+
+def get_rate_limiter() -> TelegramRateLimiter:
+    return _LIMITER
+
+
+def get_metrics() -> TelegramMetrics:
+    return _METRICS
+
+
+def retry_after_seconds(payload, default: float = 1.0) -> float:
+    """`parameters.retry_after` of a 429 response body."""
+    try:
+        return float(payload["parameters"]["retry_after"])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+class TelegramClient:
+    """
+    Bot API client over one keep-alive session.
+
+    Every call waits for the shared token buckets, and a `429 Too Many
+    Requests` is retried after its `retry_after` (the chat, or the whole bot,
+    is paused for that long so other senders back off too). 5xx/network
+    errors are retried with a short exponential backoff.
+
+    Env knobs:
+    - TELEGRAM_MAX_RETRIES     (default: 3)
+    - TELEGRAM_TIMEOUT_SECONDS (default: 30)
+    """
+
+    def __init__(self, bot_token: str):
+        self.bot_token = bot_token
+        self.api = f"https://api.telegram.org/bot{bot_token}"
+        self.max_retries = max(0, _env_int("TELEGRAM_MAX_RETRIES", 3))
+        self.timeout = max(1, _env_int("TELEGRAM_TIMEOUT_SECONDS", 30))
+        self.limiter = get_rate_limiter()
+        self.metrics = get_metrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+
+    def call(self, method: str, data=None, files=None, params=None, chat_id=None, timeout=None):
+        """
+        POSTs (GET when only `params`) to a Bot API method. Returns the
+        decoded JSON on HTTP 200, otherwise None. `chat_id` selects the
+        per-chat bucket (defaults to data['chat_id']).
+        """
+        if chat_id is None and data:
+            chat_id = data.get("chat_id")
+        timeout = timeout or self.timeout
+
+        self.metrics.enter()
+        started = time.monotonic()
+        ok = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                wait = self.limiter.reserve(chat_id, self.bot_token)
+                if wait > 0:
+                    time.sleep(wait)
+                if files:
+                    # Reenvio de upload: volta o arquivo para o início
+                    for value in files.values():
+                        handle = value[1] if isinstance(value, tuple) else value
+                        if hasattr(handle, "seek"):
+                            handle.seek(0)
+                try:
+                    if data is None and files is None:
+                        response = self.session.get(f"{self.api}/{method}", params=params, timeout=timeout)
+                    else:
+                        response = self.session.post(
+                            f"{self.api}/{method}", data=data, files=files, params=params, timeout=timeout
+                        )
+                except requests.RequestException as e:
+                    if attempt < self.max_retries:
+                        time.sleep(min(2 ** attempt, 10))
+                        continue
+                    log(f"{method} falhou: {e}")
+                    return None
+
+                if response.status_code == 200:
+                    ok = True
+                    return response.json()
+                if response.status_code == 429 and attempt < self.max_retries:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = None
+                    seconds = retry_after_seconds(body)
+                    self.metrics.note_throttled()
+                    self.limiter.retry_after(chat_id, seconds, self.bot_token)
+                    log(f"{method}: 429 no chat {chat_id}, aguardando {seconds:.0f}s")
+                    continue
+                if response.status_code >= 500 and attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, 10))
+                    continue
+                log(f"{method} HTTP {response.status_code}: {response.text[:200]}")
+                return None
+            return None
+        finally:
+            self.metrics.leave(time.monotonic() - started, ok)
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(bot_token: str) -> TelegramClient:
+    """Shared client per bot token."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(bot_token)
+        if client is None:
+            client = TelegramClient(bot_token)
+            _CLIENTS[bot_token] = client
+        return client
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [PhotoRelay] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# CDNs de imagem das lojas que o Telegram consegue baixar sozinho (sem bloqueio de bot)
+DEFAULT_URL_HOSTS = (
+    "m.media-amazon.com",
+    "images-na.ssl-images-amazon.com",
+    "http2.mlstatic.com",
+    "images.kabum.com.br",
+    "down-br.img.susercontent.com",
+    "cf.shopee.com.br",
+)
+
+# Limite do Bot API para fotos enviadas por upload
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+
+
+def url_hosts() -> tuple:
+    """
+    Hosts whose image URLs are handed to Telegram as-is.
+
+    Env knobs:
+    - TELEGRAM_URL_PHOTO_HOSTS (comma-separated; replaces the default CDN list)
+    """
+    configured = os.getenv("TELEGRAM_URL_PHOTO_HOSTS", "")
+    hosts = [h.strip().lower() for h in configured.split(",") if h.strip()]
+    return tuple(hosts) if hosts else DEFAULT_URL_HOSTS
+
+
+def fetchable_by_telegram(image_url: str) -> bool:
+    """True when `image_url` is on a known host (or a subdomain of one)."""
+    try:
+        host = urlparse(image_url).netloc.lower().split(":")[0]
+    except Exception:
+        return False
+    return any(host == known or host.endswith("." + known) for known in url_hosts())
+
+
+def photo_limits() -> dict:
+    """
+    Timeouts and size cap for relaying an image that Telegram cannot fetch.
+
+    Env knobs:
+    - TELEGRAM_PHOTO_CONNECT_TIMEOUT_SECONDS (default: 5)
+    - TELEGRAM_PHOTO_READ_TIMEOUT_SECONDS    (default: 15)
+    - TELEGRAM_PHOTO_MAX_BYTES               (default: 10 MB, the Bot API limit)
+    - TELEGRAM_PHOTO_BUFFER_BYTES            (default: 1 MB) => kept in memory, rest spills to disk
+    """
+    return {
+        "connect_timeout": max(1, _env_int("TELEGRAM_PHOTO_CONNECT_TIMEOUT_SECONDS", 5)),
+        "read_timeout": max(1, _env_int("TELEGRAM_PHOTO_READ_TIMEOUT_SECONDS", 15)),
+        "max_bytes": max(1, min(_env_int("TELEGRAM_PHOTO_MAX_BYTES", TELEGRAM_PHOTO_MAX_BYTES), TELEGRAM_PHOTO_MAX_BYTES)),
+        "buffer_bytes": max(64 * 1024, _env_int("TELEGRAM_PHOTO_BUFFER_BYTES", 1024 * 1024)),
+    }
+
+
+def largest_file_id(payload):
+    """file_id of the biggest size in a sendPhoto response, or None."""
+    try:
+        sizes = payload["result"]["photo"]
+        return max(sizes, key=lambda size: size.get("width", 0) * size.get("height", 0))["file_id"]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class FileIdCache:
+    """
+    Telegram `file_id` of every image URL already sent, per bot.
+
+    A cached id is re-sent instead of the URL/bytes, so reposts and sends
+    to other chats never move the image again. Entries live in the state
+    store (`telegram_file_ids`) and are shared by the scraper processes.
+    Product images are rarely reused after a few weeks, so stored entries
+    past the TTL are pruned (at most once an hour, on `put`) and the
+    in-process copy is a bounded LRU.
+
+    Env knobs:
+    - TELEGRAM_FILE_ID_TTL_DAYS      (default: 30)
+    - TELEGRAM_FILE_ID_MEMORY_ITEMS  (default: 2048) => entries kept in memory
+    """
+
+    def __init__(self, store=None):
+        self._store = store or get_store()
+        self.ttl = max(1, _env_int("TELEGRAM_FILE_ID_TTL_DAYS", 30)) * 86400
+        self.memory_items = max(1, _env_int("TELEGRAM_FILE_ID_MEMORY_ITEMS", 2048))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _remember(self, key, file_id):
+        with self._lock:
+            self._memory[key] = file_id
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        try:
+            removed = self._store.prune_file_ids(now - self.ttl)
+        except Exception as e:
+            log(f"Erro ao limpar cache de file_id: {e}")
+            return
+        if removed:
+            log(f"{removed} file_id(s) antigos removidos do cache")
+
+    @staticmethod
+    def _bot_id(bot_token: str) -> str:
+        # O id numérico do bot (antes do ':') identifica o dono do file_id sem gravar o token
+        return (bot_token or "").split(":", 1)[0]
+
+    def get(self, bot_token: str, image_url: str):
+        key = (self._bot_id(bot_token), image_url)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        try:
+            file_id = self._store.get_file_id(*key)
+        except Exception as e:
+            log(f"Erro ao ler cache de file_id: {e}")
+            return None
+        if file_id:
+            self._remember(key, file_id)
+        return file_id
+
+    def put(self, bot_token: str, image_url: str, file_id: str):
+        if not file_id:
+            return
+        key = (self._bot_id(bot_token), image_url)
+        self._remember(key, file_id)
+        try:
+            self._store.put_file_id(key[0], key[1], file_id)
+        except Exception as e:
+            log(f"Erro ao gravar cache de file_id: {e}")
+        self._prune()
+
+    def forget(self, bot_token: str, image_url: str):
+        """Drops an id Telegram refused (expired/foreign file_id)."""
+        key = (self._bot_id(bot_token), image_url)
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            self._store.forget_file_id(*key)
+        except Exception as e:
+            log(f"Erro ao remover file_id do cache: {e}")
+
+
+_CACHE = None
+
+
+def get_file_id_cache() -> FileIdCache:
+    """Process-wide cache (created on first use)."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = FileIdCache()
+    return _CACHE
@@ -1,11 +1,91 @@
 import requests
 import os
+import tempfile
 from datetime import datetime
 
+from Telegram.client import get_client
+from Telegram.photo_relay import fetchable_by_telegram, get_file_id_cache, largest_file_id, photo_limits
+
 def log(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {message}")
 
+# Sessão só para baixar imagens; chamadas ao Bot API passam pelo cliente compartilhado
+_HTTP = requests.Session()
+
+def _post_photo(bot_token, chat_id, message, photo=None, files=None):
+    """sendPhoto com file_id/URL (photo) ou upload (files); retorna o JSON da resposta ou None"""
+    data = {
+        'chat_id': chat_id,
+        'caption': message,
+        'parse_mode': 'Markdown'
+    }
+    if photo:
+        data['photo'] = photo
+    return get_client(bot_token).call('sendPhoto', data=data, files=files, timeout=60)
+
+def _download_image(image_url):
+    """
+    Baixa a imagem em streaming para um buffer limitado (memória até
+    TELEGRAM_PHOTO_BUFFER_BYTES, depois disco), com timeouts e teto de tamanho.
+    Retorna o arquivo posicionado no início ou None.
+    """
+    limits = photo_limits()
+    buffer = tempfile.SpooledTemporaryFile(max_size=limits['buffer_bytes'])
+    try:
+        with _HTTP.get(image_url, stream=True, timeout=(limits['connect_timeout'], limits['read_timeout'])) as response:
+            response.raise_for_status()
+            declared = int(response.headers.get('Content-Length') or 0)
+            if declared > limits['max_bytes']:
+                log(f"Imagem grande demais para o Telegram ({declared} bytes): {image_url}")
+                buffer.close()
+                return None
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > limits['max_bytes']:
+                    log(f"Imagem passou de {limits['max_bytes']} bytes, abortando: {image_url}")
+                    buffer.close()
+                    return None
+                buffer.write(chunk)
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        buffer.close()
+        raise
+
+def send_telegram_photo(message, image_url, bot_token, chat_id):
+    """
+    Envia a foto sem mover os bytes quando possível:
+    1. file_id já conhecido para a URL (cache por bot);
+    2. URL direto, se o host é um CDN que o Telegram consegue baixar;
+    3. download em streaming + upload.
+    O file_id retornado fica em cache para os próximos envios.
+    """
+    cache = get_file_id_cache()
+
+    file_id = cache.get(bot_token, image_url)
+    if file_id:
+        if _post_photo(bot_token, chat_id, message, photo=file_id):
+            return True
+        cache.forget(bot_token, image_url)
+
+    if fetchable_by_telegram(image_url):
+        result = _post_photo(bot_token, chat_id, message, photo=image_url)
+        if result:
+            cache.put(bot_token, image_url, largest_file_id(result))
+            return True
+
+    image = _download_image(image_url)
+    if image is None:
+        return False
+    with image:
+        result = _post_photo(bot_token, chat_id, message, files={'photo': ('image.jpg', image)})
+    if result:
+        cache.put(bot_token, image_url, largest_file_id(result))
+        return True
+    return False
+
 def send_telegram_message(message, image_url=None, bot_token=None, chat_id=None):
     """
     Envia mensagem para o Telegram via URL da imagem
@@ -15,31 +95,25 @@ def send_telegram_message(message, image_url=None, bot_token=None, chat_id=None)
         return False
 
     try:
-        # Envio com imagem (URL)
+        # Envio com imagem (file_id em cache, URL ou upload)
         if image_url:
-            response = requests.post(
-                f'https://api.telegram.org/bot{bot_token}/sendPhoto',
-                data={
-                    'chat_id': chat_id,
-                    'caption': message,
-                    'parse_mode': 'Markdown'
-                },
-                files={'photo': requests.get(image_url).content}
-            )
-            if response.status_code == 200:
-                return True
+            try:
+                if send_telegram_photo(message, image_url, bot_token, chat_id):
+                    return True
+            except Exception as e:
+                log(f"Erro ao enviar foto para Telegram, enviando só o texto: {str(e)}")
 
         # Envio apenas texto
-        response = requests.post(
-            f'https://api.telegram.org/bot{bot_token}/sendMessage',
+        response = get_client(bot_token).call(
+            'sendMessage',
             data={
                 'chat_id': chat_id,
                 'text': message,
                 'parse_mode': 'Markdown'
             }
         )
-        return response.status_code == 200
+        return response is not None
 
     except Exception as e:
         log(f"Erro ao enviar para Telegram: {str(e)}")
-        return False
\ No newline at end of file
+        return False
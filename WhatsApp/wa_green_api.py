@@ -1,65 +1,213 @@
 import requests
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
-import base64
 from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from state.store import get_store
+from Telegram.client import TokenBucket
 from Telegram.tl_enviar import send_telegram_message
 
 def log(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {message}")
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Mapeia extensões para tipos MIME
+MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'mp4': 'video/mp4',
+    'avi': 'video/x-msvideo',
+    'mov': 'video/quicktime'
+}
+
+# Erros em que a Green-API não chegou a processar o pedido: seguro repetir
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class GreenAPIRateLimiter:
+    """
+    Send rate of one Green-API instance, shared by every process that uses
+    it (the buckets live in the state store, like the Telegram ones; if the
+    store fails the limiter falls back to an in-process bucket).
+
+    Env knobs:
+    - GREEN_API_RATE        (default: 1)    => messages/second per instance
+    - GREEN_API_BURST       (default: 3)
+    - GREEN_API_RATE_SHARED (default: true) => share the bucket across processes
+    """
+
+    def __init__(self, store=None):
+        self.rate = max(0.1, _env_float("GREEN_API_RATE", 1.0))
+        self.burst = max(1.0, _env_float("GREEN_API_BURST", 3.0))
+        self.shared = os.getenv("GREEN_API_RATE_SHARED", "true").lower() == "true"
+        self._store = store
+        self._lock = threading.Lock()
+        self._local = {}
+
+    def _shared_store(self):
+        if not self.shared:
+            return None
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def _local_bucket(self, key):
+        bucket = self._local.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._local[key] = bucket
+        return bucket
+
+    def _fallback(self, e):
+        log(f"Limite compartilhado da Green-API indisponível, usando só o deste processo: {e}")
+        self.shared = False
+
+    def reserve(self, instance_id) -> float:
+        """Seconds to wait before the next send through `instance_id`."""
+        key = f"greenapi:{instance_id}"
+        store = self._shared_store()
+        if store is not None:
+            try:
+                return store.reserve_tokens([(key, self.rate, self.burst)])
+            except Exception as e:
+                self._fallback(e)
+        with self._lock:
+            return self._local_bucket(key).reserve(time.monotonic())
+
+    def retry_after(self, instance_id, seconds: float):
+        """Pauses every send through `instance_id` for `seconds` (429)."""
+        key = f"greenapi:{instance_id}"
+        store = self._shared_store()
+        if store is not None:
+            try:
+                store.block_bucket(key, time.time() + seconds)
+                return
+            except Exception as e:
+                self._fallback(e)
+        with self._lock:
+            self._local_bucket(key).block(time.monotonic(), seconds)
+
+
+_LIMITER = GreenAPIRateLimiter()
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _get_session(instance_id, pool_size) -> requests.Session:
+    """Keep-alive session shared by every GreenAPI object of the same instance."""
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(instance_id)
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(2, pool_size))
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[instance_id] = session
+        return session
+
+
 class GreenAPI:
-    def __init__(self, instance_id=None, api_token=None, phone_number=None):
+    """
+    Green-API client over one keep-alive session per instance.
+
+    A message goes to the destinations in parallel (at most
+    GREEN_API_CONCURRENCY at a time), each send drawing from the instance's
+    rate limit. Media is downloaded once and uploaded once
+    (SendFileByUpload to the first destination); the other destinations
+    get the file Green-API returned (SendFileByUrl), so the image is not
+    fetched again per destination.
+
+    Env knobs:
+    - GREEN_API_URL             (default: https://api.green-api.com)
+    - GREEN_API_MEDIA_URL       (default: https://media.green-api.com) => uploads
+    - GREEN_API_CONCURRENCY     (default: 3)
+    - GREEN_API_TIMEOUT_SECONDS (default: 20)
+    - GREEN_API_UPLOAD_TIMEOUT_SECONDS (default: 60)
+    - GREEN_API_MAX_RETRIES     (default: 2)  => on 429/502/503/504 and connection errors
+    """
+
+    def __init__(self, instance_id=None, api_token=None, phone_number=None, destinations=None):
         """
         Inicializa a API Green-API do WhatsApp
-        
+
         Args:
             instance_id: ID da instância Green-API
             api_token: Token da API Green-API
             phone_number: Número do WhatsApp para envio (ex: 5511999999999)
+            destinations: Destinos (padrão: carregados do .env)
         """
         self.instance_id = instance_id or os.getenv("GREEN_API_INSTANCE_ID")
         self.api_token = api_token or os.getenv("GREEN_API_TOKEN")
         self.phone_number = phone_number or os.getenv("WHATSAPP_PHONE_NUMBER")
-        
+        self.api_url = os.getenv("GREEN_API_URL", "https://api.green-api.com").rstrip("/")
+        self.media_url = os.getenv("GREEN_API_MEDIA_URL", "https://media.green-api.com").rstrip("/")
+        self.concurrency = max(1, _env_int("GREEN_API_CONCURRENCY", 3))
+        self.timeout = max(1, _env_int("GREEN_API_TIMEOUT_SECONDS", 20))
+        self.upload_timeout = max(self.timeout, _env_int("GREEN_API_UPLOAD_TIMEOUT_SECONDS", 60))
+        self.max_retries = max(0, _env_int("GREEN_API_MAX_RETRIES", 2))
+        self.limiter = _LIMITER
+        self.session = _get_session(self.instance_id, self.concurrency)
+
         # Carrega destinos do WhatsApp (grupos e canais)
-        self.whatsapp_destinations = self._load_whatsapp_destinations()
-        
+        load_destinations = destinations is None
+        self.whatsapp_destinations = self._load_whatsapp_destinations() if load_destinations else list(destinations)
+
         if not self.instance_id:
             log("Erro: Instance ID da Green-API não configurado")
             return
-            
+
         if not self.api_token:
             log("Erro: Token da Green-API não configurado")
             return
-            
-        if not self.whatsapp_destinations:
+
+        if load_destinations and not self.whatsapp_destinations:
             log("Erro: Nenhum destino do WhatsApp configurado")
             return
-    
+
     def _load_whatsapp_destinations(self):
         """
         Carrega os destinos do WhatsApp do arquivo .env baseado no modo (teste/produção)
-        
+
         Returns:
             list: Lista de destinos (grupos e canais)
         """
         destinations = []
-        
+
         # Verifica se está em modo de teste
         test_mode = os.getenv("TEST_MODE", "false").lower() == "true"
-        
+
         if test_mode:
             # Modo teste - usa destinos de teste
             log("🔬 Modo teste ativado - usando destinos de teste")
-            
+
             # Carrega grupos de teste
             whatsapp_groups_test = os.getenv("WHATSAPP_GROUPS_TESTE", "")
             if whatsapp_groups_test:
                 destinations.extend(whatsapp_groups_test.split(","))
-            
+
             # Carrega canais de teste
             whatsapp_channels_test = os.getenv("WHATSAPP_CHANNELS_TESTE", "")
             if whatsapp_channels_test:
@@ -67,185 +215,238 @@ class GreenAPI:
         else:
             # Modo produção - usa destinos de produção
             log("🚀 Modo produção ativado - usando destinos de produção")
-            
+
             # Carrega grupos de produção
             whatsapp_groups = os.getenv("WHATSAPP_GROUPS", "")
             if whatsapp_groups:
                 destinations.extend(whatsapp_groups.split(","))
-            
+
             # Carrega canais de produção
             whatsapp_channels = os.getenv("WHATSAPP_CHANNELS", "")
             if whatsapp_channels:
                 destinations.extend(whatsapp_channels.split(","))
-        
+
         # Remove espaços em branco
         destinations = [dest.strip() for dest in destinations if dest.strip()]
-        
+
         mode_text = "TESTE" if test_mode else "PRODUÇÃO"
         log(f"Destinos WhatsApp carregados ({mode_text}): {len(destinations)} destinos")
         return destinations
-    
+
+    def call(self, method, payload=None, data=None, files=None, http_method="POST", host=None,
+             timeout=None, limited=False):
+        """
+        Calls a Green-API method over the pooled session. Returns the decoded
+        JSON on HTTP 200, otherwise None. `limited` sends draw from the
+        instance's rate limit; 429/502/503/504 and connection errors are
+        retried with backoff (a read timeout is not: the message may have
+        gone out).
+        """
+        url = f"{host or self.api_url}/waInstance{self.instance_id}/{method}/{self.api_token}"
+        timeout = (5, timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                wait = self.limiter.reserve(self.instance_id)
+                if wait > 0:
+                    time.sleep(wait)
+            try:
+                if http_method == "GET":
+                    response = self.session.get(url, timeout=timeout)
+                else:
+                    response = self.session.post(url, json=payload, data=data, files=files, timeout=timeout)
+            except requests.ConnectionError as e:
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, 10))
+                    continue
+                log(f"{method} falhou: {str(e)}")
+                return None
+            except requests.RequestException as e:
+                log(f"{method} falhou: {str(e)}")
+                return None
+
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError:
+                    log(f"{method}: resposta inválida da Green-API: {response.text[:200]}")
+                    return None
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = min(2 ** attempt, 10)
+                if response.status_code == 429:
+                    try:
+                        delay = float(response.headers.get("Retry-After", delay))
+                    except ValueError:
+                        pass
+                    # Pausa a instância inteira, não só esta thread
+                    self.limiter.retry_after(self.instance_id, delay)
+                    log(f"{method}: 429 da Green-API, aguardando {delay:.0f}s")
+                if not limited or response.status_code != 429:
+                    time.sleep(delay)
+                continue
+            log(f"{method} HTTP {response.status_code}: {response.text[:200]}")
+            return None
+        return None
+
+    def fan_out(self, fn, items) -> dict:
+        """`{item: fn(item)}`, running at most GREEN_API_CONCURRENCY calls at a time."""
+        items = list(items)
+        workers = min(self.concurrency, len(items))
+        if workers <= 1:
+            return {item: fn(item) for item in items}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(items, executor.map(fn, items)))
+
+    def _sent(self, result, destination, what) -> bool:
+        if result and result.get("idMessage"):
+            log(f"{what} enviada com sucesso para {destination}")
+            return True
+        if result is not None:
+            log(f"Erro na resposta da Green-API para {destination}: {result}")
+        else:
+            log(f"Erro ao enviar {what.lower()} para {destination}")
+        return False
+
+    def _report(self, results, what) -> bool:
+        success_count = sum(1 for ok in results.values() if ok)
+        if success_count > 0:
+            log(f"{what} enviada com sucesso para {success_count}/{len(results)} destinos")
+            return True
+        log(f"Falha ao enviar {what.lower()} para todos os destinos")
+        return False
+
     def send_text_message(self, message):
         """
         Envia mensagem de texto via WhatsApp usando Green-API para múltiplos destinos
-        
+
         Args:
             message: Texto da mensagem
-            
+
         Returns:
             bool: True se enviado com sucesso para pelo menos um destino, False caso contrário
         """
         if not self.instance_id or not self.api_token or not self.whatsapp_destinations:
             log("Erro: Configuração incompleta da Green-API")
             return False
-        
-        success_count = 0
-        total_destinations = len(self.whatsapp_destinations)
-        
-        for destination in self.whatsapp_destinations:
+
+        def send(destination):
             try:
-                url = f"https://api.green-api.com/waInstance{self.instance_id}/SendMessage/{self.api_token}"
-                
-                payload = {
-                    "chatId": destination,
-                    "message": message
-                }
-                
-                headers = {
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(url, json=payload, headers=headers)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("idMessage"):
-                        log(f"Mensagem enviada com sucesso para {destination}")
-                        success_count += 1
-                    else:
-                        log(f"Erro na resposta da Green-API para {destination}: {result}")
-                else:
-                    log(f"Erro ao enviar mensagem para {destination}: {response.status_code} - {response.text}")
-                    
+                result = self.call("SendMessage", {"chatId": destination, "message": message}, limited=True)
             except Exception as e:
                 log(f"Erro ao enviar mensagem para {destination}: {str(e)}")
-        
-        if success_count > 0:
-            log(f"Mensagem enviada com sucesso para {success_count}/{total_destinations} destinos")
-            return True
-        else:
-            log("Falha ao enviar mensagem para todos os destinos")
-            return False
-    
+                return False
+            return self._sent(result, destination, "Mensagem")
+
+        return self._report(self.fan_out(send, self.whatsapp_destinations), "Mensagem")
+
+    def _download(self, media_url):
+        """Media bytes, or None when the download fails."""
+        try:
+            response = self.session.get(media_url, timeout=(5, self.upload_timeout))
+        except requests.RequestException as e:
+            log(f"Erro ao baixar mídia {media_url}: {str(e)}")
+            return None
+        if response.status_code != 200 or not response.content:
+            log(f"Erro ao baixar mídia {media_url}: HTTP {response.status_code}")
+            return None
+        return response.content
+
     def send_media_message(self, message, media_url):
         """
-        Envia mensagem com mídia via WhatsApp usando Green-API para múltiplos destinos
-        
+        Envia mensagem com mídia via WhatsApp usando Green-API para múltiplos destinos.
+        A mídia é enviada uma vez (SendFileByUpload) e o arquivo devolvido pela
+        Green-API é reaproveitado para os demais destinos.
+
         Args:
             message: Texto da mensagem
             media_url: URL da imagem/vídeo
-            
+
         Returns:
             bool: True se enviado com sucesso para pelo menos um destino, False caso contrário
         """
         if not self.instance_id or not self.api_token or not self.whatsapp_destinations:
             log("Erro: Configuração incompleta da Green-API")
             return False
-        
-        success_count = 0
-        total_destinations = len(self.whatsapp_destinations)
-        
-        for destination in self.whatsapp_destinations:
+
+        # Determina o tipo de mídia baseado na URL
+        file_extension = urlparse(media_url).path.split('.')[-1].lower()
+        mime_type = MIME_TYPES.get(file_extension, 'image/jpeg')
+        file_name = f"image.{file_extension}"
+
+        results = {}
+        remaining = list(self.whatsapp_destinations)
+        file_url = media_url
+
+        content = self._download(media_url)
+        if content is not None:
+            first = remaining.pop(0)
             try:
-                # Determina o tipo de mídia baseado na URL
-                parsed_url = urlparse(media_url)
-                file_extension = parsed_url.path.split('.')[-1].lower()
-                
-                # Mapeia extensões para tipos MIME
-                mime_types = {
-                    'jpg': 'image/jpeg',
-                    'jpeg': 'image/jpeg',
-                    'png': 'image/png',
-                    'gif': 'image/gif',
-                    'webp': 'image/webp',
-                    'mp4': 'video/mp4',
-                    'avi': 'video/x-msvideo',
-                    'mov': 'video/quicktime'
-                }
-                
-                mime_type = mime_types.get(file_extension, 'image/jpeg')
-                
-                url = f"https://api.green-api.com/waInstance{self.instance_id}/SendFileByUrl/{self.api_token}"
-                
-                payload = {
-                    "chatId": destination,
-                    "urlFile": media_url,
-                    "fileName": f"image.{file_extension}",
-                    "caption": message
-                }
-                
-                headers = {
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(url, json=payload, headers=headers)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("idMessage"):
-                        log(f"Mídia enviada com sucesso para {destination}")
-                        success_count += 1
-                    else:
-                        log(f"Erro na resposta da Green-API para {destination}: {result}")
-                else:
-                    log(f"Erro ao enviar mídia para {destination}: {response.status_code} - {response.text}")
-                    
+                result = self.call(
+                    "SendFileByUpload",
+                    data={"chatId": first, "caption": message, "fileName": file_name},
+                    files={"file": (file_name, content, mime_type)},
+                    host=self.media_url,
+                    timeout=self.upload_timeout,
+                    limited=True,
+                )
+            except Exception as e:
+                log(f"Erro ao enviar mídia para {first}: {str(e)}")
+                result = None
+            if result and result.get("idMessage"):
+                results[first] = self._sent(result, first, "Mídia")
+                # Arquivo já hospedado pela Green-API: os demais destinos não baixam de novo
+                file_url = result.get("urlFile") or media_url
+            else:
+                log(f"Upload da mídia falhou para {first}; enviando por URL")
+                remaining.insert(0, first)
+
+        def send(destination):
+            payload = {
+                "chatId": destination,
+                "urlFile": file_url,
+                "fileName": file_name,
+                "caption": message
+            }
+            try:
+                result = self.call("SendFileByUrl", payload, limited=True)
             except Exception as e:
                 log(f"Erro ao enviar mídia para {destination}: {str(e)}")
-        
-        if success_count > 0:
-            log(f"Mídia enviada com sucesso para {success_count}/{total_destinations} destinos")
-            return True
-        else:
-            log("Falha ao enviar mídia para todos os destinos")
-            return False
-    
+                return False
+            return self._sent(result, destination, "Mídia")
+
+        if remaining:
+            results.update(self.fan_out(send, remaining))
+        return self._report(results, "Mídia")
+
     def check_connection(self):
         """
         Verifica se a API está conectada
-        
+
         Returns:
             bool: True se conectado, False caso contrário
         """
         try:
-            url = f"https://api.green-api.com/waInstance{self.instance_id}/getStateInstance/{self.api_token}"
-            
-            response = requests.get(url)
-            
-            if response.status_code == 200:
-                result = response.json()
-                state = result.get("stateInstance")
-                log(f"Status da Green-API: {state}")
-                return state == "authorized"
-            else:
-                log(f"Erro ao verificar status: {response.status_code}")
+            result = self.call("getStateInstance", http_method="GET")
+            if result is None:
                 return False
-                
+            state = result.get("stateInstance")
+            log(f"Status da Green-API: {state}")
+            return state == "authorized"
+
         except Exception as e:
             log(f"Erro ao verificar conexão: {str(e)}")
             return False
-    
+
     def notify_admins_disconnected(self, admin_chat_ids):
         """
         Notifica os admins no Telegram sobre a desconexão do WhatsApp
-        
+
         Args:
             admin_chat_ids: Lista de IDs dos admins no Telegram
         """
         if not admin_chat_ids:
             log("Nenhum admin configurado para notificação")
             return
-        
+
         message = """
 🚨 **ALERTA: WhatsApp Desconectado**
 
@@ -263,9 +464,9 @@ O WhatsApp foi desconectado da Green-API e precisa ser reautorizado.
 
 Os scrapers continuarão funcionando apenas para Telegram até a reconexão.
         """.strip()
-        
+
         bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        
+
         for admin_id in admin_chat_ids:
             try:
                 send_telegram_message(
@@ -276,48 +477,48 @@ Os scrapers continuarão funcionando apenas para Telegram até a reconexão.
                 log(f"Notificação enviada para admin: {admin_id}")
             except Exception as e:
                 log(f"Erro ao notificar admin {admin_id}: {str(e)}")
-    
+
     def verify_and_notify_connection(self, admin_chat_ids=None):
         """
         Verifica conexão e notifica admins se desconectado
-        
+
         Args:
             admin_chat_ids: Lista de IDs dos admins (opcional)
-            
+
         Returns:
             bool: True se conectado, False caso contrário
         """
         is_connected = self.check_connection()
-        
+
         if not is_connected and admin_chat_ids:
             log("WhatsApp desconectado - notificando admins...")
             self.notify_admins_disconnected(admin_chat_ids)
-        
+
         return is_connected
 
 def send_whatsapp_message(message, image_url=None, instance_id=None, api_token=None, phone_number=None):
     """
     Função principal para envio de mensagens via WhatsApp usando Green-API
-    
+
     Args:
         message: Texto da mensagem
         image_url: URL da imagem (opcional)
         instance_id: ID da instância Green-API
         api_token: Token da API Green-API
         phone_number: Número do WhatsApp (obsoleto, agora usa grupos/canais)
-        
+
     Returns:
         bool: True se enviado com sucesso, False caso contrário
     """
     whatsapp = GreenAPI(instance_id, api_token, phone_number)
-    
+
     # Verifica conexão primeiro
     if not whatsapp.check_connection():
         log("Erro: Não foi possível conectar com a Green-API")
         return False
-    
+
     # Envia mensagem com ou sem mídia
     if image_url:
         return whatsapp.send_media_message(message, image_url)
     else:
-        return whatsapp.send_text_message(message) 
\ No newline at end of file
+        return whatsapp.send_text_message(message)
\ No newline at end of file
@@ -0,0 +1 @@
+# Shared browser infrastructure for the scrapers (driver pool, driver cache, page helpers, HTTP fast path).
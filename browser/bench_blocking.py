@@ -0,0 +1,195 @@
+"""
+Compares bytes transferred and page-ready time with and without the
+resource blocking profile.
+
+Usage:
+    python -m browser.bench_blocking ml
+    python -m browser.bench_blocking amazon --urls-file amazon_pages.txt --runs 3
+
+Pages may be live URLs or recorded pages saved to disk (file:///...).
+Byte counts come from the DevTools performance log (Network.loadingFinished),
+so they include every request the page made, not only the HTML.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PROJECT_DIR not in sys.path:
+    sys.path.insert(0, _PROJECT_DIR)
+
+import undetected_chromedriver as uc
+
+from browser.blocking import PROFILES, build_patterns
+from browser.driver_cache import resolve_driver_path
+
+
+SAMPLE_URLS = {
+    "ml": ["https://www.mercadolivre.com.br/ofertas"],
+    "amazon": ["https://www.amazon.com.br/deals"],
+    "kabum": ["https://www.kabum.com.br/ofertas/ofertadodia"],
+    "shopee": ["https://shopee.com.br/flash_sale"],
+}
+
+READY_SELECTORS = {
+    "ml": ".andes-card.poly-card, h1.ui-pdp-title",
+    "amazon": "#productTitle, [data-testid='product-card']",
+    "kabum": "h1, article",
+    "shopee": "body",
+}
+
+_READY_JS = "return document.readyState !== 'loading' && document.querySelector(arguments[0]) !== null;"
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [BenchBlocking] {message}", flush=True)
+
+
+def _new_driver():
+    opts = uc.ChromeOptions()
+    opts.add_argument("--headless=new")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--window-size=1920,1080")
+    opts.add_argument("--lang=pt-BR")
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    browser_executable_path = None
+    if platform.system() == "Linux":
+        for path in ("/usr/bin/google-chrome", "/usr/bin/chromium-browser"):
+            if os.path.exists(path):
+                browser_executable_path = path
+                break
+
+    return uc.Chrome(
+        options=opts,
+        driver_executable_path=resolve_driver_path(browser_executable_path),
+        browser_executable_path=browser_executable_path,
+    )
+
+
+def _network_totals(driver):
+    """Sums encoded bytes and counts blocked requests from the performance log."""
+    total_bytes = 0
+    requests_done = 0
+    blocked = 0
+    for entry in driver.get_log("performance"):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except Exception:
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.loadingFinished":
+            total_bytes += int(params.get("encodedDataLength") or 0)
+            requests_done += 1
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            blocked += 1
+    return total_bytes, requests_done, blocked
+
+
+def _measure(driver, url, selector, timeout):
+    driver.get_log("performance")  # descarta eventos anteriores
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+
+    start = time.time()
+    driver.execute_script("window.location.href = arguments[0];", url)
+    time.sleep(0.2)
+    ready_at = None
+    while time.time() - start < timeout:
+        try:
+            if driver.execute_script(_READY_JS, selector):
+                ready_at = time.time() - start
+                break
+        except Exception:
+            pass
+        time.sleep(0.05)
+
+    # Dá tempo para requisições tardias entrarem na contagem
+    time.sleep(2)
+    total_bytes, requests_done, blocked = _network_totals(driver)
+    return {
+        "ready_seconds": ready_at,
+        "bytes": total_bytes,
+        "requests": requests_done,
+        "blocked": blocked,
+    }
+
+
+def run(profile, urls, runs=1, timeout=30):
+    driver = _new_driver()
+    selector = READY_SELECTORS.get(profile, "body")
+    patterns = build_patterns(profile)
+    results = {"baseline": [], "blocked": []}
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        for mode in ("baseline", "blocked"):
+            blocked_urls = patterns if mode == "blocked" else []
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+            for url in urls:
+                for _ in range(runs):
+                    sample = _measure(driver, url, selector, timeout)
+                    sample["url"] = url
+                    results[mode].append(sample)
+                    log(f"{mode:<8} {sample['bytes'] / 1024:>9.0f} KB "
+                        f"{sample['ready_seconds'] or float('nan'):>6.2f}s  {url}")
+    finally:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    return results
+
+
+def summarize(results):
+    summary = {}
+    for mode, samples in results.items():
+        ready = [s["ready_seconds"] for s in samples if s["ready_seconds"] is not None]
+        summary[mode] = {
+            "pages": len(samples),
+            "median_kb": statistics.median([s["bytes"] for s in samples]) / 1024 if samples else 0,
+            "median_ready_seconds": statistics.median(ready) if ready else None,
+            "median_requests": statistics.median([s["requests"] for s in samples]) if samples else 0,
+            "blocked_requests": sum(s["blocked"] for s in samples),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profile", choices=sorted(PROFILES))
+    parser.add_argument("--urls-file", help="one URL (or file:// recorded page) per line")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("--json", help="write raw samples and summary to this file")
+    args = parser.parse_args()
+
+    urls = SAMPLE_URLS.get(args.profile, [])
+    if args.urls_file:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    results = run(args.profile, urls, runs=args.runs, timeout=args.timeout)
+    summary = summarize(results)
+
+    print()
+    print(f"{'mode':<10}{'pages':>6}{'median KB':>12}{'median ready (s)':>18}{'requests':>10}{'blocked':>9}")
+    for mode, row in summary.items():
+        ready = row["median_ready_seconds"]
+        ready_txt = f"{ready:.2f}" if ready is not None else "-"
+        print(f"{mode:<10}{row['pages']:>6}{row['median_kb']:>12.0f}{ready_txt:>18}"
+              f"{row['median_requests']:>10.0f}{row['blocked_requests']:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"profile": args.profile, "summary": summary, "samples": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
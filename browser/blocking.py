@@ -0,0 +1,137 @@
+import os
+import time
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [Blocking] {message}", flush=True)
+
+
+# Padrões no formato do Network.setBlockedURLs (curinga "*")
+CATEGORIES = {
+    "images": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "fonts": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*", "*.ogg*"],
+    "ads": [
+        "*doubleclick.net*",
+        "*googlesyndication.com*",
+        "*googleadservices.com*",
+        "*amazon-adsystem.com*",
+        "*adnxs.com*",
+        "*criteo.com*",
+        "*criteo.net*",
+        "*taboola.com*",
+        "*outbrain.com*",
+    ],
+    "trackers": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*facebook.net*",
+        "*connect.facebook.com*",
+        "*hotjar.com*",
+        "*clarity.ms*",
+        "*tiktok.com/i18n/pixel*",
+        "*analytics.tiktok.com*",
+        "*bat.bing.com*",
+        "*scorecardresearch.com*",
+        "*newrelic.com*",
+        "*nr-data.net*",
+    ],
+}
+
+# Perfis por varejista. "allow" remove qualquer padrão que contenha um dos trechos.
+PROFILES = {
+    "ml": {
+        "block": ["images", "fonts", "media", "ads", "trackers"],
+        "allow": [],
+        "extra": ["*mercadolivre.com/tracks*", "*mercadolibre.com/tracks*"],
+    },
+    "amazon": {
+        # data-old-hires/src são lidos como atributos; a imagem não precisa carregar
+        "block": ["images", "fonts", "media", "ads", "trackers"],
+        "allow": [],
+        "extra": ["*fls-na.amazon*", "*unagi.amazon*", "*/uedata*"],
+    },
+    "kabum": {
+        # A escolha da imagem no modo Selenium lê width/height renderizados
+        "block": ["fonts", "media", "ads", "trackers"],
+        "allow": [],
+        "extra": [],
+    },
+    "shopee": {
+        "block": ["fonts", "media", "ads", "trackers"],
+        "allow": [],
+        "extra": [],
+    },
+}
+
+
+def blocking_enabled() -> bool:
+    """
+    Env knobs:
+    - BLOCK_RESOURCES        (default: true)
+    - BLOCK_RESOURCES_EXTRA  (comma-separated extra patterns, applied to every profile)
+    - BLOCK_RESOURCES_ALLOW  (comma-separated substrings that must never be blocked)
+    """
+    return os.getenv("BLOCK_RESOURCES", "true").lower() == "true"
+
+
+def _split_env(name: str) -> list:
+    return [p.strip() for p in os.getenv(name, "").split(",") if p.strip()]
+
+
+def build_patterns(profile_name: str) -> list:
+    """Returns the URL patterns blocked for a retailer profile."""
+    profile = PROFILES.get(profile_name, {"block": ["ads", "trackers"], "allow": [], "extra": []})
+    patterns = []
+    for category in profile["block"]:
+        patterns.extend(CATEGORIES.get(category, []))
+    patterns.extend(profile.get("extra", []))
+    patterns.extend(_split_env("BLOCK_RESOURCES_EXTRA"))
+
+    allow = list(profile.get("allow", [])) + _split_env("BLOCK_RESOURCES_ALLOW")
+    result = []
+    for pattern in patterns:
+        if any(a in pattern for a in allow):
+            continue
+        if pattern not in result:
+            result.append(pattern)
+    return result
+
+
+def _apply_patterns(driver, patterns):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def apply_blocking_profile(driver, profile_name: str) -> bool:
+    """
+    Blocks heavy/unneeded requests (images, fonts, video, ads, trackers) via CDP.
+
+    Network.setBlockedURLs is per tab, so a `setup_new_tab` hook is attached
+    to the driver; browser.tabs calls it after opening each new tab.
+    """
+    if not blocking_enabled():
+        return False
+
+    patterns = build_patterns(profile_name)
+    try:
+        _apply_patterns(driver, patterns)
+    except Exception as e:
+        log(f"Não foi possível aplicar bloqueio ({profile_name}): {e}")
+        return False
+
+    previous_hook = getattr(driver, "setup_new_tab", None)
+
+    def setup_new_tab():
+        if previous_hook:
+            previous_hook()
+        try:
+            _apply_patterns(driver, patterns)
+        except Exception as e:
+            log(f"Falha ao aplicar bloqueio na nova aba: {e}")
+
+    driver.setup_new_tab = setup_new_tab
+    log(f"Perfil de bloqueio '{profile_name}' aplicado ({len(patterns)} padrões)")
+    return True
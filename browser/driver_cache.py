@@ -0,0 +1,190 @@
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import time
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [DriverCache] {message}", flush=True)
+
+
+_DRIVER_NAME = "chromedriver.exe" if platform.system() == "Windows" else "chromedriver"
+_META_FILE = "meta.json"
+
+
+def _cache_dir() -> str:
+    """
+    Root folder of the local chromedriver cache.
+
+    Env knobs:
+    - CHROMEDRIVER_CACHE_DIR (default: ~/.cache/afiliados/chromedriver)
+    """
+    default = os.path.join(os.path.expanduser("~"), ".cache", "afiliados", "chromedriver")
+    return os.getenv("CHROMEDRIVER_CACHE_DIR", default)
+
+
+def _browser_candidates(browser_executable_path=None) -> list:
+    candidates = []
+    if browser_executable_path:
+        candidates.append(browser_executable_path)
+    system = platform.system()
+    if system == "Linux":
+        candidates += [
+            "/usr/bin/google-chrome",
+            "/usr/bin/chromium-browser",
+            "/usr/bin/chromium",
+            "/snap/bin/chromium",
+        ]
+    elif system == "Darwin":
+        candidates.append("/Applications/Google Chrome.app/Contents/MacOS/Google Chrome")
+    return candidates
+
+
+def detect_chrome_version(browser_executable_path=None):
+    """
+    Returns the installed Chrome version (e.g. '120.0.6099.109') or None.
+
+    Uses only local commands, so it works offline. Not cached: Chrome
+    auto-updates under long-running scrapers, and a `--version` call per
+    driver launch is cheap.
+    """
+    if platform.system() == "Windows":
+        for root in ("HKEY_CURRENT_USER", "HKEY_LOCAL_MACHINE"):
+            try:
+                out = subprocess.run(
+                    ["reg", "query", rf"{root}\Software\Google\Chrome\BLBeacon", "/v", "version"],
+                    capture_output=True, text=True, timeout=10
+                ).stdout
+                m = re.search(r"(\d+\.\d+\.\d+\.\d+)", out)
+                if m:
+                    return m.group(1)
+            except Exception:
+                continue
+        return None
+
+    for path in _browser_candidates(browser_executable_path):
+        if not os.path.exists(path):
+            continue
+        try:
+            out = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+            m = re.search(r"(\d+\.\d+\.\d+\.\d+)", out)
+            if m:
+                return m.group(1)
+        except Exception:
+            continue
+    return None
+
+
+def _entry_dir(major: str) -> str:
+    return os.path.join(_cache_dir(), major)
+
+
+def _read_meta(entry_dir: str) -> dict:
+    try:
+        with open(os.path.join(entry_dir, _META_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _latest_cached_entry():
+    """Most recent cached driver, used when the Chrome version cannot be detected."""
+    root = _cache_dir()
+    try:
+        majors = sorted((d for d in os.listdir(root) if d.isdigit()), key=int, reverse=True)
+    except FileNotFoundError:
+        return None
+    for major in majors:
+        path = os.path.join(root, major, _DRIVER_NAME)
+        if os.path.exists(path) and _read_meta(os.path.join(root, major)).get("patched"):
+            return path
+    return None
+
+
+def _patch(path: str) -> bool:
+    """Applies the undetected-chromedriver patch once, in place."""
+    try:
+        import undetected_chromedriver as uc
+
+        patcher = uc.Patcher(executable_path=path)
+        if not patcher.is_binary_patched(path):
+            patcher.patch_exe()
+        return patcher.is_binary_patched(path)
+    except Exception as e:
+        log(f"Falha ao aplicar patch no chromedriver: {e}")
+        return False
+
+
+def _seed(major: str, chrome_version) -> str:
+    """Downloads the matching chromedriver, copies it into the cache and patches it."""
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    source = ChromeDriverManager().install()
+    entry_dir = _entry_dir(major)
+    os.makedirs(entry_dir, exist_ok=True)
+    target = os.path.join(entry_dir, _DRIVER_NAME)
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    shutil.copy2(source, tmp_target)
+    os.chmod(tmp_target, 0o755)
+    patched = _patch(tmp_target)
+    os.replace(tmp_target, target)
+
+    meta = {
+        "chrome_version": chrome_version,
+        "source": source,
+        "patched": patched,
+        "seeded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(entry_dir, _META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    log(f"Chromedriver {major} armazenado em cache: {target}")
+    return target
+
+
+_RESOLVED = {}
+
+
+def resolve_driver_path(browser_executable_path=None) -> str:
+    """
+    Returns a patched chromedriver path for the installed Chrome.
+
+    The first call for a given Chrome major version downloads the driver
+    (webdriver-manager) and patches it (undetected-chromedriver); later
+    calls, including in new processes, only stat the cached file. Once
+    seeded it works offline. The Chrome version is read on every call, so
+    after a Chrome update the next launch picks (or seeds) the driver of
+    the new major version instead of the one resolved at startup.
+    """
+    version = detect_chrome_version(browser_executable_path)
+    major = version.split(".")[0] if version else None
+
+    if major in _RESOLVED:
+        return _RESOLVED[major]
+
+    if major:
+        entry_dir = _entry_dir(major)
+        cached = os.path.join(entry_dir, _DRIVER_NAME)
+        if os.path.exists(cached) and _read_meta(entry_dir).get("patched"):
+            _RESOLVED[major] = cached
+            return cached
+        try:
+            path = _seed(major, version)
+            _RESOLVED[major] = path
+            return path
+        except Exception as e:
+            log(f"Não foi possível preparar o chromedriver {major}: {e}")
+            raise
+
+    # Versão do Chrome desconhecida: usa o último driver em cache, senão o webdriver-manager.
+    cached = _latest_cached_entry()
+    if cached:
+        _RESOLVED[major] = cached
+        return cached
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
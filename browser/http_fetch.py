@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [HTTP] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Mesmo user-agent/idioma do Chrome usado pelos scrapers
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(name: str = "default") -> requests.Session:
+    """
+    Returns a keep-alive session shared by every request to the same site.
+
+    Env knobs:
+    - HTTP_POOL_SIZE       (default: 10) => connections kept per host
+    - HTTP_RETRIES         (default: 2)  => retries on connection errors/5xx
+    - HTTP_TIMEOUT_SECONDS (default: 10)
+    """
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(name)
+        if session is None:
+            pool_size = max(1, _env_int("HTTP_POOL_SIZE", 10))
+            retry = Retry(
+                total=max(0, _env_int("HTTP_RETRIES", 2)),
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[name] = session
+        return session
+
+
+def fetch_html(url: str, session_name: str = "default", timeout=None, headers=None):
+    """GETs a page over the pooled session; returns the HTML or None (non-200/network error)."""
+    timeout = timeout or _env_int("HTTP_TIMEOUT_SECONDS", 10)
+    try:
+        response = get_session(session_name).get(url, timeout=timeout, headers=headers)
+    except requests.RequestException as e:
+        log(f"Falha ao buscar {url}: {e}")
+        return None
+    if response.status_code != 200:
+        log(f"HTTP {response.status_code} ao buscar {url}")
+        return None
+    return response.text
+
+
+def parse_tree(html: str):
+    """Parses HTML into an lxml tree (None for empty/unparseable input)."""
+    if not html:
+        return None
+    try:
+        return lxml_html.fromstring(html)
+    except Exception:
+        return None
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def next_data(tree):
+    """Parsed `<script id="__NEXT_DATA__">` payload of a Next.js page, or None."""
+    if tree is None:
+        return None
+    scripts = tree.xpath('//script[@id="__NEXT_DATA__"]/text()')
+    return _loads(scripts[0]) if scripts else None
+
+
+def json_ld_objects(tree) -> list:
+    """Every JSON-LD object of the page, with `@graph` and lists flattened."""
+    if tree is None:
+        return []
+    objects = []
+    for text in tree.xpath('//script[@type="application/ld+json"]/text()'):
+        data = _loads(text)
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                objects.append(item)
+                if isinstance(item.get("@graph"), list):
+                    stack.extend(item["@graph"])
+    return objects
+
+
+def find_json_ld(tree, type_name: str):
+    """First JSON-LD object whose @type is (or includes) `type_name`."""
+    for obj in json_ld_objects(tree):
+        obj_type = obj.get("@type")
+        types = obj_type if isinstance(obj_type, list) else [obj_type]
+        if type_name in types:
+            return obj
+    return None
+
+
+def iter_dicts(obj, max_depth: int = 15):
+    """
+    Walks a JSON payload depth-first, yielding every dict.
+
+    Strings that hold serialized JSON objects (common in Next.js page props)
+    are decoded and walked as well.
+    """
+    stack = [(obj, 0)]
+    while stack:
+        item, depth = stack.pop()
+        if depth > max_depth:
+            continue
+        if isinstance(item, str):
+            text = item.strip()
+            if len(text) > 2 and text[0] in "{[":
+                decoded = _loads(text)
+                if decoded is not None:
+                    stack.append((decoded, depth + 1))
+        elif isinstance(item, dict):
+            yield item
+            stack.extend((v, depth + 1) for v in reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend((v, depth + 1) for v in reversed(item))
+
+
+def meta_content(tree, prop: str):
+    """content of `<meta property=prop>` (or name=prop), or None."""
+    if tree is None:
+        return None
+    values = tree.xpath(f'//meta[@property="{prop}" or @name="{prop}"]/@content')
+    return values[0].strip() if values and values[0].strip() else None
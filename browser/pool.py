@@ -0,0 +1,240 @@
+import os
+import platform
+import threading
+import time
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [BrowserPool] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _process_tree_rss_mb(root_pid) -> float:
+    """
+    Sums the resident memory (MB) of a process and all its descendants.
+
+    Only available on Linux (reads /proc); returns 0.0 elsewhere so the RSS
+    ceiling is simply never triggered.
+    """
+    if not root_pid or platform.system() != "Linux":
+        return 0.0
+
+    children = {}
+    rss_kb = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except Exception:
+        return 0.0
+
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                ppid = None
+                rss = 0
+                for line in f:
+                    if line.startswith("PPid:"):
+                        ppid = int(line.split()[1])
+                    elif line.startswith("VmRSS:"):
+                        rss = int(line.split()[1])
+            rss_kb[int(pid)] = rss
+            if ppid is not None:
+                children.setdefault(ppid, []).append(int(pid))
+        except Exception:
+            continue
+
+    total = 0
+    stack = [int(root_pid)]
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        total += rss_kb.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / 1024.0
+
+
+class BrowserPool:
+    """
+    Keeps uc.Chrome instances alive across schedule ticks.
+
+    Drivers are created lazily by `factory` (the scraper's own init_driver),
+    health-checked on every acquire and recycled after a number of page loads,
+    an RSS ceiling or a long idle period. Cookies and HTTP cache survive
+    between runs because the browser process is reused.
+
+    Env knobs:
+    - BROWSER_POOL_ENABLED        (default: true)  => false restores one browser per run
+    - BROWSER_POOL_SIZE           (default: 1)
+    - BROWSER_POOL_MAX_PAGES      (default: 200)
+    - BROWSER_POOL_MAX_RSS_MB     (default: 1500, 0 => no ceiling)
+    - BROWSER_POOL_MAX_IDLE_SECONDS (default: 7200, 0 => never expire)
+    """
+
+    def __init__(self, factory, name="default"):
+        self.factory = factory
+        self.name = name
+        self.enabled = os.getenv("BROWSER_POOL_ENABLED", "true").lower() == "true"
+        self.max_size = max(1, _env_int("BROWSER_POOL_SIZE", 1))
+        self.max_pages = _env_int("BROWSER_POOL_MAX_PAGES", 200)
+        self.max_rss_mb = _env_int("BROWSER_POOL_MAX_RSS_MB", 1500)
+        self.max_idle = _env_int("BROWSER_POOL_MAX_IDLE_SECONDS", 7200)
+
+        self._lock = threading.Lock()
+        self._idle = []      # drivers ready to be handed out
+        self._in_use = set()  # ids of drivers currently leased
+        self._meta = {}       # id(driver) -> {"pages", "created", "released"}
+
+    # ---- internals -------------------------------------------------------
+
+    def _wrap_page_counter(self, driver):
+        """Counts driver.get() calls so the pool knows when to recycle."""
+        meta = self._meta[id(driver)]
+        original_get = driver.get
+
+        def counting_get(url, *args, **kwargs):
+            meta["pages"] += 1
+            return original_get(url, *args, **kwargs)
+
+        def note_page_load():
+            # Navegações feitas via JavaScript (ex.: abas paralelas) não passam por get()
+            meta["pages"] += 1
+
+        driver.get = counting_get
+        driver.note_page_load = note_page_load
+
+    def _create(self):
+        driver = self.factory()
+        now = time.time()
+        self._meta[id(driver)] = {"pages": 0, "created": now, "released": now}
+        self._wrap_page_counter(driver)
+        return driver
+
+    def _quit(self, driver):
+        self._meta.pop(id(driver), None)
+        self._in_use.discard(id(driver))
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _is_healthy(self, driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _rss_mb(self, driver) -> float:
+        pid = getattr(driver, "browser_pid", None)
+        if not pid:
+            service = getattr(driver, "service", None)
+            process = getattr(service, "process", None)
+            pid = getattr(process, "pid", None)
+        return _process_tree_rss_mb(pid)
+
+    def _recycle_reason(self, driver):
+        meta = self._meta.get(id(driver))
+        if not meta:
+            return "sem metadados"
+        if self.max_pages > 0 and meta["pages"] >= self.max_pages:
+            return f"{meta['pages']} páginas carregadas"
+        if self.max_idle > 0 and (time.time() - meta["released"]) >= self.max_idle:
+            return "ocioso por muito tempo"
+        if self.max_rss_mb > 0:
+            rss = self._rss_mb(driver)
+            if rss >= self.max_rss_mb:
+                return f"RSS {rss:.0f}MB acima do limite"
+        if not self._is_healthy(driver):
+            return "falhou no health-check"
+        return None
+
+    def _reset_tabs(self, driver):
+        """Closes extra tabs so the next job starts from a single window."""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+        except Exception:
+            pass
+
+    # ---- public API ------------------------------------------------------
+
+    def acquire(self):
+        """Returns a healthy driver, reusing a warm one when possible."""
+        if not self.enabled:
+            return self.factory()
+
+        with self._lock:
+            while self._idle:
+                driver = self._idle.pop()
+                reason = self._recycle_reason(driver)
+                if reason:
+                    log(f"Reciclando navegador ({self.name}): {reason}")
+                    self._quit(driver)
+                    continue
+                self._in_use.add(id(driver))
+                log(f"Navegador reaproveitado ({self.name}, {self._meta[id(driver)]['pages']} páginas)")
+                return driver
+
+        driver = self._create()
+        with self._lock:
+            self._in_use.add(id(driver))
+        return driver
+
+    def release(self, driver):
+        """Returns a driver to the pool (or quits it when the pool is full/disabled)."""
+        if driver is None:
+            return
+        if not self.enabled:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return
+
+        with self._lock:
+            self._in_use.discard(id(driver))
+            meta = self._meta.get(id(driver))
+            if meta is None or len(self._idle) >= self.max_size:
+                self._quit(driver)
+                return
+            meta["released"] = time.time()
+
+        self._reset_tabs(driver)
+        with self._lock:
+            self._idle.append(driver)
+
+    def discard(self, driver):
+        """Quits a driver that is known to be broken instead of returning it."""
+        if driver is None:
+            return
+        with self._lock:
+            self._quit(driver)
+
+    def warm(self):
+        """Pre-starts one browser so the next scheduled run does not cold-boot Chrome."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._idle:
+                return
+        try:
+            self.release(self.acquire())
+        except Exception as e:
+            log(f"Falha ao pré-aquecer navegador ({self.name}): {e}")
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._quit(self._idle.pop())
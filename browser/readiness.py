@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [Readiness] {message}", flush=True)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Instrumentação passiva: observa recursos concluídos e mutações do DOM
+# (não altera fetch/XHR, para não mudar a impressão digital da página).
+_TRACKER_JS = """
+(function () {
+    if (window.__readiness) { return; }
+    var r = window.__readiness = {lastNetwork: Date.now(), lastMutation: Date.now(), mutations: 0};
+    try {
+        new PerformanceObserver(function () { r.lastNetwork = Date.now(); })
+            .observe({type: 'resource', buffered: true});
+    } catch (e) {}
+    function observeDom() {
+        try {
+            new MutationObserver(function (records) {
+                r.mutations += records.length;
+                r.lastMutation = Date.now();
+            }).observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+        } catch (e) {}
+    }
+    if (document.documentElement) { observeDom(); }
+    else { document.addEventListener('DOMContentLoaded', observeDom); }
+})();
+"""
+
+_STATE_JS = _TRACKER_JS + """
+var selector = arguments[0];
+var r = window.__readiness || {lastNetwork: 0, lastMutation: 0, mutations: 0};
+var now = Date.now();
+return {
+    loading: document.readyState === 'loading',
+    complete: document.readyState === 'complete',
+    count: selector ? document.querySelectorAll(selector).length : 0,
+    networkIdleMs: now - r.lastNetwork,
+    domQuietMs: now - r.lastMutation,
+    mutations: r.mutations,
+    height: document.body ? document.body.scrollHeight : 0
+};
+"""
+
+
+def install_readiness_tracker(driver) -> bool:
+    """
+    Registers the tracker through CDP so it runs before any page script.
+
+    Without it the tracker is injected lazily on the first readiness check,
+    which still works but misses activity that happened before that check.
+    CDP scripts are registered per tab, so the hook is chained into
+    `driver.setup_new_tab`.
+    """
+    def register():
+        driver.execute_cdp_cmd("Page.enable", {})
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _TRACKER_JS})
+
+    try:
+        register()
+    except Exception as e:
+        log(f"Não foi possível registrar o rastreador via CDP: {e}")
+        return False
+
+    previous_hook = getattr(driver, "setup_new_tab", None)
+
+    def setup_new_tab():
+        if previous_hook:
+            previous_hook()
+        try:
+            register()
+        except Exception as e:
+            log(f"Falha ao registrar rastreador na nova aba: {e}")
+
+    driver.setup_new_tab = setup_new_tab
+    return True
+
+
+def page_state(driver, selector=None) -> dict:
+    """One round trip returning readyState, element count and idle timers."""
+    try:
+        return driver.execute_script(_STATE_JS, selector) or {}
+    except Exception:
+        return {}
+
+
+def wait_until_ready(driver, selector=None, min_count=1, network_idle_ms=500,
+                     dom_quiet_ms=300, timeout=15, poll=0.1) -> bool:
+    """
+    Waits for concrete signals instead of a fixed sleep.
+
+    Ready means: the document left the 'loading' state, `selector` matches at
+    least `min_count` elements (when given), no resource finished loading in
+    the last `network_idle_ms` and the DOM has not mutated in `dom_quiet_ms`.
+    Pass 0 to skip a signal. Returns False on timeout (the caller decides
+    whether a partially loaded page is still usable).
+    """
+    deadline = time.time() + timeout
+    state = {}
+    while time.time() < deadline:
+        state = page_state(driver, selector)
+        if state and not state.get("loading", True):
+            if ((not selector or state.get("count", 0) >= min_count)
+                    and state.get("networkIdleMs", 0) >= network_idle_ms
+                    and state.get("domQuietMs", 0) >= dom_quiet_ms):
+                return True
+        time.sleep(poll)
+    log(f"Página não estabilizou em {timeout}s (estado: {state})")
+    return False
+
+
+def wait_for_js(driver, script, *args, timeout=15, poll=0.2):
+    """Polls `script` until it returns a truthy value; returns it (or None on timeout)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            value = driver.execute_script(script, *args)
+            if value:
+                return value
+        except Exception:
+            pass
+        time.sleep(poll)
+    return None
+
+
+def scroll_until_stable(driver, selector=None, max_scrolls=3, step_timeout=5):
+    """
+    Scrolls to the bottom until the page stops growing.
+
+    After each scroll it waits for the element count or page height to grow
+    and for the network/DOM to settle, and stops as soon as a scroll loads
+    nothing new. Returns the final element count for `selector`.
+    """
+    state = page_state(driver, selector)
+    for _ in range(max_scrolls):
+        before_count = state.get("count", 0)
+        before_height = state.get("height", 0)
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+        deadline = time.time() + step_timeout
+        grew = False
+        while time.time() < deadline:
+            time.sleep(0.1)
+            state = page_state(driver, selector)
+            if state.get("count", 0) > before_count or state.get("height", 0) > before_height:
+                grew = True
+            if grew and state.get("networkIdleMs", 0) >= 400 and state.get("domQuietMs", 0) >= 300:
+                break
+        if not grew:
+            break
+    return state.get("count", 0)
+
+
+# ---- politeness budget ----------------------------------------------------
+
+_POLITENESS_LOCK = threading.Lock()
+_LAST_HIT = {}  # host -> timestamp of the last navigation
+
+
+def _host_intervals() -> dict:
+    intervals = {}
+    for item in os.getenv("POLITENESS_HOST_INTERVALS", "").split(","):
+        if "=" not in item:
+            continue
+        host, value = item.split("=", 1)
+        try:
+            intervals[host.strip().lower()] = float(value)
+        except ValueError:
+            continue
+    return intervals
+
+
+def _min_interval(host: str) -> float:
+    """
+    Env knobs:
+    - POLITENESS_MIN_INTERVAL_SECONDS (default: 2.0) => minimum gap between
+      two navigations to the same host
+    - POLITENESS_HOST_INTERVALS (e.g. "shopee.com.br=5,amazon.com.br=3"),
+      matched as a suffix of the host
+    """
+    for suffix, interval in _host_intervals().items():
+        if host == suffix or host.endswith("." + suffix):
+            return interval
+    return _env_float("POLITENESS_MIN_INTERVAL_SECONDS", 2.0)
+
+
+def politeness_wait(url: str) -> float:
+    """
+    Sleeps only what is left of the host's budget since its last navigation.
+
+    The wait is reserved under a lock, so parallel tabs hitting the same
+    host are spaced out instead of firing together. Returns seconds slept.
+    """
+    try:
+        host = urlparse(url).netloc.lower()
+    except Exception:
+        host = ""
+    if not host:
+        return 0.0
+
+    interval = _min_interval(host)
+    with _POLITENESS_LOCK:
+        now = time.time()
+        next_slot = max(now, _LAST_HIT.get(host, 0.0) + interval)
+        _LAST_HIT[host] = next_slot
+    delay = next_slot - now
+    if delay > 0:
+        time.sleep(delay)
+    return delay
+
+
+def polite_get(driver, url: str):
+    """driver.get() preceded by the per-host politeness wait."""
+    politeness_wait(url)
+    return driver.get(url)
@@ -0,0 +1,52 @@
+import os
+
+from bs4 import BeautifulSoup
+
+
+def snapshot_enabled() -> bool:
+    """
+    Whether product pages are parsed from a single page_source snapshot.
+
+    Env knobs:
+    - DETAIL_PARSE_MODE=snapshot|selenium (default: snapshot)
+      "selenium" restores the old per-field WebDriver extraction.
+    """
+    return os.getenv("DETAIL_PARSE_MODE", "snapshot").lower() != "selenium"
+
+
+def parse_html(html: str) -> BeautifulSoup:
+    """Parses HTML with lxml, falling back to the stdlib parser."""
+    try:
+        return BeautifulSoup(html or "", "lxml")
+    except Exception:
+        return BeautifulSoup(html or "", "html.parser")
+
+
+def page_soup(driver) -> BeautifulSoup:
+    """Captures the current DOM once (one WebDriver call) and parses it offline."""
+    return parse_html(driver.page_source)
+
+
+def text_of(node, selector=None):
+    """Stripped text of `node` (or of its first match for `selector`), or None."""
+    if node is None:
+        return None
+    if selector:
+        node = node.select_one(selector)
+        if node is None:
+            return None
+    text = " ".join(node.get_text(" ", strip=True).split())
+    return text or None
+
+
+def attr_of(node, selector, attr):
+    """Attribute of the first match for `selector`, or None."""
+    if node is None:
+        return None
+    el = node.select_one(selector) if selector else node
+    if el is None:
+        return None
+    value = el.get(attr)
+    if isinstance(value, list):
+        value = " ".join(value)
+    return value or None
@@ -0,0 +1,146 @@
+import os
+import time
+from urllib.parse import urlparse
+
+from browser.readiness import politeness_wait
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [Tabs] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def tab_concurrency() -> int:
+    """
+    Number of product tabs loaded at the same time.
+
+    Env knobs:
+    - DETAIL_TABS          (default: 1 => sequential, one page at a time)
+    - DETAIL_TABS_PER_HOST (default: 3)
+    - DETAIL_TAB_TIMEOUT_SECONDS (default: 30)
+    """
+    return max(1, _env_int("DETAIL_TABS", 1))
+
+
+# O documento antigo fica marcado até a nova navegação substituí-lo
+_NAVIGATE_JS = "window.__tabNavPending = true; window.location.href = arguments[0];"
+
+_READY_JS = """
+var selector = arguments[0];
+if (window.__tabNavPending || document.readyState === 'loading') { return false; }
+return !selector || document.querySelector(selector) !== null;
+"""
+
+
+def _host(url: str) -> str:
+    try:
+        return urlparse(url).netloc.lower()
+    except Exception:
+        return ""
+
+
+def iter_tab_results(driver, items, extract, url_of=None, ready_selector=None,
+                     max_tabs=None, per_host=None, timeout=None):
+    """
+    Loads several product pages in parallel tabs of one browser.
+
+    Navigations are started with `window.location` (non-blocking), every tab
+    is polled for readiness and `extract(driver, item)` runs on whichever
+    tab finishes first, with the driver already switched to it. Yields
+    `(item, result)` pairs as pages complete, so a batch takes roughly as
+    long as its slowest page instead of the sum of all pages.
+
+    `url_of(item)` maps an item to its URL (default: the item itself).
+    `ready_selector` is an optional CSS selector that must exist before the
+    page is considered ready. Exceptions raised by `extract` propagate to
+    the caller (extra tabs are still closed).
+    """
+    url_of = url_of or (lambda item: item)
+    max_tabs = max_tabs or tab_concurrency()
+    per_host = per_host or max(1, _env_int("DETAIL_TABS_PER_HOST", 3))
+    timeout = timeout or _env_int("DETAIL_TAB_TIMEOUT_SECONDS", 30)
+
+    pending = list(items)
+    original = driver.current_window_handle
+    free_handles = [original]
+    active = []  # dicts: handle, item, host, started
+    host_load = {}
+
+    def start(item):
+        url = url_of(item)
+        if free_handles:
+            handle = free_handles.pop()
+            driver.switch_to.window(handle)
+        else:
+            driver.switch_to.new_window("tab")
+            handle = driver.current_window_handle
+            # Configurações de CDP por aba (ex.: bloqueio de recursos)
+            setup = getattr(driver, "setup_new_tab", None)
+            if setup:
+                setup()
+        politeness_wait(url)
+        driver.execute_script(_NAVIGATE_JS, url)
+        host = _host(url)
+        host_load[host] = host_load.get(host, 0) + 1
+        active.append({"handle": handle, "item": item, "host": host, "started": time.time()})
+
+    def fill_slots():
+        i = 0
+        while i < len(pending) and len(active) < max_tabs:
+            host = _host(url_of(pending[i]))
+            if host_load.get(host, 0) >= per_host:
+                i += 1
+                continue
+            start(pending.pop(i))
+
+    try:
+        fill_slots()
+        while active:
+            finished = None
+            for tab in active:
+                try:
+                    driver.switch_to.window(tab["handle"])
+                    ready = driver.execute_script(_READY_JS, ready_selector)
+                except Exception:
+                    ready = False
+                if ready:
+                    finished = tab
+                    break
+                if (time.time() - tab["started"]) >= timeout:
+                    log(f"Timeout aguardando {url_of(tab['item'])}, extraindo mesmo assim")
+                    finished = tab
+                    break
+
+            if finished is None:
+                time.sleep(0.2)
+                continue
+
+            active.remove(finished)
+            host_load[finished["host"]] -= 1
+            note = getattr(driver, "note_page_load", None)
+            if note:
+                note()
+
+            result = extract(driver, finished["item"])
+
+            free_handles.append(finished["handle"])
+            fill_slots()
+            yield finished["item"], result
+    finally:
+        # Fecha as abas extras e volta para a aba original
+        try:
+            for handle in driver.window_handles:
+                if handle != original:
+                    driver.switch_to.window(handle)
+                    driver.close()
+            driver.switch_to.window(original)
+        except Exception:
+            pass
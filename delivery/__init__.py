@@ -0,0 +1 @@
+# Message delivery shared by the scrapers (async Telegram/WhatsApp fan-out off the scraping thread).
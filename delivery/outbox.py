@@ -0,0 +1,216 @@
+import json
+import os
+import random
+import time
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [Outbox] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _bot_id(bot_token) -> str:
+    # Só o id numérico do bot vai para o banco; o token vem do .env na hora do reenvio
+    return (bot_token or "").split(":", 1)[0]
+
+
+class Outbox:
+    """
+    Durable record of every message handed to the delivery pipeline.
+
+    A message is written (rendered text, image URL, and which channels it
+    still owes) before the first attempt, and each channel is marked done
+    as it succeeds. What is still owed after an attempt is retried by the
+    pipeline's flusher with exponential backoff, so a Telegram/WhatsApp
+    outage no longer throws away a scraped product.
+
+    Every entry has an idempotency key (the canonical product ID): a
+    product that is already queued or sent is never queued twice, and a
+    channel that already got the message is never sent it again. Entries
+    are leased while a process sends them, so the scraper processes can
+    share one outbox. Bot tokens are not stored, only the bot id; a retry
+    runs in a process whose TELEGRAM_BOT_TOKEN belongs to that bot.
+
+    Env knobs:
+    - OUTBOX_ENABLED                (default: true)
+    - OUTBOX_MAX_ATTEMPTS           (default: 10)
+    - OUTBOX_BACKOFF_SECONDS        (default: 60)   => first retry, doubled per attempt
+    - OUTBOX_MAX_BACKOFF_SECONDS    (default: 3600)
+    - OUTBOX_LEASE_SECONDS          (default: 600)  => an attempt in flight is not picked up elsewhere
+    - OUTBOX_FLUSH_INTERVAL_SECONDS (default: 30)
+    - OUTBOX_RETENTION_DAYS         (default: 7)    => finished entries kept for the idempotency check
+    - OUTBOX_MAX_AGE_HOURS          (default: 12)   => older pending entries are given up (stale offers)
+
+    While WhatsApp is offline its destinations are deferred: they stay
+    owed without spending attempts, and are only claimed again once the
+    server reports CONNECTED.
+    """
+
+    def __init__(self, enabled=None, store=None):
+        if enabled is None:
+            enabled = os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.max_attempts = max(1, _env_int("OUTBOX_MAX_ATTEMPTS", 10))
+        self.backoff = max(1, _env_int("OUTBOX_BACKOFF_SECONDS", 60))
+        self.max_backoff = max(self.backoff, _env_int("OUTBOX_MAX_BACKOFF_SECONDS", 3600))
+        self.lease = max(30, _env_int("OUTBOX_LEASE_SECONDS", 600))
+        self.flush_interval = max(1, _env_int("OUTBOX_FLUSH_INTERVAL_SECONDS", 30))
+        self.retention = max(1, _env_int("OUTBOX_RETENTION_DAYS", 7)) * 86400
+        self.max_age = max(1, _env_int("OUTBOX_MAX_AGE_HOURS", 12)) * 3600
+        self._store = (store or get_store()) if enabled else None
+
+    def enqueue(self, key, message, image_url=None, telegram=None, whatsapp=None,
+                photo_by_url=False, label=None):
+        """
+        Stores a message about to be sent and leases it to the caller.
+        Returns the entry id, or None when `key` is already queued or sent
+        (an entry that gave up earlier is revived instead).
+        """
+        if self._store is None:
+            return None
+        now = time.time()
+        telegram = telegram or {}
+        telegram_bot = _bot_id(telegram.get("bot_token")) if telegram else None
+        values = (
+            label, message, image_url, int(bool(photo_by_url)),
+            telegram_bot, str(telegram.get("chat_id") or "") if telegram else None,
+            json.dumps([dest.strip() for dest in whatsapp or []]), now, now + self.lease, now,
+        )
+        with self._store.transaction() as conn:
+            row = conn.execute("SELECT id, status FROM outbox WHERE key = ?", (key,)).fetchone()
+            if row and row[1] != "dead":
+                return None
+            if row:
+                conn.execute(
+                    "UPDATE outbox SET label = ?, message = ?, image_url = ?, photo_by_url = ?, "
+                    "telegram_bot = ?, telegram_chat = ?, telegram_done = 0, whatsapp = ?, "
+                    "status = 'pending', attempts = 0, next_attempt = ?, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    values + (row[0],),
+                )
+                return row[0]
+            cursor = conn.execute(
+                "INSERT INTO outbox (label, message, image_url, photo_by_url, telegram_bot, telegram_chat, "
+                "whatsapp, next_attempt, lease_until, updated_at, key, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (key, now),
+            )
+            return cursor.lastrowid
+
+    def record(self, entry_id, telegram_ok, whatsapp_sent=(), whatsapp_deferred=False) -> bool:
+        """
+        Marks the channels that got the message. Returns True when
+        something is still owed and a retry was scheduled.
+
+        `whatsapp_deferred`: WhatsApp was skipped because it is offline; if
+        that is all that is owed, no attempt is spent and the entry waits
+        for the reconnection.
+        """
+        if self._store is None:
+            return False
+        now = time.time()
+        with self._store.transaction() as conn:
+            row = conn.execute(
+                "SELECT telegram_bot, telegram_done, whatsapp, attempts, label FROM outbox WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+            if row is None:
+                return False
+            telegram_bot, telegram_done, whatsapp, attempts, label = row
+            telegram_done = int(bool(telegram_done or telegram_ok))
+            sent = set(whatsapp_sent or ())
+            whatsapp = [dest for dest in json.loads(whatsapp) if dest not in sent]
+
+            if (telegram_done or telegram_bot is None) and not whatsapp:
+                status, next_attempt = "sent", now
+            elif (telegram_done or telegram_bot is None) and whatsapp_deferred:
+                status, next_attempt = "pending", now
+            else:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    status, next_attempt = "dead", now
+                    log(f"Desistindo de {label or entry_id} após {attempts} tentativa(s)")
+                else:
+                    status = "pending"
+                    delay = min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+                    next_attempt = now + delay * random.uniform(0.8, 1.2)
+                    log(f"{label or entry_id}: nova tentativa em {delay:.0f}s ({attempts}/{self.max_attempts})")
+
+            conn.execute(
+                "UPDATE outbox SET telegram_done = ?, whatsapp = ?, status = ?, attempts = ?, "
+                "next_attempt = ?, lease_until = 0, updated_at = ? WHERE id = ?",
+                (telegram_done, json.dumps(whatsapp), status, attempts, next_attempt, now, entry_id),
+            )
+        return status == "pending"
+
+    def claim_due(self, bot_token=None, limit=10, whatsapp_online=True) -> list:
+        """
+        Leases up to `limit` entries whose retry is due and that this
+        process can send (a pending Telegram post needs the same bot).
+        With WhatsApp offline only entries that still owe Telegram are
+        claimed. Returns them as dicts with only the channels still owed.
+        """
+        if self._store is None:
+            return []
+        now = time.time()
+        bot = _bot_id(bot_token)
+        with self._store.transaction() as conn:
+            expired = conn.execute(
+                "UPDATE outbox SET status = 'dead', updated_at = ? WHERE status = 'pending' AND created_at < ?",
+                (now, now - self.max_age),
+            ).rowcount
+            if expired:
+                log(f"{expired} envio(s) antigo(s) demais descartado(s) da outbox")
+            if whatsapp_online:
+                owed = "(telegram_bot IS NULL OR telegram_done = 1 OR telegram_bot = ?)"
+            else:
+                owed = "(telegram_bot = ? AND telegram_done = 0)"
+            rows = conn.execute(
+                "SELECT id, label, message, image_url, photo_by_url, telegram_bot, telegram_chat, "
+                "telegram_done, whatsapp FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? AND lease_until <= ? "
+                f"AND {owed} ORDER BY next_attempt LIMIT ?",
+                (now, now, bot, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET lease_until = ? WHERE id = ?", [(now + self.lease, row[0]) for row in rows]
+            )
+
+        entries = []
+        for entry_id, label, message, image_url, photo_by_url, telegram_bot, chat, done, whatsapp in rows:
+            owes_telegram = telegram_bot is not None and not done
+            entries.append({
+                "id": entry_id,
+                "label": label,
+                "message": message,
+                "image_url": image_url,
+                "photo_by_url": bool(photo_by_url),
+                "telegram": {"bot_token": bot_token, "chat_id": chat} if owes_telegram else None,
+                "whatsapp": json.loads(whatsapp),
+            })
+        return entries
+
+    def prune(self):
+        """Drops finished entries older than the retention window."""
+        if self._store is None:
+            return
+        with self._store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'dead') AND updated_at < ?",
+                (time.time() - self.retention,),
+            )
+
+    def pending_count(self) -> int:
+        if self._store is None:
+            return 0
+        return self._store.query("SELECT COUNT(*) FROM outbox WHERE status = 'pending'")[0][0]
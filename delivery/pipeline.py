@@ -0,0 +1,555 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import time
+
+import aiohttp
+
+from delivery.outbox import Outbox
+from Telegram.client import get_metrics, get_rate_limiter, retry_after_seconds
+from Telegram.photo_relay import fetchable_by_telegram, get_file_id_cache, largest_file_id, photo_limits
+from whatsapp.endpoints import ENDPOINT_DOWN_STATUSES
+from whatsapp.wpp_connect import (
+    wpp_build_batch_request,
+    wpp_build_request,
+    wpp_check_connection_state,
+    wpp_connect_timeout,
+    wpp_endpoints,
+)
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [Delivery] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class _IntervalLimiter:
+    """
+    Minimum spacing between sends to the same channel key.
+
+    Slots are reserved when `wait` is called, so messages keep the order in
+    which they were queued even when several jobs run at once.
+    """
+
+    def __init__(self):
+        self._next = {}
+
+    async def wait(self, key, interval: float):
+        now = time.monotonic()
+        slot = max(now, self._next.get(key, 0.0))
+        self._next[key] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class DeliveryPipeline:
+    """
+    Sends messages on a background asyncio loop so scraping never waits on HTTP.
+
+    `submit()` puts a job on an in-process queue and returns immediately
+    with a `concurrent.futures.Future`. Workers on the delivery thread post
+    to Telegram and to every WhatsApp destination of the job concurrently
+    (aiohttp, one pooled session; all WhatsApp destinations of a job go in
+    one /send-batch request); Telegram calls wait on the shared Bot API
+    token buckets (Telegram/client.py) and WhatsApp destinations on a
+    per-destination interval, replacing the sleeps that used to pace the
+    scraping loop. The future resolves to
+    `{"telegram": bool, "whatsapp": bool, "queued": bool}`; `drain()` blocks
+    until every submitted job finished.
+
+    Jobs submitted with an `idempotency_key` go through the durable outbox
+    (delivery/outbox.py): whatever channel failed is retried in the
+    background with backoff (`queued` is True meanwhile), and a key that is
+    already queued or sent is not sent again. While WhatsApp is not
+    CONNECTED its part of an outbox job is not attempted but kept owed, and
+    the flusher drains those messages (a few per flush, paced per
+    destination) once it reconnects; Telegram goes out as usual meanwhile.
+
+    Env knobs:
+    - DELIVERY_WORKERS               (default: 4)   => jobs in flight at once
+    - DELIVERY_HTTP_TIMEOUT_SECONDS  (default: 45)
+    - DELIVERY_POOL_SIZE             (default: 20)  => open connections
+    - WPP_DEST_INTERVAL_SECONDS      (default: 3.0) => per WhatsApp destination
+    - WPP_STATE_TTL_SECONDS          (default: 30)  => how long a WhatsApp state check is reused
+    - WPP_DRAIN_PER_FLUSH            (default: DELIVERY_WORKERS) => buffered messages re-sent per flush
+    """
+
+    def __init__(self):
+        self.workers = max(1, _env_int("DELIVERY_WORKERS", 4))
+        self.http_timeout = max(1, _env_int("DELIVERY_HTTP_TIMEOUT_SECONDS", 45))
+        self.pool_size = max(1, _env_int("DELIVERY_POOL_SIZE", 20))
+        self.telegram_retries = max(0, _env_int("TELEGRAM_MAX_RETRIES", 3))
+        self.wpp_interval = max(0.0, _env_float("WPP_DEST_INTERVAL_SECONDS", 3.0))
+        self.wpp_state_ttl = max(1, _env_int("WPP_STATE_TTL_SECONDS", 30))
+        self.drain_per_flush = max(1, _env_int("WPP_DRAIN_PER_FLUSH", self.workers))
+        self.outbox = Outbox()
+        self._wpp_state = (0.0, None)
+
+        self._loop = None
+        self._queue = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pending = set()
+        self._pending_lock = threading.Condition()
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is None:
+                thread = threading.Thread(target=self._run, name="delivery", daemon=True)
+                thread.start()
+                self._started.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        timeout = aiohttp.ClientTimeout(total=self.http_timeout)
+        connector = aiohttp.TCPConnector(limit=self.pool_size)
+        self._limiter = _IntervalLimiter()
+        self._file_ids = get_file_id_cache()
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+            self._http = http
+            self._started.set()
+            tasks = [self._worker() for _ in range(self.workers)]
+            if self.outbox.enabled:
+                tasks.append(self._flush_outbox())
+            await asyncio.gather(*tasks)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            future = job["future"]
+            try:
+                result = await self._deliver(job)
+            except Exception as e:
+                log(f"Erro inesperado na entrega de {job.get('label') or 'mensagem'}: {e}")
+                result = {"telegram": False, "whatsapp": False, "queued": False}
+            if job.get("outbox_id"):
+                try:
+                    result["queued"] = await asyncio.get_running_loop().run_in_executor(
+                        None, functools.partial(
+                            self.outbox.record, job["outbox_id"], result["telegram"], job.get("whatsapp_done", ()),
+                            whatsapp_deferred=job.get("whatsapp_deferred", False),
+                        )
+                    )
+                except Exception as e:
+                    log(f"Erro ao atualizar a outbox de {job.get('label') or 'mensagem'}: {e}")
+            try:
+                future.set_result(result)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(future)
+                    self._pending_lock.notify_all()
+
+    async def _flush_outbox(self):
+        """Re-queues the outbox entries whose retry is due (any scraper process may own them)."""
+        loop = asyncio.get_running_loop()
+        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        last_prune = 0.0
+        while True:
+            await asyncio.sleep(self.outbox.flush_interval)
+            try:
+                if time.time() - last_prune > 3600:
+                    await loop.run_in_executor(None, self.outbox.prune)
+                    last_prune = time.time()
+                online = await self._whatsapp_online()
+                claim = functools.partial(
+                    self.outbox.claim_due, bot_token, self.drain_per_flush, whatsapp_online=online
+                )
+                entries = await loop.run_in_executor(None, claim)
+            except Exception as e:
+                log(f"Erro ao ler a outbox: {e}")
+                continue
+            for entry in entries:
+                log(f"Reenviando {entry['label'] or entry['id']} da outbox")
+                self._queue.put_nowait({
+                    "message": entry["message"],
+                    "image_url": entry["image_url"],
+                    "telegram": entry["telegram"],
+                    "whatsapp": entry["whatsapp"],
+                    "photo_by_url": entry["photo_by_url"],
+                    "label": entry["label"],
+                    "outbox_id": entry["id"],
+                    # Reenvios não entram em drain(): a rodada do scraper não espera por eles
+                    "future": concurrent.futures.Future(),
+                })
+
+    # ---- public API ------------------------------------------------------
+
+    def start(self):
+        """
+        Starts the delivery thread (and the outbox flusher) without waiting
+        for a submit, so entries left by a previous run are retried even
+        when this run finds nothing new. Idempotent.
+        """
+        self._ensure_started()
+
+    def submit(self, message, image_url=None, telegram=None, whatsapp=None,
+               photo_by_url=False, label=None, on_done=None, idempotency_key=None):
+        """
+        Queues one message.
+
+        - telegram: {"bot_token": ..., "chat_id": ...} or None (not sent)
+        - whatsapp: list of destinations or None (not sent)
+        - photo_by_url: let Telegram fetch `image_url` even off the known CDN hosts
+        - on_done(result): called on the delivery thread when the job finishes
+        - idempotency_key: keep the message in the outbox until every channel
+          got it (the canonical product ID); None sends it once, as before
+        """
+        self._ensure_started()
+        future = concurrent.futures.Future()
+        if on_done:
+            def _callback(done, label=label):
+                try:
+                    on_done(done.result())
+                except Exception as e:
+                    log(f"Erro no pós-envio de {label or 'mensagem'}: {e}")
+            future.add_done_callback(_callback)
+
+        outbox_id = None
+        if idempotency_key and self.outbox.enabled and (telegram or whatsapp):
+            try:
+                outbox_id = self.outbox.enqueue(
+                    idempotency_key, message, image_url=image_url, telegram=telegram,
+                    whatsapp=whatsapp, photo_by_url=photo_by_url, label=label,
+                )
+            except Exception as e:
+                log(f"Erro ao gravar {label or 'mensagem'} na outbox, enviando sem ela: {e}")
+            else:
+                if outbox_id is None:
+                    log(f"{label or idempotency_key} já está na outbox; não será enviado de novo")
+                    future.set_result({"telegram": False, "whatsapp": False, "queued": True})
+                    return future
+
+        job = {
+            "message": message,
+            "image_url": image_url,
+            "telegram": telegram,
+            "whatsapp": list(whatsapp or []),
+            "photo_by_url": photo_by_url,
+            "label": label,
+            "outbox_id": outbox_id,
+            "future": future,
+        }
+        with self._pending_lock:
+            self._pending.add(future)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return future
+
+    def pending(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    def drain(self, timeout=None) -> bool:
+        """Waits until every submitted job finished; False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._pending_lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    log(f"Timeout aguardando {len(self._pending)} envio(s) pendente(s)")
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    # ---- senders ---------------------------------------------------------
+
+    async def _deliver(self, job):
+        started = time.time()
+        tasks = []
+        if job["telegram"]:
+            tasks.append(self._send_telegram(job))
+        if job["whatsapp"]:
+            tasks.append(self._send_wpp_batch(job))
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True) if tasks else []
+
+        telegram_ok = False
+        if job["telegram"]:
+            first = outcomes[0]
+            telegram_ok = first is True
+            outcomes = outcomes[1:]
+        whatsapp_ok = any(outcome is True for outcome in outcomes)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                log(f"Erro no envio para WhatsApp: {outcome}")
+
+        log(
+            f"Entrega de {job.get('label') or 'mensagem'} em {time.time() - started:.1f}s "
+            f"(telegram={telegram_ok}, whatsapp={whatsapp_ok})"
+        )
+        return {"telegram": telegram_ok, "whatsapp": whatsapp_ok, "queued": False}
+
+    async def _send_telegram(self, job) -> bool:
+        telegram = job["telegram"]
+        bot_token = telegram.get("bot_token")
+        chat_id = telegram.get("chat_id")
+        if not bot_token or not chat_id:
+            log("Erro: Token ou Chat ID do Telegram não informado")
+            return False
+
+        message = job["message"]
+        image_url = job["image_url"]
+
+        if image_url:
+            try:
+                if await self._send_telegram_photo(bot_token, chat_id, message, image_url, job["photo_by_url"]):
+                    return True
+                log("Telegram não aceitou a foto, enviando só o texto")
+            except Exception as e:
+                log(f"Erro ao enviar foto para o Telegram, enviando só o texto: {e}")
+
+        try:
+            form = {"chat_id": str(chat_id), "text": message, "parse_mode": "Markdown"}
+            if await self._telegram_call(bot_token, "sendMessage", chat_id, form):
+                return True
+        except Exception as e:
+            log(f"Erro ao enviar para Telegram: {e}")
+        return False
+
+    async def _telegram_call(self, bot_token, method, chat_id, form):
+        """
+        POST to the Bot API behind the shared rate limiter. A 429 pauses the
+        chat for its `retry_after` (for the sync senders too) and is retried
+        while the form can be re-sent; a streamed upload (FormData) is not.
+        Returns the JSON body on HTTP 200, otherwise None.
+        """
+        loop = asyncio.get_running_loop()
+        limiter = get_rate_limiter()
+        metrics = get_metrics()
+        retries = self.telegram_retries if isinstance(form, dict) else 0
+        metrics.enter()
+        started = time.monotonic()
+        result = None
+        try:
+            for attempt in range(retries + 1):
+                # A reserva é uma escrita curta no SQLite: fora do loop de eventos
+                wait = await loop.run_in_executor(None, limiter.reserve, chat_id, bot_token)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                url = f"https://api.telegram.org/bot{bot_token}/{method}"
+                async with self._http.post(url, data=form) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        return result
+                    if response.status == 429:
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = None
+                        seconds = retry_after_seconds(body)
+                        metrics.note_throttled()
+                        await loop.run_in_executor(None, limiter.retry_after, chat_id, seconds, bot_token)
+                        if attempt < retries:
+                            log(f"Telegram {method}: 429 no chat {chat_id}, aguardando {seconds:.0f}s")
+                            continue
+                    log(f"Telegram {method} HTTP {response.status}: {(await response.text())[:200]}")
+                    return None
+            return None
+        finally:
+            metrics.leave(time.monotonic() - started, result is not None)
+
+    async def _post_photo(self, bot_token, chat_id, form):
+        return await self._telegram_call(bot_token, "sendPhoto", chat_id, form)
+
+    async def _send_telegram_photo(self, bot_token, chat_id, message, image_url, by_url) -> bool:
+        """
+        file_id em cache -> URL direto (CDN conhecido ou by_url) -> download em
+        streaming encadeado no upload. O file_id retornado vai para o cache.
+        """
+        fields = {"chat_id": str(chat_id), "caption": message, "parse_mode": "Markdown"}
+
+        file_id = self._file_ids.get(bot_token, image_url)
+        if file_id:
+            if await self._post_photo(bot_token, chat_id, {**fields, "photo": file_id}):
+                return True
+            self._file_ids.forget(bot_token, image_url)
+
+        if by_url or fetchable_by_telegram(image_url):
+            result = await self._post_photo(bot_token, chat_id, {**fields, "photo": image_url})
+            if result:
+                self._file_ids.put(bot_token, image_url, largest_file_id(result))
+                return True
+
+        limits = photo_limits()
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=limits["connect_timeout"], sock_read=limits["read_timeout"]
+        )
+        async with self._http.get(image_url, timeout=timeout) as image:
+            image.raise_for_status()
+            if (image.content_length or 0) > limits["max_bytes"]:
+                log(f"Imagem grande demais para o Telegram ({image.content_length} bytes): {image_url}")
+                return False
+
+            async def chunks():
+                # Repassa a imagem ao upload em blocos, sem juntá-la inteira na memória
+                size = 0
+                async for chunk in image.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > limits["max_bytes"]:
+                        raise ValueError(f"imagem passou de {limits['max_bytes']} bytes")
+                    yield chunk
+
+            form = aiohttp.FormData()
+            for name, value in fields.items():
+                form.add_field(name, value)
+            form.add_field("photo", chunks(), filename="image.jpg",
+                           content_type=image.headers.get("Content-Type", "image/jpeg"))
+            result = await self._post_photo(bot_token, chat_id, form)
+        if result:
+            self._file_ids.put(bot_token, image_url, largest_file_id(result))
+            return True
+        return False
+
+    async def _whatsapp_online(self) -> bool:
+        """WhatsApp state, checked at most once per WPP_STATE_TTL_SECONDS."""
+        checked_at, online = self._wpp_state
+        if online is None or time.monotonic() - checked_at > self.wpp_state_ttl:
+            loop = asyncio.get_running_loop()
+            try:
+                state = await loop.run_in_executor(None, wpp_check_connection_state)
+            except Exception:
+                state = "OFFLINE"
+            online = state == "CONNECTED"
+            if online != self._wpp_state[1] and self._wpp_state[1] is not None:
+                log("WhatsApp reconectado, liberando a fila" if online else f"WhatsApp offline (state={state}), guardando mensagens")
+            self._wpp_state = (time.monotonic(), online)
+        return online
+
+    async def _send_wpp_batch(self, job) -> bool:
+        """
+        All WhatsApp destinations of the job in one /send-batch request (the
+        server downloads the image once); servers without the route get one
+        request per destination.
+        """
+        if job.get("outbox_id") and not await self._whatsapp_online():
+            # Fica devendo na outbox e sai quando o WhatsApp voltar
+            job["whatsapp_deferred"] = True
+            log(f"WhatsApp offline: {job.get('label') or 'mensagem'} guardada para envio posterior")
+            return False
+        request = wpp_build_batch_request(job["whatsapp"], job["message"], job["image_url"])
+        # Destinos inválidos nunca vão dar certo: não ficam devendo na outbox
+        job["whatsapp_done"] = [dest.strip() for dest in job["whatsapp"]]
+        if request is None:
+            return False
+        url_path, payload, targets = request
+        job["whatsapp_done"] = [dest for dest in job["whatsapp_done"] if dest not in targets]
+        await asyncio.gather(*(self._limiter.wait(("wpp", dest), self.wpp_interval) for dest in targets))
+
+        response = await self._post_wpp(url_path, payload, f"lote de {len(targets)} destino(s)",
+                                        batch=True, timeout=self.http_timeout + 15 * len(targets))
+        if response is None:
+            return False
+        status, body = response
+        if status == 404:
+            outcomes = await asyncio.gather(*(self._send_wpp(job, dest, paced=False) for dest in targets))
+            job["whatsapp_done"] += [dest for dest, ok in zip(targets, outcomes) if ok]
+            return any(outcomes)
+        if status != 200:
+            log(f"❌ WhatsApp: falha no lote: HTTP {status}: {str(body)[:200]}")
+            return False
+
+        results = body.get("results") if isinstance(body, dict) else None
+        sent = False
+        for index, dest in enumerate(targets):
+            result = results[index] if results and index < len(results) else {}
+            if result.get("ok") is True:
+                log(f"✅ WhatsApp: enviado para {dest}")
+                job["whatsapp_done"].append(dest)
+                sent = True
+            else:
+                log(f"❌ WhatsApp: falha ao enviar para {dest}: {str(result.get('error') or 'sem resposta')[:200]}")
+        return sent
+
+    async def _send_wpp(self, job, dest, paced=True) -> bool:
+        request = wpp_build_request(dest, job["message"], job["image_url"])
+        if request is None:
+            return False
+        url_path, payload = request
+        if paced:
+            await self._limiter.wait(("wpp", dest), self.wpp_interval)
+
+        response = await self._post_wpp(url_path, payload, dest)
+        if response is None:
+            return False
+        status, body = response
+        if status == 200:
+            log(f"✅ WhatsApp: enviado para {dest}")
+            return True
+        log(f"❌ WhatsApp: falha ao enviar para {dest}: HTTP {status}: {str(body)[:200]}")
+        return False
+
+    async def _post_wpp(self, url_path, payload, label, batch=False, timeout=None):
+        """
+        POST to the WPPConnect server through the shared endpoint resolver.
+        Returns (status, body) once a server answered, None otherwise. With
+        `batch`, a 404 is returned (old server without the route) instead
+        of counting as a dead endpoint.
+        """
+        down_statuses = tuple(code for code in ENDPOINT_DOWN_STATUSES if not (batch and code == 404))
+
+        # Um POST no endpoint que já funcionou; se ele cair, sonda os outros e tenta mais uma vez
+        loop = asyncio.get_running_loop()
+        resolver = wpp_endpoints()
+        timeout = aiohttp.ClientTimeout(total=timeout or self.http_timeout, sock_connect=wpp_connect_timeout())
+        base_url = resolver.current() or await loop.run_in_executor(None, resolver.discover)
+        last_err = "nenhum endpoint do WPPConnect respondeu"
+        for attempt in range(2):
+            if base_url is None:
+                break
+            try:
+                async with self._http.post(f"{base_url}{url_path}", json=payload, timeout=timeout) as response:
+                    if response.status not in down_statuses:
+                        resolver.report_success(base_url)
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = await response.text()
+                        return response.status, body
+                    last_err = f"HTTP {response.status} via {base_url}"
+            except aiohttp.ClientConnectionError as e:
+                last_err = str(e) or type(e).__name__
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Timeout de leitura: o servidor recebeu, então não reenvia por outro endpoint
+                last_err = str(e) or type(e).__name__
+                break
+            resolver.report_failure(base_url)
+            if attempt == 0:
+                discover = functools.partial(resolver.discover, exclude=(base_url,))
+                base_url = await loop.run_in_executor(None, discover)
+        log(f"❌ WhatsApp: falha ao enviar para {label}: {last_err[:200]}")
+        return None
+
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_pipeline() -> DeliveryPipeline:
+    """Process-wide pipeline (its thread starts on `start()` or the first submit)."""
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = DeliveryPipeline()
+        return _PIPELINE
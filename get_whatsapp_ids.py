@@ -4,9 +4,15 @@ Script para obter IDs de grupos e canais do WhatsApp usando Green-API
 """
 
 import os
-import requests
 from dotenv import load_dotenv
 
+from WhatsApp.wa_green_api import GreenAPI
+
+
+def _client(instance_id, api_token):
+    # Sessão keep-alive compartilhada da instância (sem destinos: só consultas)
+    return GreenAPI(instance_id, api_token, destinations=[])
+
 def get_chat_list(instance_id, api_token):
     """
     Obtém a lista de chats (grupos e canais) do WhatsApp
@@ -18,20 +24,11 @@ def get_chat_list(instance_id, api_token):
     Returns:
         list: Lista de chats
     """
-    try:
-        url = f"https://api.green-api.com/waInstance{instance_id}/GetChats/{api_token}"
-        
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Erro ao obter lista de chats: {response.status_code}")
-            return []
-            
-    except Exception as e:
-        print(f"Erro ao obter lista de chats: {str(e)}")
+    chats = _client(instance_id, api_token).call("GetChats", http_method="GET")
+    if chats is None:
+        print("Erro ao obter lista de chats")
         return []
+    return chats
 
 def get_chat_history(instance_id, api_token, chat_id):
     """
@@ -45,25 +42,11 @@ def get_chat_history(instance_id, api_token, chat_id):
     Returns:
         dict: Informações do chat
     """
-    try:
-        url = f"https://api.green-api.com/waInstance{instance_id}/GetChatHistory/{api_token}"
-        
-        payload = {
-            "chatId": chat_id,
-            "count": 1
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Erro ao obter histórico do chat {chat_id}: {response.status_code}")
-            return []
-            
-    except Exception as e:
-        print(f"Erro ao obter histórico do chat {chat_id}: {str(e)}")
+    history = _client(instance_id, api_token).call("GetChatHistory", {"chatId": chat_id, "count": 1})
+    if history is None:
+        print(f"Erro ao obter histórico do chat {chat_id}")
         return []
+    return history
 
 def main():
     """Função principal"""
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import functools
 import time
 import json
 import os
@@ -11,7 +12,6 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 import undetected_chromedriver as uc
 import requests
 import re
@@ -37,11 +37,25 @@ if hasattr(sys.stderr, "reconfigure"):
     sys.stderr.reconfigure(line_buffering=True)
 
 from whatsapp.wpp_connect import (
-    wpp_send_message,
-    wpp_check_connection_state,
-    wpp_wait_until_connected
+    wpp_before_run,
+    wpp_check_connection_state
 )
 from whatsapp.destinations import load_whatsapp_destinations
+from browser.pool import BrowserPool
+from browser.driver_cache import resolve_driver_path
+from browser.blocking import apply_blocking_profile
+from browser.readiness import install_readiness_tracker, polite_get, wait_until_ready
+from browser.snapshot import snapshot_enabled, parse_html, text_of, attr_of
+from browser.tabs import iter_tab_results, tab_concurrency
+from browser.http_fetch import fetch_html
+from state.product_ids import canonical_id, extract_asin
+from state.sent_ids import SentIds
+from state.fuzzy_index import FuzzyIndex
+from state.batch_dedupe import dedupe_batch
+from state.store import get_store
+from state.price_history import PriceHistory
+from delivery.pipeline import get_pipeline
+from Telegram.client import get_client as get_telegram_client
 import tempfile
 
 # Verifica se está em modo de teste
@@ -73,6 +87,16 @@ FORCE_RUN_ON_START = os.getenv("FORCE_RUN_ON_START", "false").lower() == "true"
 # Configurações gerais
 SIMILARITY_THRESHOLD = 0.95  # Limiar de similaridade mais restritivo
 MAX_HISTORY_SIZE = 150  # Mantém as últimas promoções
+# Estado compartilhado em SQLite: rotação de categorias, histórico e IDs enviados
+STATE = get_store()
+# ASINs já enviados: checados ainda na listagem, antes de abrir a página
+SENT_IDS = SentIds('amazon', enabled=not TEST_MODE, legacy_path='sent_ids_amazon.json', revisit=True)
+# Entregas (Telegram/WhatsApp) em uma fila assíncrona fora do loop de scraping
+DELIVERY = get_pipeline()
+# Série de preços por ASIN: evita repostar preço igual e (opcional) preço acima do mínimo recente
+PRICE_HISTORY = PriceHistory(enabled=not TEST_MODE)
+# http: busca /dp/{ASIN} via requests e só abre o navegador em captcha ou dado faltando
+AMAZON_FETCH_MODE = os.getenv("AMAZON_FETCH_MODE", "http").lower()
 
 def _is_webdriver_unreachable_error(e: Exception) -> bool:
     msg = repr(e)
@@ -122,9 +146,11 @@ def init_driver(custom_tmp=None):
         options = build_options()
         driver = uc.Chrome(
             options=options,
-            driver_executable_path=ChromeDriverManager().install(),
+            driver_executable_path=resolve_driver_path(browser_executable_path),
             browser_executable_path=browser_executable_path
         )
+        apply_blocking_profile(driver, "amazon")
+        install_readiness_tracker(driver)
         log("Navegador stealth iniciado")
         return driver
 
@@ -137,8 +163,10 @@ def init_driver(custom_tmp=None):
             driver = uc.Chrome(
                 options=options,
                 headless=False,
-                driver_executable_path=ChromeDriverManager().install()
+                driver_executable_path=resolve_driver_path()
             )
+            apply_blocking_profile(driver, "amazon")
+            install_readiness_tracker(driver)
             log("Navegador stealth iniciado (fallback)")
             return driver
 
@@ -146,6 +174,17 @@ def init_driver(custom_tmp=None):
             log(f"Erro fatal ao iniciar navegador: {e2}")
             raise
 
+def _init_isolated_driver():
+    """Cria um navegador com diretório temporário próprio (perfil/cache isolados)."""
+    custom_tmp = tempfile.mkdtemp(prefix='chrome_tmp_')
+    os.environ['TMPDIR'] = custom_tmp
+    os.environ['TEMP'] = custom_tmp
+    os.environ['TMP'] = custom_tmp
+    return init_driver(custom_tmp=custom_tmp)
+
+# Navegador mantido vivo entre execuções agendadas
+_BROWSER_POOL = BrowserPool(_init_isolated_driver, name="amazon")
+
 # Lista de categorias para capturar ofertas
 AMAZON_CATEGORIES = [
     {
@@ -198,32 +237,24 @@ AMAZON_CATEGORIES = [
     }
 ]
 
+# Arquivo antigo das categorias já utilizadas (importado uma vez para o banco de estado)
 USED_URLS_FILE = 'used_urls_amazon.json'
-
-def load_used_urls():
-    try:
-        with open(USED_URLS_FILE, 'r') as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
-
-def save_used_urls(used_urls):
-    with open(USED_URLS_FILE, 'w') as f:
-        json.dump(list(used_urls), f)
+STATE.import_legacy('used_urls', 'amazon', USED_URLS_FILE)
 
 def get_rotated_category_urls():
-    used_urls = load_used_urls()
-    all_urls = [cat['url'] for cat in AMAZON_CATEGORIES]
-    if len(used_urls) >= len(all_urls):
-        log("Todas as categorias já foram usadas. Reiniciando histórico...")
-        used_urls.clear()
-        save_used_urls(used_urls)
-    available_urls = [url for url in all_urls if url not in used_urls]
-    num_urls = min(2, len(available_urls))
     import random
-    selected_urls = random.sample(available_urls, num_urls)
-    used_urls.update(selected_urls)
-    save_used_urls(used_urls)
+    all_urls = [cat['url'] for cat in AMAZON_CATEGORIES]
+    # Leitura e marcação na mesma transação: a rodada não se perde pela metade
+    with STATE.transaction():
+        used_urls = STATE.used_urls('amazon')
+        if len(used_urls) >= len(all_urls):
+            log("Todas as categorias já foram usadas. Reiniciando histórico...")
+            STATE.reset_rotation('amazon')
+            used_urls.clear()
+        available_urls = [url for url in all_urls if url not in used_urls]
+        num_urls = min(2, len(available_urls))
+        selected_urls = random.sample(available_urls, num_urls)
+        STATE.mark_used('amazon', selected_urls)
     log(f"Categorias selecionadas: {len(selected_urls)} de {len(available_urls)} disponíveis")
     return selected_urls
 
@@ -254,42 +285,42 @@ def load_sent_products():
         # Em modo de teste, não lê arquivo algum
         return []
     try:
-        if os.path.exists('promocoes_amazon.json'):
-            with open('promocoes_amazon.json', 'r', encoding='utf-8') as f:
-                products = json.load(f)
-                # Se atingiu o limite, remove os mais antigos
-                if len(products) >= MAX_HISTORY_SIZE:
-                    print(f"Limite de {MAX_HISTORY_SIZE} produtos atingido. Removendo os mais antigos...")
-                    # Remove os produtos mais antigos mantendo apenas os MAX_HISTORY_SIZE mais recentes
-                    products = products[-MAX_HISTORY_SIZE:]
-                return products
-        return []
+        STATE.import_legacy('sent_products', 'amazon', 'promocoes_amazon.json')
+        # Apenas os MAX_HISTORY_SIZE mais recentes
+        return STATE.recent_sent('amazon', MAX_HISTORY_SIZE)
     except Exception as e:
         print(f"Erro ao carregar produtos enviados: {e}")
         return []
 
-def save_sent_products(products):
+def record_sent_product(name, product_id=None):
+    """Registra um produto enviado (um INSERT por envio, sem reescrever o histórico)"""
     if TEST_MODE:
         # Em modo de teste, não salva nada
         return
     try:
-        # Se atingiu o limite, remove os mais antigos
-        if len(products) > MAX_HISTORY_SIZE:
-            print(f"Limite de {MAX_HISTORY_SIZE} produtos atingido. Removendo os mais antigos...")
-            # Remove os produtos mais antigos mantendo apenas os MAX_HISTORY_SIZE mais recentes
-            products = products[-MAX_HISTORY_SIZE:]
-            
-        with open('promocoes_amazon.json', 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
+        STATE.add_sent('amazon', name, product_id)
     except Exception as e:
-        print(f"Erro ao salvar produtos enviados: {e}")
-
-def is_product_already_sent(product_name, sent_products):
-    """Check if a product has already been sent by comparing names."""
-    for sent_product in sent_products:
-        if is_similar(product_name, sent_product):
-            print(f"Produto '{product_name}' já está na lista, não será enviado novamente.")
-            return True
+        print(f"Erro ao salvar produto enviado: {e}")
+
+# Nomes enviados, normalizados uma única vez e indexados por similaridade
+SENT_INDEX = FuzzyIndex(
+    None if TEST_MODE else 'amazon',
+    threshold=SIMILARITY_THRESHOLD,
+    normalize=normalize_name,
+    legacy_path='sent_index_amazon.jsonl'
+)
+SENT_INDEX.seed(load_sent_products())
+
+def is_product_already_sent(product_name, product_id=None):
+    """
+    Check if a product has already been sent (same is_similar threshold, via the name index).
+    A product whose own post is in the price history is left to PRICE_HISTORY.post_decision.
+    """
+    if PRICE_HISTORY.was_posted(product_id):
+        return False
+    if SENT_INDEX.contains_similar(product_name):
+        print(f"Produto '{product_name}' já está na lista, não será enviado novamente.")
+        return True
     return False
 
 def get_missing_fields(product):
@@ -332,11 +363,10 @@ def _notify_admin_missing_data(product_link, missing_fields, product_name=None):
         f"Faltando: {missing_text}\n"
         f"Link: {product_link}"
     )
+    client = get_telegram_client(TELEGRAM_BOT_TOKEN)
     for admin_id in ADMIN_CHAT_IDS:
         try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            payload = {'chat_id': admin_id, 'text': message}
-            requests.post(url, data=payload, timeout=10)
+            client.call('sendMessage', data={'chat_id': admin_id, 'text': message})
         except Exception:
             pass
 
@@ -351,6 +381,18 @@ def validate_product_data(product):
 
     print(f"Produto validado com sucesso: {product.get('nome', 'Sem nome')[:50]}...")
     return True
+# Extrai todos os cards de ofertas em uma única chamada ao chromedriver
+_DEAL_CARDS_JS = """
+return Array.from(document.querySelectorAll('div[data-testid="product-card"]')).map(function (card) {
+    var badge = card.querySelector('div.style_filledRoundedBadgeLabel__Vo-4g span.a-size-mini');
+    var link = card.querySelector('a[data-testid="product-card-link"]');
+    return {
+        discount: badge ? badge.innerText.trim() : null,
+        link: link ? link.href : null
+    };
+});
+"""
+
 def get_deals_with_discounts(driver, category_name):
     """Coleta descontos e links dos produtos de uma categoria específica."""
     log(f"Coletando ofertas da categoria: {category_name}")
@@ -359,7 +401,8 @@ def get_deals_with_discounts(driver, category_name):
         WebDriverWait(driver, 15).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, 'div[data-testid="product-card"]'))
         )
-        product_cards = driver.find_elements(By.CSS_SELECTOR, 'div[data-testid="product-card"]')
+        wait_until_ready(driver, 'div[data-testid="product-card"]', timeout=10)
+        product_cards = driver.execute_script(_DEAL_CARDS_JS) or []
         
         log(f"Encontrados {len(product_cards)} produtos na categoria {category_name}")
         
@@ -367,11 +410,9 @@ def get_deals_with_discounts(driver, category_name):
         for card in product_cards:
             try:
                 # Extrai o desconto
-                discount_element = card.find_element(
-                    By.CSS_SELECTOR, 
-                    'div.style_filledRoundedBadgeLabel__Vo-4g span.a-size-mini'
-                )
-                discount_text = discount_element.text.strip()
+                discount_text = card.get('discount')
+                if not discount_text:
+                    raise ValueError("badge de desconto ausente")
                 
                 # Tenta extrair o valor numérico do desconto
                 try:
@@ -387,11 +428,11 @@ def get_deals_with_discounts(driver, category_name):
                 # Só adiciona se o desconto for maior que 5%
                 if discount > 5:
                     # Extrai o link
-                    link_element = card.find_element(
-                        By.CSS_SELECTOR, 
-                        'a[data-testid="product-card-link"]'
-                    )
-                    link = link_element.get_attribute('href')
+                    link = card.get('link')
+                    if not link:
+                        raise ValueError("link do produto ausente")
+                    if canonical_id('amazon', link) in SENT_IDS:
+                        continue
                     
                     deals.append({
                         'discount': discount, 
@@ -413,8 +454,8 @@ def get_alternative_image(driver, product_name, product_url):
     """Tenta obter uma imagem alternativa do produto."""
     try:
         # Navega para a URL do produto
-        driver.get(product_url)
-        time.sleep(3)  # Aumenta o tempo de espera para garantir carregamento
+        polite_get(driver, product_url)
+        wait_until_ready(driver, "#landingImage, #imgTagWrapperId img, #main-image-container img", timeout=10)
 
         # Lista de seletores CSS para tentar encontrar a imagem (ordenados por prioridade)
         selectors = [
@@ -529,8 +570,12 @@ def is_valid_image_url(url):
         print(f"Erro ao validar imagem {url}: {e}")
         return False
 
-def send_telegram_message(products, driver, sent_products):
-    """Envia os resultados formatados para o Telegram com imagem. Não manipula mais a lista de enviados."""
+def send_telegram_message(products, driver, sent_products, on_sent=None):
+    """
+    Monta as mensagens (imagem alternativa via navegador, se preciso) e enfileira o envio
+    para Telegram e WhatsApp. Não manipula a lista de enviados: `on_sent(product, ok)` é
+    chamado na thread de entrega quando cada envio termina. Retorna os envios enfileirados.
+    """
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_GROUP_ID:
         print("Variáveis de ambiente do Telegram não configuradas!")
         return []
@@ -547,7 +592,7 @@ def send_telegram_message(products, driver, sent_products):
         except:
             log("⚠️ Falha ao verificar status do WhatsApp. Prosseguindo.")
 
-    new_sent_products = []
+    queued = []
 
     for product in products:
         try:
@@ -559,7 +604,7 @@ def send_telegram_message(products, driver, sent_products):
                 continue
 
             # Check if product was already sent
-            if is_product_already_sent(product['nome'], sent_products):
+            if is_product_already_sent(product['nome'], canonical_id('amazon', product['link'])):
                 print(f"⏭️ Produto já enviado anteriormente: {product['nome'][:50]}...")
                 continue
 
@@ -574,69 +619,38 @@ def send_telegram_message(products, driver, sent_products):
                 else:
                     image_url = get_alternative_image(driver, product['nome'], product['link'])
             
-            telegram_success = False
-            whatsapp_success = False
-            
-            # Envia para Telegram
-            if image_url:
-                try:
-                    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-                    payload = {
-                        'chat_id': TELEGRAM_GROUP_ID,
-                        'photo': image_url,
-                        'caption': message,
-                        'parse_mode': 'Markdown'
-                    }
-                    response = requests.post(url, data=payload, timeout=10)
-                    response.raise_for_status()
-                    telegram_success = True
-                    print(f"✅ Mensagem enviada para Telegram com imagem: {product['nome'][:50]}...")
-                except Exception as e:
-                    print(f"❌ Erro ao enviar para Telegram com imagem, tentando sem imagem: {e}")
-            
-            # Se não conseguiu com imagem ou não tem imagem, tenta sem
-            if not telegram_success:
-                try:
-                    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-                    payload = {
-                        'chat_id': TELEGRAM_GROUP_ID,
-                        'text': message,
-                        'parse_mode': 'Markdown'
-                    }
-                    response = requests.post(url, data=payload)
-                    response.raise_for_status()
-                    telegram_success = True
-                    print(f"✅ Mensagem enviada para Telegram sem imagem: {product['nome'][:50]}...")
-                except Exception as e:
-                    print(f"❌ Falha ao enviar mensagem para Telegram: {e}")
-            
-            # Envia para WhatsApp se habilitado
-            if WHATSAPP_ENABLED:
-                try:
-                    destinations = load_whatsapp_destinations()
-                    whatsapp_success = wpp_send_message(
-                        destinations=destinations,
-                        message=message,
-                        image_url=image_url
-                    )
-                    if whatsapp_success:
-                        print(f"✅ Mensagem enviada para WhatsApp: {product['nome'][:50]}...")
-                except Exception as e:
-                    print(f"❌ Erro ao enviar para WhatsApp: {str(e)}")
-            
-            # Salva no histórico se pelo menos um dos envios foi bem-sucedido
-            if telegram_success or whatsapp_success:
-                new_sent_products.append(product['nome'])
-            else:
-                print(f"❌ Falha total ao enviar produto: {product['nome']}")
-            
-            time.sleep(3)  # Delay entre mensagens
+            # Telegram recebe a foto por URL; WhatsApp em paralelo, fora do loop de scraping
+            queued.append(DELIVERY.submit(
+                message,
+                image_url=image_url,
+                telegram={'bot_token': TELEGRAM_BOT_TOKEN, 'chat_id': TELEGRAM_GROUP_ID},
+                whatsapp=load_whatsapp_destinations() if WHATSAPP_ENABLED else None,
+                photo_by_url=True,
+                label=product['nome'][:50],
+                on_done=functools.partial(_after_delivery, product, on_sent),
+                # Falhas ficam na outbox para nova tentativa (sem persistência em modo teste)
+                idempotency_key=None if TEST_MODE else PRICE_HISTORY.post_key(canonical_id('amazon', product['link']))
+            ))
             
         except Exception as e:
             print(f"❌ Erro crítico ao processar produto {product.get('nome', 'Sem nome')}: {str(e)}")
 
-    print(f"📤 Total de produtos enviados nesta execução: {len(new_sent_products)}")
-    return new_sent_products
+    print(f"📤 Total de produtos enfileirados para envio: {len(queued)}")
+    return queued
+
+def _after_delivery(product, on_sent, result):
+    """Pós-envio (thread de entrega)"""
+    ok = result['telegram'] or result['whatsapp'] or result.get('queued')
+    if result['telegram']:
+        print(f"✅ Mensagem enviada para Telegram: {product['nome'][:50]}...")
+    if result['whatsapp']:
+        print(f"✅ Mensagem enviada para WhatsApp: {product['nome'][:50]}...")
+    if result.get('queued') and not (result['telegram'] and result['whatsapp']):
+        print(f"🕒 Envio pendente na outbox, será repetido: {product['nome'][:50]}...")
+    if not ok:
+        print(f"❌ Falha total ao enviar produto: {product['nome']}")
+    if on_sent:
+        on_sent(product, ok)
 
 
 
@@ -678,121 +692,385 @@ def format_price(price_str):
         print(f"Erro ao formatar preço {price_str}: {e}")
         return price_str
 
-def generate_affiliate_links(driver, product_links):
-    """Gera links de afiliados e coleta dados do produto"""
-    product_data = []
+def _parse_price_block(block):
+    """Monta 'R$inteiro,centavos' a partir de um bloco a-price do snapshot."""
+    whole = text_of(block, "span.a-price-whole")
+    fraction = text_of(block, "span.a-price-fraction")
+    if not whole or not fraction:
+        return None
+    whole = whole.replace(" ", "").rstrip(",.")
+    return format_price(f"R${whole},{fraction}")
+
+def _parse_product_html(html):
+    """
+    Extrai os campos de uma página /dp/ a partir do HTML (sem WebDriver).
+
+    Retorna um dict com os mesmos campos de product_info e a lista
+    'imagens' com as URLs candidatas em ordem de prioridade.
+    """
+    soup = parse_html(html)
+    info = {
+        'nome': text_of(soup, "#productTitle"),
+        'valor_desconto': None,
+        'valor_original': None,
+        'desconto_percentual': None,
+        'avaliacao': None,
+        'imagens': [],
+    }
 
-    def _extract_asin(url: str):
-        # Common patterns: /dp/ASIN, /gp/product/ASIN, or query param pd_rd_i=ASIN
-        m = re.search(r"/dp/([A-Z0-9]{10})(?:[/?]|$)", url)
-        if m:
-            return m.group(1)
-        m = re.search(r"/gp/product/([A-Z0-9]{10})(?:[/?]|$)", url)
-        if m:
-            return m.group(1)
+    # Preço com desconto
+    price_block = soup.select_one("#corePriceDisplay_desktop_feature_div")
+    info['valor_desconto'] = _parse_price_block(price_block)
+    if not info['valor_desconto']:
+        price_block = soup.select_one("#subscriptionPrice")
+        info['valor_desconto'] = _parse_price_block(price_block)
+    if not info['valor_desconto']:
+        price_block = None
+        price_match = re.search(r'R\$\s*(\d+),(\d+)', text_of(soup, "span.aok-offscreen") or "")
+        if price_match:
+            info['valor_desconto'] = format_price(f"R${price_match.group(1)},{price_match.group(2)}")
+
+    # Preço original
+    original = (text_of(price_block, "span.basisPrice span.a-price span.a-offscreen")
+                or text_of(price_block, "span.a-size-small.a-color-secondary span.a-price span.a-offscreen"))
+    info['valor_original'] = format_price(original) if original else info['valor_desconto']
+
+    # Percentual de desconto
+    discount = text_of(price_block, ".savingPriceOverride")
+    if discount:
+        info['desconto_percentual'] = discount.replace('-', '').replace('%', '')
+    elif info['valor_original'] and info['valor_desconto']:
         try:
-            q = parse_qs(urlparse(url).query)
-            if "pd_rd_i" in q and q["pd_rd_i"]:
-                cand = q["pd_rd_i"][0]
-                if re.fullmatch(r"[A-Z0-9]{10}", cand):
-                    return cand
+            original = float(info['valor_original'].replace('R$', '').replace('.', '').replace(',', '.').strip())
+            desconto = float(info['valor_desconto'].replace('R$', '').replace('.', '').replace(',', '.').strip())
+            info['desconto_percentual'] = str(round(((original - desconto) / original) * 100, 1))
+        except Exception as e:
+            print(f"Erro ao calcular desconto: {str(e)}")
+
+    # Avaliação
+    rating_text = text_of(soup, "#averageCustomerReviews .a-icon-alt")
+    review_count = text_of(soup, "#acrCustomerReviewText")
+    if rating_text and review_count:
+        rating = rating_text.split()[0].replace(',', '.')
+        product_reviews = review_count.strip('()').replace('.', '')
+        info['avaliacao'] = f"{rating} ({product_reviews} avaliações)"
+
+    # Imagens candidatas (alta resolução primeiro)
+    candidates = []
+    for selector in ("#landingImage[data-old-hires]", "img[data-old-hires]", "#landingImage",
+                     "#main-image-container img", "#imgTagWrapperId img", ".imgTagWrapper img", "#imageBlock img"):
+        el = soup.select_one(selector)
+        if el is None:
+            continue
+        candidates += [el.get('data-old-hires'), el.get('src')]
+    dynamic = attr_of(soup, "img[data-a-dynamic-image]", "data-a-dynamic-image")
+    if dynamic:
+        try:
+            dynamic_images = json.loads(dynamic)
+            if dynamic_images:
+                candidates.append(max(dynamic_images.items(), key=lambda x: x[1][0])[0])
         except Exception:
             pass
-        return None
+    for pattern in (r'https://m\.media-amazon\.com/images/I/[^"\']+\._AC_SL\d+_\.jpg',
+                    r'https://m\.media-amazon\.com/images/I/[^"\']+\._AC_SX\d+_\.jpg'):
+        candidates += re.findall(pattern, html or "")[:3]
+
+    seen = set()
+    for url in candidates:
+        if url and url.startswith("http") and url not in seen:
+            seen.add(url)
+            info['imagens'].append(url)
+    return info
+
+def _collect_from_snapshot(driver, product_info):
+    """Coleta os dados do produto a partir de um único page_source. Retorna False se faltar algo."""
+    parsed = _parse_product_html(driver.page_source)
+    if not parsed['nome'] or not parsed['valor_desconto']:
+        return False
 
-    def _build_affiliate_link(product_url: str) -> str:
-        """
-        Gera um link de afiliado direto (curto e limpo) apenas com o link do produto.
-        Ex.: https://www.amazon.com.br/dp/ASIN?tag=SEU_TAG
-        """
-        if not AMAZON_AFFILIATE_TAG:
-            return product_url
+    image = next((u for u in parsed['imagens'] if is_valid_image_url(u)), None)
+    if not image:
+        return False
 
-        asin = _extract_asin(product_url)
-        parsed = urlparse(product_url)
-        base = f"{parsed.scheme or 'https'}://{parsed.netloc or 'www.amazon.com.br'}"
+    for field in ('nome', 'valor_desconto', 'valor_original', 'desconto_percentual', 'avaliacao'):
+        product_info[field] = parsed[field]
+    product_info['imagem'] = image
+    print(f"✅ Dados extraídos do snapshot: {product_info['nome'][:50]}...")
+    return True
 
-        if asin:
-            return f"{base}/dp/{asin}?tag={AMAZON_AFFILIATE_TAG}"
+def _collect_from_page(driver, url, product_info):
+    """Coleta os dados do produto já carregado via WebDriver (um comando por campo)."""
+    # 1. COLETA NOME (OBRIGATÓRIO)
+    try:
+        product_info['nome'] = WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.ID, "productTitle"))
+        ).text.strip()
+    except Exception as e:
+        print(f"Erro no nome: {str(e)}")
+        return False  # Aborta se não encontrar nome
 
-        # Fallback: preserva caminho e troca/insere tag
-        q = parse_qs(parsed.query)
-        q["tag"] = [AMAZON_AFFILIATE_TAG]
-        new_query = urlencode(q, doseq=True)
-        return urlunparse((parsed.scheme or "https", parsed.netloc, parsed.path, "", new_query, ""))
+    # 2. COLETA PREÇO COM DESCONTO (OBRIGATÓRIO)
+    try:
+        # Primeiro tenta o formato padrão
+        try:
+            price_block = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.ID, "corePriceDisplay_desktop_feature_div"))
+            )
+            whole = price_block.find_element(By.CSS_SELECTOR, "span.a-price-whole").text.strip()
+            fraction = price_block.find_element(By.CSS_SELECTOR, "span.a-price-fraction").text.strip()
+            price_str = f"R${whole},{fraction}"
+            product_info['valor_desconto'] = format_price(price_str)
+        except:
+            # Se falhar, tenta o formato de assinatura
+            try:
+                price_block = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.ID, "subscriptionPrice"))
+                )
+                whole = price_block.find_element(By.CSS_SELECTOR, "span.a-price-whole").text.strip()
+                fraction = price_block.find_element(By.CSS_SELECTOR, "span.a-price-fraction").text.strip()
+                price_str = f"R${whole},{fraction}"
+                product_info['valor_desconto'] = format_price(price_str)
+            except:
+                # Se ambos falharem, tenta pegar o preço do elemento aok-offscreen
+                try:
+                    price_text = driver.find_element(By.CSS_SELECTOR, "span.aok-offscreen").text
+                    price_match = re.search(r'R\$\s*(\d+),(\d+)', price_text)
+                    if price_match:
+                        whole = price_match.group(1)
+                        fraction = price_match.group(2)
+                        price_str = f"R${whole},{fraction}"
+                        product_info['valor_desconto'] = format_price(price_str)
+                    else:
+                        raise Exception("Formato de preço não reconhecido")
+                except:
+                    raise Exception("Não foi possível encontrar o preço do produto")
+    except Exception as e:
+        print(f"Erro no preço: {str(e)}")
+        return False  # Aborta se não encontrar preço
 
-    for url_info in product_links:
-        url = url_info['link']
-        category = url_info.get('category', 'Geral')
-        
-        product_info = {
-            'link': None,
-            'nome': None,
-            'valor_desconto': None,
-            'valor_original': None,
-            'desconto_percentual': None,
-            'avaliacao': None,
-            'imagem': None,
-            'categoria': category
-        }
+    # 4. COLETA DEMAIS INFORMAÇÕES (OPCIONAIS)
+    try:
+        # Preço original
+        original = price_block.find_element(
+            By.CSS_SELECTOR, "span.basisPrice span.a-price span.a-offscreen"
+        ).get_attribute("textContent").strip()
+        product_info['valor_original'] = format_price(original)
+    except:
+        try:
+            # Tenta outro seletor alternativo para o preço original
+            original = price_block.find_element(
+                By.CSS_SELECTOR, "span.a-size-small.a-color-secondary span.a-price span.a-offscreen"
+            ).get_attribute("textContent").strip()
+            product_info['valor_original'] = format_price(original)
+        except:
+            product_info['valor_original'] = product_info['valor_desconto']
 
+    try:
+        # Percentual de desconto
+        discount = price_block.find_element(
+            By.CSS_SELECTOR, ".savingPriceOverride"
+        ).text.strip()
+        product_info['desconto_percentual'] = discount.replace('-', '').replace('%', '')
+    except:
         try:
-            if not url.startswith(("http://", "https://")):
-                print(f"URL inválida: {url}")
+            # Cálculo manual do desconto
+            if product_info['valor_original'] and product_info['valor_desconto']:
+                # Remove R$ e converte para float
+                original = float(product_info['valor_original'].replace('R$', '')
+                                                            .replace('.', '')
+                                                            .replace(',', '.').strip())
+                desconto = float(product_info['valor_desconto'].replace('R$', '')
+                                                            .replace('.', '')
+                                                            .replace(',', '.').strip())
+
+                # Calcula porcentagem
+                percentual = ((original - desconto) / original) * 100
+                product_info['desconto_percentual'] = str(round(percentual, 1))
+
+        except Exception as e:
+            print(f"Erro ao calcular desconto: {str(e)}")
+            product_info['desconto_percentual'] = None
+    try:
+        # Avaliação
+        rating_element = driver.find_element(
+            By.CSS_SELECTOR, "#averageCustomerReviews .a-icon-alt"
+        )
+        rating = rating_element.get_attribute("textContent").split()[0].replace(',', '.')
+
+        # Quantidade de avaliações
+        review_count_element = driver.find_element(
+            By.CSS_SELECTOR, "#acrCustomerReviewText"
+        )
+        review_count = review_count_element.text.strip('()').replace('.', '')
+
+        # Formata a avaliação sem pontos
+        product_info['avaliacao'] = f"{rating} ({review_count} avaliações)"
+    except:
+        pass
+    try:
+        # Imagem - tenta múltiplos seletores para garantir captura
+        image_selectors = [
+            "#landingImage[data-old-hires]",  # Prioriza alta resolução
+            "img[data-old-hires]",
+            "#landingImage",
+            "#main-image-container img",
+            "#imgTagWrapperId img",
+            ".imgTagWrapper img",
+            "#imageBlock img"
+        ]
+
+        image_found = False
+        for selector in image_selectors:
+            try:
+                image_element = WebDriverWait(driver, 3).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+
+                # Tenta obter a melhor URL da imagem
+                data_old_hires = image_element.get_attribute('data-old-hires')
+                src = image_element.get_attribute('src')
+
+                if data_old_hires and is_valid_image_url(data_old_hires):
+                    product_info['imagem'] = data_old_hires
+                    print(f"✅ Imagem capturada (alta res): {data_old_hires}")
+                    image_found = True
+                    break
+                elif src and is_valid_image_url(src):
+                    product_info['imagem'] = src
+                    print(f"✅ Imagem capturada (normal): {src}")
+                    image_found = True
+                    break
+            except:
                 continue
 
+        # Se não encontrou imagem válida, tenta busca alternativa
+        if not image_found:
+            print(f"⚠️ Imagem não encontrada com seletores padrão, tentando busca alternativa...")
+            alternative_image = get_alternative_image(driver, product_info['nome'], url)
+            if alternative_image:
+                product_info['imagem'] = alternative_image
+                print(f"✅ Imagem alternativa encontrada: {alternative_image}")
+            else:
+                print(f"❌ Nenhuma imagem válida encontrada para {product_info['nome']}")
+                # Se não tem imagem válida, rejeita o produto
+                return False
+
+    except Exception as e:
+        print(f"❌ Erro ao capturar imagem: {e}")
+        # Se não conseguiu capturar imagem, rejeita o produto
+        return False
+
+    return True
+
+def _build_affiliate_link(product_url: str) -> str:
+    """
+    Gera um link de afiliado direto (curto e limpo) apenas com o link do produto.
+    Ex.: https://www.amazon.com.br/dp/ASIN?tag=SEU_TAG
+    """
+    if not AMAZON_AFFILIATE_TAG:
+        return product_url
+
+    asin = extract_asin(product_url)
+    parsed = urlparse(product_url)
+    base = f"{parsed.scheme or 'https'}://{parsed.netloc or 'www.amazon.com.br'}"
+
+    if asin:
+        return f"{base}/dp/{asin}?tag={AMAZON_AFFILIATE_TAG}"
+
+    # Fallback: preserva caminho e troca/insere tag
+    q = parse_qs(parsed.query)
+    q["tag"] = [AMAZON_AFFILIATE_TAG]
+    new_query = urlencode(q, doseq=True)
+    return urlunparse((parsed.scheme or "https", parsed.netloc, parsed.path, "", new_query, ""))
+
+def _new_product_info(category):
+    return {
+        'link': None,
+        'nome': None,
+        'valor_desconto': None,
+        'valor_original': None,
+        'desconto_percentual': None,
+        'avaliacao': None,
+        'imagem': None,
+        'categoria': category
+    }
+
+# Marcadores da página de verificação (captcha) da Amazon
+_CAPTCHA_MARKERS = (
+    "/errors/validateCaptcha",
+    "captchacharacters",
+    "Type the characters you see",
+    "Digite os caracteres",
+    "api-services-support@amazon.com",
+)
+
+def _is_captcha_page(html):
+    return any(marker in html for marker in _CAPTCHA_MARKERS)
+
+def _collect_via_http(url, product_info):
+    """
+    Busca /dp/{ASIN} pela sessão HTTP compartilhada e preenche product_info.
+
+    Retorna "ok", "captcha" ou "fallback" (faltou ASIN, HTML ou algum campo).
+    """
+    asin = extract_asin(url)
+    if not asin:
+        return "fallback"
+
+    started = time.time()
+    html = fetch_html(f"https://www.amazon.com.br/dp/{asin}", session_name="amazon")
+    if not html:
+        return "fallback"
+    if _is_captcha_page(html):
+        log(f"Captcha detectado na busca HTTP ({asin}), usando navegador")
+        return "captcha"
+
+    parsed = _parse_product_html(html)
+    if not parsed['nome'] or not parsed['valor_desconto']:
+        log(f"HTML estático incompleto ({asin}), usando navegador")
+        return "fallback"
+
+    image = next((u for u in parsed['imagens'] if is_valid_image_url(u)), None)
+    if not image:
+        log(f"Nenhuma imagem válida no HTML estático ({asin}), usando navegador")
+        return "fallback"
+
+    for field in ('nome', 'valor_desconto', 'valor_original', 'desconto_percentual', 'avaliacao'):
+        product_info[field] = parsed[field]
+    product_info['imagem'] = image
+    log(f"Produto extraído via HTTP em {time.time() - started:.2f}s: {product_info['nome'][:50]}...")
+    return "ok"
+
+def generate_affiliate_links(driver, product_links):
+    """Gera links de afiliados e coleta dados do produto"""
+    product_data = []
+
+    def _collect_product(url_info, preloaded=False):
+        """Coleta um produto; com preloaded=True usa a página já aberta na aba atual."""
+        url = url_info['link']
+        product_info = _new_product_info(url_info.get('category', 'Geral'))
+
+        try:
             # Navega para a página
-            driver.get(url)
+            if not preloaded:
+                polite_get(driver, url)
             
-            # 1. COLETA NOME (OBRIGATÓRIO)
-            try:
-                product_info['nome'] = WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.ID, "productTitle"))
-                ).text.strip()
-            except Exception as e:
-                print(f"Erro no nome: {str(e)}")
-                continue  # Aborta se não encontrar nome
-
-            # 2. COLETA PREÇO COM DESCONTO (OBRIGATÓRIO)
-            try:
-                # Primeiro tenta o formato padrão
+            # Dados do produto: snapshot único do DOM (padrão) ou extração campo a campo
+            collected = False
+            if snapshot_enabled():
                 try:
-                    price_block = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.ID, "corePriceDisplay_desktop_feature_div"))
+                    WebDriverWait(driver, 15).until(
+                        EC.presence_of_element_located((By.ID, "productTitle"))
                     )
-                    whole = price_block.find_element(By.CSS_SELECTOR, "span.a-price-whole").text.strip()
-                    fraction = price_block.find_element(By.CSS_SELECTOR, "span.a-price-fraction").text.strip()
-                    price_str = f"R${whole},{fraction}"
-                    product_info['valor_desconto'] = format_price(price_str)
-                except:
-                    # Se falhar, tenta o formato de assinatura
-                    try:
-                        price_block = WebDriverWait(driver, 10).until(
-                            EC.presence_of_element_located((By.ID, "subscriptionPrice"))
-                        )
-                        whole = price_block.find_element(By.CSS_SELECTOR, "span.a-price-whole").text.strip()
-                        fraction = price_block.find_element(By.CSS_SELECTOR, "span.a-price-fraction").text.strip()
-                        price_str = f"R${whole},{fraction}"
-                        product_info['valor_desconto'] = format_price(price_str)
-                    except:
-                        # Se ambos falharem, tenta pegar o preço do elemento aok-offscreen
-                        try:
-                            price_text = driver.find_element(By.CSS_SELECTOR, "span.aok-offscreen").text
-                            price_match = re.search(r'R\$\s*(\d+),(\d+)', price_text)
-                            if price_match:
-                                whole = price_match.group(1)
-                                fraction = price_match.group(2)
-                                price_str = f"R${whole},{fraction}"
-                                product_info['valor_desconto'] = format_price(price_str)
-                            else:
-                                raise Exception("Formato de preço não reconhecido")
-                        except:
-                            raise Exception("Não foi possível encontrar o preço do produto")
-            except Exception as e:
-                print(f"Erro no preço: {str(e)}")
-                continue  # Aborta se não encontrar preço
-
-            # 3. COLETA LINK AFILIADO (OBRIGATÓRIO)
+                except Exception as e:
+                    print(f"Erro no nome: {str(e)}")
+                    return None  # Aborta se não encontrar nome
+                collected = _collect_from_snapshot(driver, product_info)
+                if not collected:
+                    print("⚠️ Snapshot incompleto, usando extração via Selenium...")
+            if not collected and not _collect_from_page(driver, url, product_info):
+                return None
+
+            # COLETA LINK AFILIADO (OBRIGATÓRIO)
             try:
                 product_info['link'] = _build_affiliate_link(url)
             except Exception as e:
@@ -804,121 +1082,9 @@ def generate_affiliate_links(driver, product_links):
                     )
                 except Exception:
                     print(f"Erro no link afiliado: {repr(e)}")
-                continue  # Aborta se não gerar link
+                return None  # Aborta se não gerar link
 
-            # 4. COLETA DEMAIS INFORMAÇÕES (OPCIONAIS)
-            try:
-                # Preço original
-                original = price_block.find_element(
-                    By.CSS_SELECTOR, "span.basisPrice span.a-price span.a-offscreen"
-                ).get_attribute("textContent").strip()
-                product_info['valor_original'] = format_price(original)
-            except:
-                try:
-                    # Tenta outro seletor alternativo para o preço original
-                    original = price_block.find_element(
-                        By.CSS_SELECTOR, "span.a-size-small.a-color-secondary span.a-price span.a-offscreen"
-                    ).get_attribute("textContent").strip()
-                    product_info['valor_original'] = format_price(original)
-                except:
-                    product_info['valor_original'] = product_info['valor_desconto']
-
-            try:
-                # Percentual de desconto
-                discount = price_block.find_element(
-                    By.CSS_SELECTOR, ".savingPriceOverride"
-                ).text.strip()
-                product_info['desconto_percentual'] = discount.replace('-', '').replace('%', '')
-            except:
-                try:
-                    # Cálculo manual do desconto
-                    if product_info['valor_original'] and product_info['valor_desconto']:
-                        # Remove R$ e converte para float
-                        original = float(product_info['valor_original'].replace('R$', '')
-                                                                    .replace('.', '')
-                                                                    .replace(',', '.').strip())
-                        desconto = float(product_info['valor_desconto'].replace('R$', '')
-                                                                    .replace('.', '')
-                                                                    .replace(',', '.').strip())
-                        
-                        # Calcula porcentagem
-                        percentual = ((original - desconto) / original) * 100
-                        product_info['desconto_percentual'] = str(round(percentual, 1))
-                        
-                except Exception as e:
-                    print(f"Erro ao calcular desconto: {str(e)}")
-                    product_info['desconto_percentual'] = None
-            try:
-                # Avaliação
-                rating_element = driver.find_element(
-                    By.CSS_SELECTOR, "#averageCustomerReviews .a-icon-alt"
-                )
-                rating = rating_element.get_attribute("textContent").split()[0].replace(',', '.')
-                
-                # Quantidade de avaliações
-                review_count_element = driver.find_element(
-                    By.CSS_SELECTOR, "#acrCustomerReviewText"
-                )
-                review_count = review_count_element.text.strip('()').replace('.', '')
-                
-                # Formata a avaliação sem pontos
-                product_info['avaliacao'] = f"{rating} ({review_count} avaliações)"
-            except:
-                pass
-            try:
-                # Imagem - tenta múltiplos seletores para garantir captura
-                image_selectors = [
-                    "#landingImage[data-old-hires]",  # Prioriza alta resolução
-                    "img[data-old-hires]",
-                    "#landingImage",
-                    "#main-image-container img",
-                    "#imgTagWrapperId img",
-                    ".imgTagWrapper img",
-                    "#imageBlock img"
-                ]
-                
-                image_found = False
-                for selector in image_selectors:
-                    try:
-                        image_element = WebDriverWait(driver, 3).until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                        
-                        # Tenta obter a melhor URL da imagem
-                        data_old_hires = image_element.get_attribute('data-old-hires')
-                        src = image_element.get_attribute('src')
-                        
-                        if data_old_hires and is_valid_image_url(data_old_hires):
-                            product_info['imagem'] = data_old_hires
-                            print(f"✅ Imagem capturada (alta res): {data_old_hires}")
-                            image_found = True
-                            break
-                        elif src and is_valid_image_url(src):
-                            product_info['imagem'] = src
-                            print(f"✅ Imagem capturada (normal): {src}")
-                            image_found = True
-                            break
-                    except:
-                        continue
-                
-                # Se não encontrou imagem válida, tenta busca alternativa
-                if not image_found:
-                    print(f"⚠️ Imagem não encontrada com seletores padrão, tentando busca alternativa...")
-                    alternative_image = get_alternative_image(driver, product_info['nome'], url)
-                    if alternative_image:
-                        product_info['imagem'] = alternative_image
-                        print(f"✅ Imagem alternativa encontrada: {alternative_image}")
-                    else:
-                        print(f"❌ Nenhuma imagem válida encontrada para {product_info['nome']}")
-                        # Se não tem imagem válida, rejeita o produto
-                        continue
-                        
-            except Exception as e:
-                print(f"❌ Erro ao capturar imagem: {e}")
-                # Se não conseguiu capturar imagem, rejeita o produto
-                continue
-
-            product_data.append(product_info)
-            time.sleep(2)
+            return product_info
 
         except Exception as e:
             print(f"Erro crítico: {str(e)}")
@@ -929,13 +1095,56 @@ def generate_affiliate_links(driver, product_links):
                 driver.save_screenshot(f"erro_critico_{url.split('/')[-1]}.png")
             except Exception:
                 pass
+            return None
+
+    valid_links = []
+    for url_info in product_links:
+        if not url_info['link'].startswith(("http://", "https://")):
+            print(f"URL inválida: {url_info['link']}")
+            continue
+        valid_links.append(url_info)
+
+    # Caminho rápido por HTTP; o que falhar segue para o navegador.
+    # Depois de um captcha o restante do lote vai direto para o navegador.
+    if AMAZON_FETCH_MODE == "http":
+        browser_links = []
+        captcha_seen = False
+        for url_info in valid_links:
+            if captcha_seen:
+                browser_links.append(url_info)
+                continue
+            product_info = _new_product_info(url_info.get('category', 'Geral'))
+            outcome = _collect_via_http(url_info['link'], product_info)
+            if outcome == "ok":
+                product_info['link'] = _build_affiliate_link(url_info['link'])
+                product_data.append(product_info)
+                continue
+            captcha_seen = outcome == "captcha"
+            browser_links.append(url_info)
+        valid_links = browser_links
+
+    # Páginas de produto: uma por vez ou em várias abas paralelas (DETAIL_TABS)
+    if tab_concurrency() > 1:
+        for _, product_info in iter_tab_results(
+            driver, valid_links,
+            lambda d, info: _collect_product(info, preloaded=True),
+            url_of=lambda info: info['link'],
+            ready_selector="#productTitle"
+        ):
+            if product_info:
+                product_data.append(product_info)
+    else:
+        for url_info in valid_links:
+            product_info = _collect_product(url_info)
+            if product_info:
+                product_data.append(product_info)
 
     return product_data
 
 def amazon_scraper(driver):
     """Scraper principal que coleta ofertas de todas as categorias"""
     try:
-        driver.get("https://www.amazon.com.br")
+        polite_get(driver, "https://www.amazon.com.br")
         all_deals = []
         deals_by_category = {}
         
@@ -945,7 +1154,7 @@ def amazon_scraper(driver):
         for category in selected_categories:
             try:
                 log(f"Processando categoria: {category['name']}")
-                driver.get(category['url'])
+                polite_get(driver, category['url'])
                 
                 # Aguarda a página carregar
                 WebDriverWait(driver, 15).until(
@@ -959,9 +1168,6 @@ def amazon_scraper(driver):
                 deals_by_category[category['name']] = category_deals
                 all_deals.extend(category_deals)
                 
-                # Delay entre categorias para evitar sobrecarga
-                time.sleep(3)
-                
             except Exception as e:
                 log(f"Erro ao processar categoria {category['name']}: {e}")
                 if _is_webdriver_unreachable_error(e):
@@ -1007,7 +1213,6 @@ def amazon_scraper(driver):
             raise
         return []
 
-from time import sleep
 
 
 
@@ -1015,28 +1220,19 @@ def run_scraper():
     """Função principal que executa o scraper."""
     print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Iniciando execução do scraper...")
 
-    # Se WhatsApp estiver habilitado, não faz scraping até garantir que o WPP está ONLINE.
+    # WhatsApp fora do ar não trava o scraping: as mensagens dele ficam na outbox até reconectar
     if WHATSAPP_ENABLED:
-        if not wpp_wait_until_connected():
+        if not wpp_before_run():
             return
 
-    # Definir diretório temporário customizado para Chrome/Chromedriver
-    custom_tmp = tempfile.mkdtemp(prefix='chrome_tmp_')
-    os.environ['TMPDIR'] = custom_tmp
-    os.environ['TEMP'] = custom_tmp
-    os.environ['TMP'] = custom_tmp
-
-    driver = init_driver(custom_tmp=custom_tmp)
+    driver = _BROWSER_POOL.acquire()
 
     restart_count = 0
 
     def _restart_driver():
         nonlocal driver, restart_count
         restart_count += 1
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        _BROWSER_POOL.discard(driver)
 
         # Escalate strategies across restarts:
         # 1st restart: switch to old headless if using headless
@@ -1046,7 +1242,7 @@ def run_scraper():
                 os.environ["AMAZON_HEADLESS_MODE"] = "old"
             elif restart_count >= 2:
                 os.environ["AMAZON_HEADLESS"] = "false"
-        driver = init_driver(custom_tmp=custom_tmp)
+        driver = _BROWSER_POOL.acquire()
     try:
         print("🔄 Iniciando coleta de links de ofertas de todas as categorias...")
         try:
@@ -1080,10 +1276,32 @@ def run_scraper():
             print("❌ Nenhum produto foi processado com sucesso")
             return
 
+        # Remove variações quase idênticas dentro do próprio lote (ex.: mesma oferta em duas categorias)
+        products_data = dedupe_batch(
+            products_data,
+            text_of=lambda produto: produto.get('nome') or '',
+            threshold=SIMILARITY_THRESHOLD,
+            normalize=normalize_name
+        )
+
         sent_products = load_sent_products()
         novos_enviados = []
         produtos_nao_enviados = []
 
+        def on_sent(product_id, produto, ok):
+            # Chamado na thread de entrega quando o envio termina
+            if not ok:
+                produtos_nao_enviados.append(produto['nome'])
+                print(f"❌ Falha ao enviar produto: {produto['nome'][:50]}...")
+                return
+            sent_products.append(produto['nome'])
+            SENT_INDEX.add(produto['nome'])
+            record_sent_product(produto['nome'], product_id)
+            novos_enviados.append(produto['nome'])
+            print(f"✅ Produto enviado com sucesso: {produto['nome'][:50]}...")
+            SENT_IDS.add(product_id)
+            PRICE_HISTORY.mark_posted(product_id)
+
         print(f"📊 Processando {len(products_data)} produtos para envio...")
         
         for i, produto in enumerate(products_data, 1):
@@ -1096,36 +1314,36 @@ def run_scraper():
                 print(f"❌ Produto rejeitado por validação: {produto.get('nome', 'Sem nome')[:50]}...")
                 produtos_nao_enviados.append(produto.get('nome', 'Sem nome'))
                 continue
+
+            product_id = canonical_id('amazon', produto['link'])
+            PRICE_HISTORY.record(product_id, price=produto.get('valor_desconto'), old_price=produto.get('valor_original'))
             
             # Checa se já foi enviado
-            if is_product_already_sent(produto['nome'], sent_products):
+            if is_product_already_sent(produto['nome'], product_id):
                 print(f"⏭️ Produto já enviado anteriormente: {produto['nome'][:50]}...")
                 continue
 
+            price_ok, price_reason = PRICE_HISTORY.post_decision(product_id)
+            if not price_ok:
+                print(f"⏭️ Pulando {produto['nome'][:50]}: {price_reason}")
+                continue
+
             try:
-                # Tenta enviar o produto
-                enviado_telegram = send_telegram_message([produto], driver, sent_products)
-                
-                if enviado_telegram:
-                    for nome_produto in enviado_telegram:
-                        sent_products.append(nome_produto)
-                        novos_enviados.append(nome_produto)
-                        print(f"✅ Produto enviado com sucesso: {nome_produto[:50]}...")
-                    
-                    # Remove o mais antigo se passar do limite
-                    if len(sent_products) > MAX_HISTORY_SIZE:
-                        sent_products = sent_products[-MAX_HISTORY_SIZE:]
-                else:
+                # Enfileira o envio; o resultado chega em on_sent
+                queued = send_telegram_message(
+                    [produto], driver, sent_products,
+                    on_sent=functools.partial(on_sent, product_id)
+                )
+                if not queued:
                     produtos_nao_enviados.append(produto['nome'])
                     print(f"❌ Falha ao enviar produto: {produto['nome'][:50]}...")
-                    
-
 
             except Exception as e:
                 produtos_nao_enviados.append(produto['nome'])
                 print(f"❌ Erro ao processar produto {produto.get('nome', 'Sem nome')}: {str(e)}")
-            
-            sleep(1)  # Delay entre produtos
+
+        # Aguarda os envios pendentes antes do resumo
+        DELIVERY.drain()
 
         # Resumo final
         print(f"\n📈 RESUMO DA EXECUÇÃO:")
@@ -1140,7 +1358,6 @@ def run_scraper():
             print(f"   • Produtos não enviados: {[nome[:30] + '...' if len(nome) > 30 else nome for nome in produtos_nao_enviados]}")
 
         if not TEST_MODE and novos_enviados:
-            save_sent_products(sent_products)
             print(f"✅ Produtos salvos no histórico: {len(novos_enviados)}")
 
         if TEST_MODE:
@@ -1150,7 +1367,7 @@ def run_scraper():
         print(f"❌ Erro durante a execução do scraper: {e}")
     finally:
         try:
-            driver.quit()
+            _BROWSER_POOL.release(driver)
         except Exception:
             pass
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Execução finalizada.")
@@ -1158,6 +1375,8 @@ def run_scraper():
 def schedule_scraper():
     """Configura e inicia o agendamento do scraper."""
     print("Iniciando agendamento do scraper...")
+    # Outbox de execuções anteriores volta a ser reenviada já na partida
+    DELIVERY.start()
     
     if TEST_MODE:
         print("Modo de teste ativado - Executando imediatamente e a cada hora")
@@ -1202,6 +1421,9 @@ def schedule_scraper():
         schedule.every().day.at("09:00").do(run_scraper)
         schedule.every().day.at("10:00").do(run_scraper)
         schedule.every().day.at("11:00").do(run_scraper)
+
+    # Deixa um navegador quente esperando o próximo horário agendado
+    _BROWSER_POOL.warm()
     
     # Mantém o script rodando
     while True:
@@ -1210,6 +1432,7 @@ def schedule_scraper():
             time.sleep(60)  # Verifica a cada minuto se há tarefas pendentes
         except KeyboardInterrupt:
             print("\nEncerrando o scraper...")
+            _BROWSER_POOL.close()
             break
         except Exception as e:
             print(f"Erro no agendamento: {e}")
@@ -2,7 +2,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from datetime import datetime, timedelta
-import json
+import functools
+import itertools
 import os
 import random
 import re
@@ -18,7 +19,6 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 import undetected_chromedriver as uc
-from webdriver_manager.chrome import ChromeDriverManager
 from Telegram.tl_enviar import send_telegram_message
 
 # PM2/cwd differences can break local imports. Ensure project root is on sys.path.
@@ -27,11 +27,23 @@ if _PROJECT_DIR not in sys.path:
     sys.path.insert(0, _PROJECT_DIR)
 
 from whatsapp.wpp_connect import (
-    wpp_send_message,
-    wpp_check_connection_state,
-    wpp_wait_until_connected
+    wpp_before_run,
+    wpp_check_connection_state
 )
 from whatsapp.destinations import load_whatsapp_destinations
+from browser.pool import BrowserPool
+from browser.driver_cache import resolve_driver_path
+from browser.blocking import apply_blocking_profile
+from browser.readiness import install_readiness_tracker, polite_get, scroll_until_stable, wait_until_ready
+from browser.snapshot import snapshot_enabled, page_soup, text_of
+from browser.http_fetch import fetch_html, find_json_ld, iter_dicts, meta_content, next_data, parse_tree
+from browser.tabs import iter_tab_results, tab_concurrency
+from state.product_ids import canonical_id
+from state.sent_ids import SentIds
+from state.batch_dedupe import BatchDeduper
+from state.store import get_store
+from state.price_history import PriceHistory
+from delivery.pipeline import get_pipeline
 import platform
 import requests
 import subprocess
@@ -61,16 +73,35 @@ ADMIN_CHAT_IDS = os.getenv("ADMIN_CHAT_IDS", "").split(",") if os.getenv("ADMIN_
 
 # Configurações gerais
 if TEST_MODE:
-    print("Modo de teste ativado, salvando em promocoes_kabum_teste.json")
+    print("Modo de teste ativado, histórico separado (kabum_teste)")
     HISTORY_FILE = 'promocoes_kabum_teste.json'
+    SENT_IDS_FILE = 'sent_ids_kabum_teste.json'
+    STATE_SCOPE = 'kabum_teste'
 else:
     HISTORY_FILE = 'promocoes_kabum.json'
-    print("Salvando em promocoes_kabum.json")
+    SENT_IDS_FILE = 'sent_ids_kabum.json'
+    STATE_SCOPE = 'kabum'
+    print("Salvando histórico no banco de estado (kabum)")
 
 TOP_N_OFFERS = 10  # Top 10 produtos
+EXTRACT_MAX_RETRIES = 3
+# http: lê o JSON embutido na página via requests e só usa o navegador se faltar dado
+KABUM_FETCH_MODE = os.getenv("KABUM_FETCH_MODE", "http").lower()
 MAX_HISTORY_SIZE = 200
 SIMILARITY_THRESHOLD = 0.95
 
+# Estado compartilhado em SQLite: rotação de links, histórico e IDs enviados
+STATE = get_store()
+
+# IDs (/produto/<id>) já enviados: checados ainda na listagem, antes de abrir a página
+SENT_IDS = SentIds(STATE_SCOPE, legacy_path=SENT_IDS_FILE, revisit=not TEST_MODE)
+
+# Entregas (Telegram/WhatsApp) em uma fila assíncrona fora do loop de scraping
+DELIVERY = get_pipeline()
+
+# Série de preços por produto: evita repostar preço igual e (opcional) preço acima do mínimo recente
+PRICE_HISTORY = PriceHistory(enabled=not TEST_MODE)
+
 # URL da Kabum - múltiplas URLs para rotação
 KABUM_URLS = [
     "https://www.kabum.com.br/promocao/maisvendidos",
@@ -80,44 +111,33 @@ KABUM_URLS = [
     "https://www.kabum.com.br/promocao/perifericoskabum?page_number=1&page_size=40&facet_filters=&sort=&variant=catalog"
 ]
 
-# Arquivo para armazenar os links já utilizados
+# Arquivo antigo dos links já utilizados (importado uma vez para o banco de estado)
 USED_URLS_FILE = 'used_urls_kabum.json'
-
-def load_used_urls():
-    """Carrega a lista de URLs já utilizadas do arquivo"""
-    try:
-        with open(USED_URLS_FILE, 'r') as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
-
-def save_used_urls(used_urls):
-    """Salva a lista de URLs já utilizadas no arquivo"""
-    with open(USED_URLS_FILE, 'w') as f:
-        json.dump(list(used_urls), f)
+STATE.import_legacy('used_urls', 'kabum', USED_URLS_FILE)
 
 def get_rotated_urls():
     """Retorna 3 URLs aleatórias da lista de ofertas, evitando repetição"""
-    used_urls = load_used_urls()
-    
-    # Se todos os links já foram usados, limpa o histórico
-    if len(used_urls) >= len(KABUM_URLS):
-        log("Todos os links foram utilizados. Reiniciando histórico...")
-        used_urls.clear()
-        save_used_urls(used_urls)
-    
-    # Filtra apenas os links não utilizados
-    available_urls = [url for url in KABUM_URLS if url not in used_urls]
-    
-    # Se não houver links suficientes, usa todos os links disponíveis
-    num_urls = min(2, len(available_urls))
-    
-    # Escolhe aleatoriamente os links
-    selected_urls = random.sample(available_urls, num_urls)
-    
-    # Adiciona os links selecionados ao histórico
-    used_urls.update(selected_urls)
-    save_used_urls(used_urls)
+    # Leitura e marcação na mesma transação: a rodada não se perde pela metade
+    with STATE.transaction():
+        used_urls = STATE.used_urls('kabum')
+        
+        # Se todos os links já foram usados, limpa o histórico
+        if len(used_urls) >= len(KABUM_URLS):
+            log("Todos os links foram utilizados. Reiniciando histórico...")
+            STATE.reset_rotation('kabum')
+            used_urls.clear()
+        
+        # Filtra apenas os links não utilizados
+        available_urls = [url for url in KABUM_URLS if url not in used_urls]
+        
+        # Se não houver links suficientes, usa todos os links disponíveis
+        num_urls = min(2, len(available_urls))
+        
+        # Escolhe aleatoriamente os links
+        selected_urls = random.sample(available_urls, num_urls)
+        
+        # Adiciona os links selecionados ao histórico
+        STATE.mark_used('kabum', selected_urls)
     
     log(f"Links selecionados: {len(selected_urls)} de {len(available_urls)} disponíveis")
     return selected_urls
@@ -201,9 +221,11 @@ def init_driver():
         options = build_options()
         driver = uc.Chrome(
             options=options,
-            driver_executable_path=ChromeDriverManager().install(),
+            driver_executable_path=resolve_driver_path(browser_executable_path),
             browser_executable_path=browser_executable_path
         )
+        apply_blocking_profile(driver, "kabum")
+        install_readiness_tracker(driver)
         log("Navegador stealth iniciado")
         return driver
     except Exception as e:
@@ -215,32 +237,33 @@ def init_driver():
             driver = uc.Chrome(
                 options=options,
                 headless=False,
-                driver_executable_path=ChromeDriverManager().install()
+                driver_executable_path=resolve_driver_path()
             )
+            apply_blocking_profile(driver, "kabum")
+            install_readiness_tracker(driver)
             log("Navegador stealth iniciado (fallback)")
             return driver
         except Exception as e2:
             log(f"Erro fatal ao iniciar navegador: {e2}")
             raise
 
+# Navegador mantido vivo entre execuções agendadas
+_BROWSER_POOL = BrowserPool(init_driver, name="kabum")
+
 def load_promo_history():
     """Carrega o histórico de nomes de produtos já enviados"""
     if TEST_MODE:
         # Em modo de teste, não lê arquivo algum
         return []
-    try:
-        with open(HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    STATE.import_legacy('sent_products', STATE_SCOPE, HISTORY_FILE)
+    return STATE.recent_sent(STATE_SCOPE, MAX_HISTORY_SIZE)
 
-def save_promo_history(history):
-    """Salva o histórico de nomes de produtos"""
+def record_sent_promotion(name, product_id=None):
+    """Registra um produto enviado no histórico (um INSERT, sem reescrever tudo)"""
     if TEST_MODE:
         # Em modo de teste, não salva nada
         return
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f)
+    STATE.add_sent(STATE_SCOPE, name, product_id)
 
 
 
@@ -283,23 +306,16 @@ def get_product_links(driver):
     for url in urls_to_process:
         try:
             log(f"\nAcessando categoria: {url}")
-            driver.get(url)
+            polite_get(driver, url)
             
-            # Espera inicial combinada com delay
+            # Espera a listagem e a rede/DOM estabilizarem
             WebDriverWait(driver, 20).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, '#listing'))
             )
-            time.sleep(random.uniform(2, 4))
+            wait_until_ready(driver, "a[href*='/produto/']")
             
-            # Scroll dinâmico para carregar mais itens
-            last_height = driver.execute_script("return document.body.scrollHeight")
-            for _ in range(3):
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(random.uniform(1.5, 2.5))
-                new_height = driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    break
-                last_height = new_height
+            # Scroll dinâmico até a página parar de crescer
+            scroll_until_stable(driver, "a[href*='/produto/']", max_scrolls=3)
             
             # Encontra todos os links de produtos
             product_links = []
@@ -315,10 +331,16 @@ def get_product_links(driver):
                     links = driver.find_elements(By.CSS_SELECTOR, selector)
                     if links:
                         log(f"Encontrados {len(links)} links com selector: {selector}")
-                        for link in links[:TOP_N_OFFERS]:
+                        for link in links:
                             href = link.get_attribute('href')
-                            if href and '/produto/' in href:
-                                product_links.append(href)
+                            if not href or '/produto/' not in href or href in product_links:
+                                continue
+                            # Já enviado: nem abre a página
+                            if canonical_id('kabum', href) in SENT_IDS:
+                                continue
+                            product_links.append(href)
+                            if len(product_links) >= TOP_N_OFFERS:
+                                break
                         break
                 except Exception as e:
                     log(f"Erro com selector {selector}: {str(e)}")
@@ -328,9 +350,6 @@ def get_product_links(driver):
             log(f"Coletados {len(product_links)} links únicos de produtos da categoria")
             all_product_links.extend(product_links)
             
-            # Intervalo aleatório entre categorias
-            time.sleep(random.uniform(5, 10))
-            
         except Exception as e:
             log(f"Falha na categoria {url}: {str(e)}")
             continue
@@ -369,151 +388,148 @@ def encurtar_url(url):
         log(f"Erro ao encurtar URL: {str(e)}")
         return url
 
-def extract_product_details(driver, product_url):
-    """Extrai informações detalhadas de um produto individual"""
-    log(f"Acessando página do produto: {product_url}")
-    
-    try:
-        # Verifica se a sessão ainda é válida
+def _extract_fields_selenium(driver):
+    """Extrai os campos da página do produto via WebDriver (seletores com fallback)"""
+    wait = WebDriverWait(driver, 15)
+
+    # Nome do produto - captura primeiro para verificar se é gift card
+    product_name = "Nome não encontrado"
+    name_selectors = [
+        "h1[data-testid='product-name']",
+        "h1.sc-ff8a9791-6",
+        "h1",
+        "h2[data-testid='product-name']",
+        "h2"
+    ]
+
+    for selector in name_selectors:
         try:
-            driver.current_url
+            name_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+            product_name = name_element.text.strip()
+            break
         except:
-            log("Sessão do driver inválida, tentando reinicializar...")
-            driver = init_driver()
-        
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 15)
-        
-        # Nome do produto - captura primeiro para verificar se é gift card
-        product_name = "Nome não encontrado"
-        name_selectors = [
-            "h1[data-testid='product-name']",
-            "h1.sc-ff8a9791-6",
-            "h1",
-            "h2[data-testid='product-name']",
-            "h2"
-        ]
-        
-        for selector in name_selectors:
-            try:
-                name_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                product_name = name_element.text.strip()
-                break
-            except:
-                continue
-        
-        # Verifica se é gift card logo após capturar o nome
-        if is_gift_card(product_name):
-            log(f"Produto ignorado (gift card): {product_name}")
-            return None
-        
-        # Preços
-        old_price = None
-        discount_price = None
-        pix_price = None
-        pix_discount_percent = None
-        
-        # 1. Preço original (sempre buscar o maior valor do span.line-through)
-        try:
-            old_price_elems = driver.find_elements(By.CSS_SELECTOR, "span.text-black-600.text-xs.font-normal.line-through")
-            valores = []
-            for elem in old_price_elems:
+            continue
+
+    # Gift card: não vale a pena extrair o resto da página
+    if is_gift_card(product_name):
+        return {'name': product_name}
+
+    # Preços
+    old_price = None
+    discount_price = None
+    pix_price = None
+    pix_discount_percent = None
+
+    # 1. Preço original (sempre buscar o maior valor do span.line-through)
+    try:
+        old_price_elems = driver.find_elements(By.CSS_SELECTOR, "span.text-black-600.text-xs.font-normal.line-through")
+        valores = []
+        for elem in old_price_elems:
+            text = elem.text.strip()
+            valor = clean_price(text)
+            if valor:
+                valores.append(valor)
+        # Fallback: qualquer span com 'line-through'
+        if not valores:
+            generic_line_throughs = driver.find_elements(By.CSS_SELECTOR, "span.line-through")
+            for elem in generic_line_throughs:
                 text = elem.text.strip()
                 valor = clean_price(text)
                 if valor:
                     valores.append(valor)
-            # Fallback: qualquer span com 'line-through'
-            if not valores:
-                generic_line_throughs = driver.find_elements(By.CSS_SELECTOR, "span.line-through")
-                for elem in generic_line_throughs:
-                    text = elem.text.strip()
-                    valor = clean_price(text)
-                    if valor:
-                        valores.append(valor)
-            if valores:
-                old_price = max(valores)
-                log(f"Preço original encontrado: {old_price}")
-            else:
-                old_price = None
-        except Exception as e:
-            log(f"Preço original não encontrado: {str(e)}")
+        if valores:
+            old_price = max(valores)
+            log(f"Preço original encontrado: {old_price}")
+        else:
             old_price = None
-        
-        # 2. Preço PIX (h4.text-4xl.text-secondary-500.font-bold)
-        try:
-            pix_elems = driver.find_elements(By.CSS_SELECTOR, "h4.text-4xl.text-secondary-500.font-bold")
-            pix_valores = []
-            for elem in pix_elems:
-                pix_text = elem.text.strip()
-                valor = clean_price(pix_text)
-                if valor:
-                    pix_valores.append(valor)
-            if pix_valores:
-                pix_price = min(pix_valores)
-                log(f"Preço PIX encontrado: {pix_price}")
-            else:
-                pix_price = None
-        except Exception as e:
-            log(f"Preço PIX não encontrado: {str(e)}")
+    except Exception as e:
+        log(f"Preço original não encontrado: {str(e)}")
+        old_price = None
+
+    # 2. Preço PIX (h4.text-4xl.text-secondary-500.font-bold)
+    try:
+        pix_elems = driver.find_elements(By.CSS_SELECTOR, "h4.text-4xl.text-secondary-500.font-bold")
+        pix_valores = []
+        for elem in pix_elems:
+            pix_text = elem.text.strip()
+            valor = clean_price(pix_text)
+            if valor:
+                pix_valores.append(valor)
+        if pix_valores:
+            pix_price = min(pix_valores)
+            log(f"Preço PIX encontrado: {pix_price}")
+        else:
             pix_price = None
-        
-        # 3. Preço no cartão (opcional, não confundir com parcelamento)
-        # Não buscar no parcelamento, pois é valor dividido
-        discount_price = None
-        # Caso queira buscar preço à vista no cartão, adicionar lógica aqui se houver elemento específico
+    except Exception as e:
+        log(f"Preço PIX não encontrado: {str(e)}")
+        pix_price = None
 
-        # Avaliações
-        rating = None
-        rating_count = None
-        rating_selectors = [
-            "div.sc-781b7e7f-3 span.sc-781b7e7f-1",  # Nota específica
-            "span.sc-781b7e7f-1.hdvIZL",  # Nota com classe específica
-            "span[class*='hdvIZL']",  # Nota com classe parcial
-            "div.sc-781b7e7f-5 span",  # Número de avaliações
-            "span.sc-781b7e7f-5.cQKdQd",  # Número de avaliações com classe específica
-            "span[class*='cQKdQd']",  # Número de avaliações com classe parcial
-            "span.sc-5492faee-4",
-            "span[class*='rating']",
-            "div[class*='rating']",
-            "span[data-testid='rating']"
-        ]
-        
-        # Primeiro tenta encontrar o container de avaliações
-        rating_container_selectors = [
-            "div.sc-781b7e7f-3",
-            "div[class*='jSiwRS']",
-            "div[class*='rating']"
-        ]
-        
-        rating_container = None
-        for selector in rating_container_selectors:
-            try:
-                rating_container = driver.find_element(By.CSS_SELECTOR, selector)
-                if rating_container:
-                    log(f"Container de avaliações encontrado com: {selector}")
-                    break
-            except:
-                continue
-        
-        if rating_container:
-            # Extrai a nota
+    # 3. Preço no cartão (opcional, não confundir com parcelamento)
+    # Não buscar no parcelamento, pois é valor dividido
+    discount_price = None
+    # Caso queira buscar preço à vista no cartão, adicionar lógica aqui se houver elemento específico
+
+    # Avaliações
+    rating = None
+    rating_count = None
+    rating_selectors = [
+        "div.sc-781b7e7f-3 span.sc-781b7e7f-1",  # Nota específica
+        "span.sc-781b7e7f-1.hdvIZL",  # Nota com classe específica
+        "span[class*='hdvIZL']",  # Nota com classe parcial
+        "div.sc-781b7e7f-5 span",  # Número de avaliações
+        "span.sc-781b7e7f-5.cQKdQd",  # Número de avaliações com classe específica
+        "span[class*='cQKdQd']",  # Número de avaliações com classe parcial
+        "span.sc-5492faee-4",
+        "span[class*='rating']",
+        "div[class*='rating']",
+        "span[data-testid='rating']"
+    ]
+
+    # Primeiro tenta encontrar o container de avaliações
+    rating_container_selectors = [
+        "div.sc-781b7e7f-3",
+        "div[class*='jSiwRS']",
+        "div[class*='rating']"
+    ]
+
+    rating_container = None
+    for selector in rating_container_selectors:
+        try:
+            rating_container = driver.find_element(By.CSS_SELECTOR, selector)
+            if rating_container:
+                log(f"Container de avaliações encontrado com: {selector}")
+                break
+        except:
+            continue
+
+    if rating_container:
+        # Extrai a nota
+        try:
+            rating_element = rating_container.find_element(By.CSS_SELECTOR, "span.sc-781b7e7f-1.hdvIZL")
+            rating_text = rating_element.text.strip()
+            rating = float(rating_text)
+            log(f"Nota encontrada: {rating}")
+        except:
             try:
-                rating_element = rating_container.find_element(By.CSS_SELECTOR, "span.sc-781b7e7f-1.hdvIZL")
+                rating_element = rating_container.find_element(By.CSS_SELECTOR, "span[class*='hdvIZL']")
                 rating_text = rating_element.text.strip()
                 rating = float(rating_text)
                 log(f"Nota encontrada: {rating}")
             except:
-                try:
-                    rating_element = rating_container.find_element(By.CSS_SELECTOR, "span[class*='hdvIZL']")
-                    rating_text = rating_element.text.strip()
-                    rating = float(rating_text)
-                    log(f"Nota encontrada: {rating}")
-                except:
-                    pass
-            
-            # Extrai o número de avaliações
+                pass
+
+        # Extrai o número de avaliações
+        try:
+            count_element = rating_container.find_element(By.CSS_SELECTOR, "span.sc-781b7e7f-5.cQKdQd")
+            count_text = count_element.text.strip()
+            # Extrai apenas os números
+            count_match = re.search(r'\((\d+)\s*avaliações?\)', count_text)
+            if count_match:
+                rating_count = int(count_match.group(1))
+                log(f"Número de avaliações encontrado: {rating_count}")
+        except:
             try:
-                count_element = rating_container.find_element(By.CSS_SELECTOR, "span.sc-781b7e7f-5.cQKdQd")
+                count_element = rating_container.find_element(By.CSS_SELECTOR, "span[class*='cQKdQd']")
                 count_text = count_element.text.strip()
                 # Extrai apenas os números
                 count_match = re.search(r'\((\d+)\s*avaliações?\)', count_text)
@@ -521,108 +537,377 @@ def extract_product_details(driver, product_url):
                     rating_count = int(count_match.group(1))
                     log(f"Número de avaliações encontrado: {rating_count}")
             except:
-                try:
-                    count_element = rating_container.find_element(By.CSS_SELECTOR, "span[class*='cQKdQd']")
-                    count_text = count_element.text.strip()
-                    # Extrai apenas os números
-                    count_match = re.search(r'\((\d+)\s*avaliações?\)', count_text)
+                pass
+    else:
+        # Fallback para seletores antigos
+        for selector in rating_selectors:
+            try:
+                rating_elements = driver.find_elements(By.CSS_SELECTOR, selector)
+                for elem in rating_elements:
+                    rating_text = elem.text.strip()
+                    # Extrai rating e número de avaliações
+                    rating_match = re.search(r'(\d+\.?\d*)', rating_text)
+                    if rating_match:
+                        rating = float(rating_match.group(1))
+
+                    count_match = re.search(r'\((\d+)\)', rating_text)
                     if count_match:
                         rating_count = int(count_match.group(1))
-                        log(f"Número de avaliações encontrado: {rating_count}")
-                except:
-                    pass
-        else:
-            # Fallback para seletores antigos
-            for selector in rating_selectors:
-                try:
-                    rating_elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    for elem in rating_elements:
-                        rating_text = elem.text.strip()
-                        # Extrai rating e número de avaliações
-                        rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-                        if rating_match:
-                            rating = float(rating_match.group(1))
-                        
-                        count_match = re.search(r'\((\d+)\)', rating_text)
-                        if count_match:
-                            rating_count = int(count_match.group(1))
-                        
-                        if rating or rating_count:
-                            break
+
                     if rating or rating_count:
                         break
-                except:
-                    continue
-        
-        # Imagem do produto
-        image_url = None
-        img_selectors = [
-            "img[data-nimg='1']",  # Seletor específico para a imagem principal
-            "img[data-testid='product-image']",
-            "img.sc-ff8a9791-4",
-            "img[class*='product']",
-            "img[loading='lazy']",  # Imagens com loading lazy
-            "img"
-        ]
-        
-        for selector in img_selectors:
-            try:
-                img_elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for img in img_elements:
-                    src = img.get_attribute('src')
-                    # Verifica se é uma imagem válida da Kabum
-                    if src and ('kabum.com.br/produtos/fotos' in src or 'images' in src):
-                        # Verifica se tem dimensões adequadas (não é um ícone pequeno)
-                        width = img.get_attribute('width')
-                        height = img.get_attribute('height')
-                        
-                        # Se tem dimensões definidas, verifica se é uma imagem grande
-                        if width and height:
-                            try:
-                                w = int(width)
-                                h = int(height)
-                                if w >= 200 and h >= 200:  # Imagem com tamanho adequado
-                                    image_url = src
-                                    log(f"Imagem encontrada: {src}")
-                                    break
-                            except ValueError:
-                                # Se não consegue converter, assume que é válida
+                if rating or rating_count:
+                    break
+            except:
+                continue
+
+    # Imagem do produto
+    image_url = None
+    img_selectors = [
+        "img[data-nimg='1']",  # Seletor específico para a imagem principal
+        "img[data-testid='product-image']",
+        "img.sc-ff8a9791-4",
+        "img[class*='product']",
+        "img[loading='lazy']",  # Imagens com loading lazy
+        "img"
+    ]
+
+    for selector in img_selectors:
+        try:
+            img_elements = driver.find_elements(By.CSS_SELECTOR, selector)
+            for img in img_elements:
+                src = img.get_attribute('src')
+                # Verifica se é uma imagem válida da Kabum
+                if src and ('kabum.com.br/produtos/fotos' in src or 'images' in src):
+                    # Verifica se tem dimensões adequadas (não é um ícone pequeno)
+                    width = img.get_attribute('width')
+                    height = img.get_attribute('height')
+
+                    # Se tem dimensões definidas, verifica se é uma imagem grande
+                    if width and height:
+                        try:
+                            w = int(width)
+                            h = int(height)
+                            if w >= 200 and h >= 200:  # Imagem com tamanho adequado
                                 image_url = src
                                 log(f"Imagem encontrada: {src}")
                                 break
-                        else:
-                            # Se não tem dimensões definidas, assume que é válida
+                        except ValueError:
+                            # Se não consegue converter, assume que é válida
                             image_url = src
                             log(f"Imagem encontrada: {src}")
                             break
-                if image_url:
+                    else:
+                        # Se não tem dimensões definidas, assume que é válida
+                        image_url = src
+                        log(f"Imagem encontrada: {src}")
+                        break
+            if image_url:
+                break
+        except Exception as e:
+            log(f"Erro ao buscar imagem com selector {selector}: {str(e)}")
+            continue
+
+    return {
+        'name': product_name,
+        'old_price': old_price,
+        'discount_price': discount_price,
+        'pix_price': pix_price,
+        'pix_discount_percent': pix_discount_percent,
+        'rating': rating,
+        'rating_count': rating_count,
+        'image_url': image_url
+    }
+
+def _extract_fields_snapshot(soup):
+    """Extrai os campos da página do produto a partir de um snapshot do DOM (sem WebDriver)"""
+    product_name = "Nome não encontrado"
+    for selector in ("h1[data-testid='product-name']", "h1.sc-ff8a9791-6", "h1", "h2[data-testid='product-name']", "h2"):
+        name = text_of(soup, selector)
+        if name:
+            product_name = name
+            break
+
+    # Preço original: maior valor riscado
+    valores = [clean_price(text_of(el)) for el in soup.select("span.text-black-600.text-xs.font-normal.line-through")]
+    valores = [v for v in valores if v]
+    if not valores:
+        valores = [v for v in (clean_price(text_of(el)) for el in soup.select("span.line-through")) if v]
+    old_price = max(valores) if valores else None
+
+    # Preço PIX: menor valor destacado
+    pix_valores = [v for v in (clean_price(text_of(el)) for el in soup.select("h4.text-4xl.text-secondary-500.font-bold")) if v]
+    pix_price = min(pix_valores) if pix_valores else None
+
+    # Avaliações
+    rating = None
+    rating_count = None
+    rating_container = None
+    for selector in ("div.sc-781b7e7f-3", "div[class*='jSiwRS']", "div[class*='rating']"):
+        rating_container = soup.select_one(selector)
+        if rating_container is not None:
+            break
+
+    if rating_container is not None:
+        for selector in ("span.sc-781b7e7f-1.hdvIZL", "span[class*='hdvIZL']"):
+            try:
+                rating = float(text_of(rating_container, selector))
+                break
+            except (TypeError, ValueError):
+                continue
+        for selector in ("span.sc-781b7e7f-5.cQKdQd", "span[class*='cQKdQd']"):
+            count_match = re.search(r'\((\d+)\s*avaliações?\)', text_of(rating_container, selector) or "")
+            if count_match:
+                rating_count = int(count_match.group(1))
+                break
+    else:
+        for selector in ("div.sc-781b7e7f-3 span.sc-781b7e7f-1", "span.sc-781b7e7f-1.hdvIZL", "span[class*='hdvIZL']",
+                         "div.sc-781b7e7f-5 span", "span.sc-781b7e7f-5.cQKdQd", "span[class*='cQKdQd']",
+                         "span.sc-5492faee-4", "span[class*='rating']", "div[class*='rating']",
+                         "span[data-testid='rating']"):
+            for elem in soup.select(selector):
+                rating_text = text_of(elem) or ""
+                rating_match = re.search(r'(\d+\.?\d*)', rating_text)
+                if rating_match:
+                    rating = float(rating_match.group(1))
+                count_match = re.search(r'\((\d+)\)', rating_text)
+                if count_match:
+                    rating_count = int(count_match.group(1))
+                if rating or rating_count:
                     break
-            except Exception as e:
-                log(f"Erro ao buscar imagem com selector {selector}: {str(e)}")
+            if rating or rating_count:
+                break
+
+    # Imagem do produto
+    image_url = None
+    for selector in ("img[data-nimg='1']", "img[data-testid='product-image']", "img.sc-ff8a9791-4",
+                     "img[class*='product']", "img[loading='lazy']", "img"):
+        for img in soup.select(selector):
+            src = img.get('src')
+            if not src or not ('kabum.com.br/produtos/fotos' in src or 'images' in src):
                 continue
+            width = img.get('width')
+            height = img.get('height')
+            try:
+                if width and height and (int(width) < 200 or int(height) < 200):
+                    continue
+            except ValueError:
+                pass
+            image_url = src
+            break
+        if image_url:
+            break
+
+    return {
+        'name': product_name,
+        'old_price': old_price,
+        'discount_price': None,
+        'pix_price': pix_price,
+        'pix_discount_percent': None,
+        'rating': rating,
+        'rating_count': rating_count,
+        'image_url': image_url
+    }
+
+def _to_price(value):
+    """Converte preço vindo do JSON (número ou texto "R$ 1.234,56") em float"""
+    if isinstance(value, bool) or value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    return clean_price(str(value))
+
+def _collect_strings(value, out):
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _collect_strings(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_strings(v, out)
+    return out
+
+def _pick_kabum_image(candidates):
+    """Escolhe a maior foto do produto (sufixos _gg > _g > demais)"""
+    fotos = [u for u in candidates if isinstance(u, str) and 'kabum.com.br/produtos/fotos' in u]
+    for suffix in ('_gg.', '_g.'):
+        for url in fotos:
+            if suffix in url:
+                return url
+    return fotos[0] if fotos else None
+
+def _extract_fields_http(html):
+    """Extrai os campos do JSON embutido na página (__NEXT_DATA__ e JSON-LD), sem navegador"""
+    tree = parse_tree(html)
+    if tree is None:
+        return None
+
+    # Dados do catálogo no payload do Next.js (pode vir serializado como string)
+    product = {}
+    for candidate in iter_dicts(next_data(tree) or {}):
+        if candidate.get('name') and ('priceWithDiscount' in candidate or 'oldPrice' in candidate):
+            product = candidate
+            break
+    offer = product.get('offer') if isinstance(product.get('offer'), dict) else {}
+
+    ld = find_json_ld(tree, "Product") or {}
+    ld_offers = ld.get('offers') or {}
+    if isinstance(ld_offers, list):
+        ld_offers = ld_offers[0] if ld_offers else {}
+    ld_rating = ld.get('aggregateRating') or {}
+
+    product_name = product.get('name') or ld.get('name') or "Nome não encontrado"
+    product_name = " ".join(str(product_name).split())
+
+    # Preço PIX (à vista)
+    pix_price = (_to_price(offer.get('priceWithDiscount')) or _to_price(product.get('priceWithDiscount'))
+                 or _to_price(ld_offers.get('price')) or _to_price(ld_offers.get('lowPrice')))
+
+    # Preço original: só o oldPrice (equivale ao valor riscado); sem ele o produto não tem "De:"
+    old_price = _to_price(offer.get('oldPrice')) or _to_price(product.get('oldPrice'))
+    if old_price and pix_price and old_price <= pix_price:
+        old_price = None
+
+    rating = None
+    rating_count = None
+    try:
+        raw_rating = product.get('rating') or product.get('ratingValue') or ld_rating.get('ratingValue')
+        rating = float(raw_rating) if raw_rating not in (None, "") else None
+    except (TypeError, ValueError):
+        rating = None
+    try:
+        raw_count = (product.get('ratingCount') or product.get('ratingNumber')
+                     or ld_rating.get('reviewCount') or ld_rating.get('ratingCount'))
+        rating_count = int(raw_count) if raw_count not in (None, "") else None
+    except (TypeError, ValueError):
+        rating_count = None
+    if not rating:
+        rating = None
+
+    image_candidates = _collect_strings([product.get('photos'), product.get('images'), product.get('image'),
+                                         product.get('thumbnail'), ld.get('image')], [])
+    image_candidates.append(meta_content(tree, "og:image"))
+    image_url = _pick_kabum_image(image_candidates)
+
+    return {
+        'name': product_name,
+        'old_price': old_price,
+        # Preço no cartão fica de fora, como no Selenium e no snapshot: mesma mensagem e mesmo histórico por qualquer caminho
+        'discount_price': None,
+        'pix_price': pix_price,
+        'pix_discount_percent': None,
+        'rating': rating,
+        'rating_count': rating_count,
+        'image_url': image_url
+    }
+
+def _fields_incomplete(fields):
+    return fields['name'] == "Nome não encontrado" or not (fields['old_price'] and fields['pix_price'])
+
+def _build_product(product_url, fields):
+    """Monta o produto final (link de afiliado incluso); None para gift cards"""
+    product_name = fields['name']
+
+    # Verifica se é gift card logo após capturar o nome
+    if is_gift_card(product_name):
+        log(f"Produto ignorado (gift card): {product_name}")
+        return None
+
+    # Gera link de afiliado
+    affiliate_url = gerar_link_afiliado(product_url)
+    # Encurta o link de afiliado
+    affiliate_url_short = encurtar_url(affiliate_url)
+
+    return {
+        'name': product_name,
+        'url': product_url,
+        'affiliate_url': affiliate_url_short,
+        'old_price': fields['old_price'],
+        'discount_price': fields['discount_price'],
+        'pix_price': fields['pix_price'],
+        'pix_discount_percent': fields['pix_discount_percent'],
+        'rating': fields['rating'],
+        'rating_count': fields['rating_count'],
+        'image_url': fields['image_url']
+    }
+
+def extract_product_details_http(product_url):
+    """Busca a página por HTTP e extrai os campos do JSON embutido
+
+    Retorna (ok, produto): ok=False indica que é preciso recorrer ao navegador.
+    """
+    started = time.time()
+    html = fetch_html(product_url, session_name="kabum")
+    fields = _extract_fields_http(html) if html else None
+    if fields is None:
+        log(f"HTTP sem conteúdo utilizável, usando navegador: {product_url}")
+        return False, None
+    if _fields_incomplete(fields) and not is_gift_card(fields['name']):
+        log(f"JSON incompleto ({fields}), usando navegador: {product_url}")
+        return False, None
+    log(f"Produto extraído via HTTP em {time.time() - started:.2f}s: {fields['name'][:50]}")
+    return True, _build_product(product_url, fields)
+
+def extract_product_details(driver, product_url, preloaded=False):
+    """Extrai informações detalhadas de um produto individual
+
+    Com preloaded=True usa a página já carregada na aba atual (sem driver.get).
+    """
+    log(f"Acessando página do produto: {product_url}")
+    
+    try:
+        # Verifica se a sessão ainda é válida
+        try:
+            driver.current_url
+        except:
+            log("Sessão do driver inválida, tentando reinicializar...")
+            driver = init_driver()
         
-        # Gera link de afiliado
-        affiliate_url = gerar_link_afiliado(product_url)
-        # Encurta o link de afiliado
-        affiliate_url_short = encurtar_url(affiliate_url)
+        if not preloaded:
+            polite_get(driver, product_url)
         
-        return {
-            'name': product_name,
-            'url': product_url,
-            'affiliate_url': affiliate_url_short,
-            'old_price': old_price,
-            'discount_price': discount_price,
-            'pix_price': pix_price,
-            'pix_discount_percent': pix_discount_percent,
-            'rating': rating,
-            'rating_count': rating_count,
-            'image_url': image_url
-        }
+        # Campos: snapshot único do DOM (padrão) ou extração campo a campo
+        fields = None
+        if snapshot_enabled():
+            try:
+                WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1, h2")))
+            except TimeoutException:
+                log("Título não apareceu em 15s, tentando snapshot mesmo assim")
+            fields = _extract_fields_snapshot(page_soup(driver))
+            if _fields_incomplete(fields) and not is_gift_card(fields['name']):
+                log("Snapshot incompleto, usando extração via Selenium...")
+                fields = None
+        if fields is None:
+            fields = _extract_fields_selenium(driver)
+
+        return _build_product(product_url, fields)
         
     except Exception as e:
         log(f"Erro ao extrair detalhes do produto: {str(e)}")
         return None
 
+def _extract_with_retries(driver, product_url, sent_promotions, preloaded=False):
+    """Extrai detalhes do produto com retry; retorna None se falhar ou se já foi enviado"""
+    product = None
+    for retry in range(EXTRACT_MAX_RETRIES):
+        try:
+            product = extract_product_details(driver, product_url, preloaded=preloaded and retry == 0)
+            if product:
+                # Verifica se já foi enviado antes de continuar
+                if _already_sent(product_url, product['name'], sent_promotions):
+                    log(f"Produto já enviado: {product['name'][:50]}...")
+                    return None
+                return product  # Produto válido e não duplicado
+            log(f"Tentativa {retry + 1}/{EXTRACT_MAX_RETRIES} falhou - produto retornou None")
+        except Exception as e:
+            log(f"Tentativa {retry + 1}/{EXTRACT_MAX_RETRIES} falhou com erro: {str(e)}")
+        
+        if retry < EXTRACT_MAX_RETRIES - 1:
+            log(f"Aguardando 3 segundos antes da próxima tentativa...")
+            time.sleep(3)
+    return None
+
 def escape_markdown(text):
     """Escapa apenas caracteres especiais do Markdown que realmente precisam ser escapados"""
     if not text:
@@ -719,18 +1004,38 @@ def is_duplicate_product(product_name, sent_names):
     name = product_name.strip().lower()
     return any(isinstance(sent, str) and name == sent.strip().lower() for sent in sent_names)
 
+def _already_sent(product_url, product_name, sent_names):
+    """Produto já enviado? Se o próprio ID já foi postado, quem decide o repost é o histórico de preços"""
+    if PRICE_HISTORY.was_posted(canonical_id('kabum', product_url)):
+        return False
+    return is_duplicate_product(product_name, sent_names)
+
+def _after_delivery(name, product_id, sent_promotions, result):
+    """Pós-envio (thread de entrega): salva no histórico se pelo menos um dos envios foi bem-sucedido"""
+    if not (result['telegram'] or result['whatsapp'] or result.get('queued')):
+        log(f"Erro ao enviar mensagem para Telegram e WhatsApp: {name[:50]}")
+        return
+    if result['telegram'] or result['whatsapp']:
+        log(f"Mensagem enviada com sucesso: {name[:50]}")
+    else:
+        log(f"Envio pendente na outbox, será repetido em segundo plano: {name[:50]}")
+    sent_promotions.append(name)
+    SENT_IDS.add(product_id)
+    PRICE_HISTORY.mark_posted(product_id)
+    record_sent_promotion(name, product_id)
+
 def check_promotions():
     """Função principal que verifica e envia promoções"""
     log("Iniciando verificação de promoções da Kabum...")
     
     if WHATSAPP_ENABLED:
-        # Se WhatsApp estiver habilitado, não faz scraping até garantir que o WPP está ONLINE.
-        if not wpp_wait_until_connected():
+        # WhatsApp fora do ar não trava o scraping: as mensagens dele ficam na outbox até reconectar
+        if not wpp_before_run():
             return
 
     driver = None
     try:
-        driver = init_driver()
+        driver = _BROWSER_POOL.acquire()
         
         # Carrega histórico
         sent_promotions = load_promo_history()
@@ -745,49 +1050,61 @@ def check_promotions():
         if TEST_MODE:
             log(f"Encontrados {len(product_links)} links para processar")
         
-        # Processa cada produto individualmente
-        for i, product_url in enumerate(product_links):
-            log(f"Processando produto {i+1}/{len(product_links)}")
-            
-            # Verifica se o driver ainda está válido
-            try:
-                driver.current_url
-            except:
-                log("Driver inválido, reinicializando...")
+        # Modo HTTP: produtos resolvidos sem navegador; os demais vão para o Selenium
+        browser_links = []
+
+        def http_results():
+            for product_url in product_links:
+                ok, product = extract_product_details_http(product_url)
+                if not ok:
+                    browser_links.append(product_url)
+                    continue
+                if product and _already_sent(product_url, product['name'], sent_promotions):
+                    log(f"Produto já enviado: {product['name'][:50]}...")
+                    product = None
+                yield product_url, product
+
+        # Processa cada produto: um por vez ou em várias abas paralelas (DETAIL_TABS)
+        def sequential_results():
+            nonlocal driver
+            for product_url in browser_links:
+                # Verifica se o driver ainda está válido
                 try:
-                    driver.quit()
+                    driver.current_url
                 except:
-                    pass
-                driver = init_driver()
-            
-            # Extrai detalhes do produto com retry
-            product = None
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    product = extract_product_details(driver, product_url)
-                    if product:
-                        # Verifica se já foi enviado antes de continuar
-                        is_duplicate = is_duplicate_product(product['name'], sent_promotions)
-                        if is_duplicate:
-                            log(f"Produto já enviado: {product['name'][:50]}...")
-                            product = None  # Marca como None para não processar
-                            break
-                        else:
-                            break  # Produto válido e não duplicado
-                    else:
-                        log(f"Tentativa {retry + 1}/{max_retries} falhou - produto retornou None")
-                except Exception as e:
-                    log(f"Tentativa {retry + 1}/{max_retries} falhou com erro: {str(e)}")
-                
-                if retry < max_retries - 1:
-                    log(f"Aguardando 3 segundos antes da próxima tentativa...")
-                    time.sleep(3)
+                    log("Driver inválido, reinicializando...")
+                    _BROWSER_POOL.discard(driver)
+                    driver = _BROWSER_POOL.acquire()
+                yield product_url, _extract_with_retries(driver, product_url, sent_promotions)
+
+        def browser_results():
+            if not browser_links:
+                return
+            if tab_concurrency() > 1:
+                yield from iter_tab_results(
+                    driver, browser_links,
+                    lambda d, u: _extract_with_retries(d, u, sent_promotions, preloaded=True),
+                    ready_selector="h1"
+                )
+            else:
+                yield from sequential_results()
+
+        if KABUM_FETCH_MODE == "http":
+            results = itertools.chain(http_results(), browser_results())
+        else:
+            browser_links.extend(product_links)
+            results = browser_results()
+
+        # Mesmo critério de is_similar_product (Jaccard das palavras), com blocos por token
+        batch_seen = BatchDeduper(threshold=SIMILARITY_THRESHOLD, metric="jaccard")
+
+        for i, (product_url, product) in enumerate(results):
+            log(f"Processando produto {i+1}/{len(product_links)}")
             
             # Validação dos dados obrigatórios
             dados_faltando = []
             if not product:
-                log(f"Erro ao extrair detalhes do produto {i+1} após {max_retries} tentativas ou produto já enviado/gift card")
+                log(f"Erro ao extrair detalhes do produto {i+1} após {EXTRACT_MAX_RETRIES} tentativas ou produto já enviado/gift card")
                 continue
             if not product.get('name'):
                 dados_faltando.append('nome')
@@ -803,9 +1120,23 @@ def check_promotions():
                 _notify_admin_missing_data(product_url, dados_faltando, product.get('name'))
                 log(f"Produto ignorado por falta de dados obrigatórios: {', '.join(dados_faltando)} - {product.get('name', 'Nome não encontrado')}")
                 continue
+            product_id = canonical_id('kabum', product_url)
+            PRICE_HISTORY.record(
+                product_id,
+                price=product.get('discount_price'),
+                old_price=product.get('old_price'),
+                pix_price=product.get('pix_price')
+            )
+            if batch_seen.check_and_add(product['name']):
+                log(f"Produto similar a outro deste lote: {product['name'][:50]}...")
+                continue
+            price_ok, price_reason = PRICE_HISTORY.post_decision(product_id)
+            if not price_ok:
+                log(f"Pulando {product['name'][:50]}: {price_reason}")
+                continue
             
             # Verifica se já foi enviado (verificação adicional)
-            is_duplicate = is_duplicate_product(product['name'], sent_promotions)
+            is_duplicate = _already_sent(product_url, product['name'], sent_promotions)
             
             if not is_duplicate:
                 log(f"Enviando produto: {product['name'][:50]}...")
@@ -819,48 +1150,22 @@ def check_promotions():
                 # Formata mensagem
                 message = format_telegram_message(product)
                 
-                # Envia para o Telegram
-                telegram_success = send_telegram_message(
-                    message=message,
+                # Telegram + WhatsApp em segundo plano: o navegador segue para o próximo produto
+                future = DELIVERY.submit(
+                    message,
                     image_url=product.get('image_url'),
-                    bot_token=TELEGRAM_BOT_TOKEN,
-                    chat_id=TELEGRAM_GROUP_ID
+                    telegram={'bot_token': TELEGRAM_BOT_TOKEN, 'chat_id': TELEGRAM_GROUP_ID},
+                    whatsapp=load_whatsapp_destinations() if WHATSAPP_ENABLED else None,
+                    label=product['name'][:50],
+                    on_done=functools.partial(_after_delivery, product['name'], product_id, sent_promotions),
+                    # Falhas ficam na outbox para nova tentativa (fora do modo teste)
+                    idempotency_key=None if TEST_MODE else PRICE_HISTORY.post_key(product_id)
                 )
-                
-                # Envia para WhatsApp se habilitado
-                whatsapp_success = False
-                if WHATSAPP_ENABLED:
-                    try:
-                        destinations = load_whatsapp_destinations()
-                        whatsapp_success = wpp_send_message(
-                            destinations=destinations,
-                            message=message,
-                            image_url=product.get('image_url')
-                        )
-                        if whatsapp_success:
-                            log("Mensagem enviada com sucesso para WhatsApp")
-                    except Exception as e:
-                        log(f"Erro ao enviar para WhatsApp: {str(e)}")
-                
-                # Salva no histórico se pelo menos um dos envios foi bem-sucedido
-                if telegram_success or whatsapp_success:
-                    log("Mensagem enviada com sucesso")
-                    # Adiciona ao histórico
-                    sent_promotions.append(product['name'])
-                    if TEST_MODE:
+                if TEST_MODE:
+                    result = future.result()
+                    if result['telegram'] or result['whatsapp']:
                         log('Modo teste: 1 produto enviado, encerrando.')
                         break
-                    
-                    # Mantém apenas os últimos MAX_HISTORY_SIZE
-                    if len(sent_promotions) > MAX_HISTORY_SIZE:
-                        sent_promotions = sent_promotions[-MAX_HISTORY_SIZE:]
-                    
-                    save_promo_history(sent_promotions)
-                else:
-                    log("Erro ao enviar mensagem para Telegram e WhatsApp")
-                
-                # Pausa entre envios
-                time.sleep(random.uniform(3, 7))
 
 
             else:
@@ -873,14 +1178,18 @@ def check_promotions():
     finally:
         if driver:
             try:
-                driver.quit()
-                log("Navegador fechado")
+                _BROWSER_POOL.release(driver)
+                log("Navegador devolvido ao pool")
             except:
-                log("Erro ao fechar navegador")
+                log("Erro ao devolver navegador ao pool")
+        # Só encerra a rodada com os envios concluídos (histórico atualizado)
+        DELIVERY.drain()
 
 def schedule_scraper():
     """Agenda a execução do scraper"""
     log("Agendando execução do scraper da Kabum...")
+    # Outbox de execuções anteriores volta a ser reenviada já na partida
+    DELIVERY.start()
 
     # Agenda para executar a cada hora, nos minutos 15
     for h in range(24):
@@ -898,6 +1207,9 @@ def schedule_scraper():
 
     log("Scraper da Kabum agendado para executar todo dia nos minutos 15 de cada hora")
 
+    # Deixa um navegador quente esperando o próximo horário agendado
+    _BROWSER_POOL.warm()
+
     # Loop infinito para garantir que o agendamento continue rodando
     while True:
         try:
@@ -905,6 +1217,7 @@ def schedule_scraper():
             time.sleep(10)
         except KeyboardInterrupt:
             log("Encerrando o scraper...")
+            _BROWSER_POOL.close()
             break
         except Exception as e:
             log(f"Erro no agendamento: {e}")
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from datetime import datetime, timedelta
+import functools
 import os
 import re
 import shlex
@@ -22,7 +23,6 @@ from selenium.common.exceptions import NoSuchElementException
 import platform
 from selenium.common.exceptions import WebDriverException
 import undetected_chromedriver as uc
-from webdriver_manager.chrome import ChromeDriverManager
 import subprocess
 import random
 import requests
@@ -79,11 +79,23 @@ if _PROJECT_DIR not in sys.path:
     sys.path.insert(0, _PROJECT_DIR)
 
 from whatsapp.wpp_connect import (
-    wpp_send_message,
-    wpp_check_connection_state,
-    wpp_wait_until_connected
+    wpp_before_run,
+    wpp_check_connection_state
 )
 from whatsapp.destinations import load_whatsapp_destinations
+from browser.pool import BrowserPool
+from browser.driver_cache import resolve_driver_path
+from browser.blocking import apply_blocking_profile
+from browser.readiness import install_readiness_tracker, polite_get, scroll_until_stable, wait_for_js, wait_until_ready
+from browser.snapshot import snapshot_enabled, page_soup, text_of, attr_of
+from browser.tabs import iter_tab_results, tab_concurrency
+from state.product_ids import canonical_id
+from state.sent_ids import SentIds
+from state.fuzzy_index import FuzzyIndex
+from state.batch_dedupe import BatchDeduper, dedupe_batch
+from state.store import get_store
+from state.price_history import PriceHistory
+from delivery.pipeline import get_pipeline
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(line_buffering=True)
@@ -118,11 +130,11 @@ COOKIES = json.loads(os.getenv("ML_COOKIES"))
 
 # Configurações gerais
 if TEST_MODE:
-    print("Modo de teste ativado, salvando em promocoes_teste.json")
+    print("Modo de teste ativado, histórico não será salvo")
     HISTORY_FILE = 'promocoes_teste.json'
 else:
     HISTORY_FILE = 'promocoes_ml.json'
-    print("Salvando em promocoes_ml.json")
+    print("Salvando histórico no banco de estado (ml)")
 
 TOP_N_OFFERS = int(os.getenv("TOP_N_OFFERS_TESTE") if TEST_MODE else os.getenv("TOP_N_OFFERS"))
 
@@ -150,46 +162,38 @@ OFFER_URLS = [
     "https://www.mercadolivre.com.br/ofertas?container_id=MLB783320-1&domain_id=MLB-SUPPLEMENTS#filter_applied=domain_id&filter_position=3&is_recommended_domain=true&origin=scut"
 ]
 
-# Arquivo para armazenar os links já utilizados
+# Arquivo antigo dos links já utilizados (importado uma vez para o banco de estado)
 USED_URLS_FILE = 'used_urls_ml.json'
 
 FORCE_RUN_ON_START = os.getenv("FORCE_RUN_ON_START", "false").lower() == "true"
 
-def load_used_urls():
-    """Carrega a lista de URLs já utilizadas do arquivo"""
-    try:
-        with open(USED_URLS_FILE, 'r') as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
-
-def save_used_urls(used_urls):
-    """Salva a lista de URLs já utilizadas no arquivo"""
-    with open(USED_URLS_FILE, 'w') as f:
-        json.dump(list(used_urls), f)
+# Estado compartilhado em SQLite: rotação de links, histórico e IDs enviados
+STATE = get_store()
+STATE.import_legacy('used_urls', 'ml', USED_URLS_FILE)
 
 def get_rotated_urls():
     """Retorna 3 URLs aleatórias da lista de ofertas, evitando repetição"""
-    used_urls = load_used_urls()
-    
-    # Se todos os links já foram usados, limpa o histórico
-    if len(used_urls) >= len(OFFER_URLS):
-        log("Todos os links foram utilizados. Reiniciando histórico...")
-        used_urls.clear()
-        save_used_urls(used_urls)
-    
-    # Filtra apenas os links não utilizados
-    available_urls = [url for url in OFFER_URLS if url not in used_urls]
-    
-    # Se não houver links suficientes, usa todos os links disponíveis
-    num_urls = min(3, len(available_urls))
-    
-    # Escolhe aleatoriamente os links
-    selected_urls = random.sample(available_urls, num_urls)
-    
-    # Adiciona os links selecionados ao histórico
-    used_urls.update(selected_urls)
-    save_used_urls(used_urls)
+    # Leitura e marcação na mesma transação: a rodada não se perde pela metade
+    with STATE.transaction():
+        used_urls = STATE.used_urls('ml')
+        
+        # Se todos os links já foram usados, limpa o histórico
+        if len(used_urls) >= len(OFFER_URLS):
+            log("Todos os links foram utilizados. Reiniciando histórico...")
+            STATE.reset_rotation('ml')
+            used_urls.clear()
+        
+        # Filtra apenas os links não utilizados
+        available_urls = [url for url in OFFER_URLS if url not in used_urls]
+        
+        # Se não houver links suficientes, usa todos os links disponíveis
+        num_urls = min(3, len(available_urls))
+        
+        # Escolhe aleatoriamente os links
+        selected_urls = random.sample(available_urls, num_urls)
+        
+        # Adiciona os links selecionados ao histórico
+        STATE.mark_used('ml', selected_urls)
     
     log(f"Links selecionados: {len(selected_urls)} de {len(available_urls)} disponíveis")
     return selected_urls
@@ -203,24 +207,36 @@ def load_promo_history() -> deque:
     if TEST_MODE:
         # Em modo de teste, não lê arquivo algum
         return deque(maxlen=MAX_HISTORY_SIZE)
-    try:
-        with open(HISTORY_FILE, 'r') as f:
-            nomes = json.load(f)
-        return deque(nomes, maxlen=MAX_HISTORY_SIZE)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return deque(maxlen=MAX_HISTORY_SIZE)
+    STATE.import_legacy('sent_products', 'ml', HISTORY_FILE)
+    return deque(STATE.recent_sent('ml', MAX_HISTORY_SIZE), maxlen=MAX_HISTORY_SIZE)
 
-# Função para salvar o histórico
-def save_promo_history(history: deque):
+# Função para registrar um envio no histórico (um INSERT, sem reescrever tudo)
+def record_sent_promotion(name: str, product_id=None):
     if TEST_MODE:
         # Em modo de teste, não salva nada
         return
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(list(history), f)
+    STATE.add_sent('ml', name, product_id)
 
 # Variável global para armazenar promoções já enviadas
 sent_promotions = load_promo_history()
 
+# IDs (MLB) já enviados: checados ainda na listagem, antes de abrir a página
+SENT_IDS = SentIds('ml', enabled=not TEST_MODE, legacy_path='sent_ids_ml.json', revisit=True)
+
+# Entregas (Telegram/WhatsApp) em uma fila assíncrona fora do loop de scraping
+DELIVERY = get_pipeline()
+
+# Série de preços por produto: evita repostar preço igual e (opcional) preço acima do mínimo recente
+PRICE_HISTORY = PriceHistory(enabled=not TEST_MODE)
+
+# Índice de nomes enviados (similaridade >= SIMILARITY_THRESHOLD sem varrer todo o histórico)
+SENT_INDEX = FuzzyIndex(
+    None if TEST_MODE else 'ml',
+    threshold=SIMILARITY_THRESHOLD,
+    legacy_path='sent_index_ml.jsonl'
+)
+SENT_INDEX.seed(sent_promotions)
+
 
 
 def _load_whatsapp_destinations():
@@ -258,9 +274,11 @@ def init_driver():
         options = build_options()
         driver = uc.Chrome(
             options=options,
-            driver_executable_path=ChromeDriverManager().install(),
+            driver_executable_path=resolve_driver_path(browser_executable_path),
             browser_executable_path=browser_executable_path
         )
+        apply_blocking_profile(driver, "ml")
+        install_readiness_tracker(driver)
         log("Navegador stealth iniciado")
         return driver
 
@@ -273,8 +291,10 @@ def init_driver():
             driver = uc.Chrome(
                 options=options,
                 headless=False,
-                driver_executable_path=ChromeDriverManager().install()
+                driver_executable_path=resolve_driver_path()
             )
+            apply_blocking_profile(driver, "ml")
+            install_readiness_tracker(driver)
             log("Navegador stealth iniciado (fallback)")
             return driver
 
@@ -282,11 +302,14 @@ def init_driver():
             log(f"Erro fatal ao iniciar navegador: {e2}")
             raise
 
+# Navegador mantido vivo entre execuções agendadas
+_BROWSER_POOL = BrowserPool(init_driver, name="ml")
+
 def add_cookies(driver):
     """Adiciona cookies com verificação"""
     try:
-        driver.get('https://www.mercadolivre.com.br')
-        time.sleep(random.uniform(2, 4))
+        polite_get(driver, 'https://www.mercadolivre.com.br')
+        wait_until_ready(driver)
         
         # Limpa cookies antigos
         driver.delete_all_cookies()
@@ -297,13 +320,12 @@ def add_cookies(driver):
                 if 'mercadolivre.com.br' in cookie['domain']:
                     driver.add_cookie(cookie)
                     log(f"Cookie {cookie['name']} adicionado")
-                    time.sleep(0.5)
             except Exception as e:
                 log(f"Erro ao adicionar cookie {cookie['name']}: {str(e)}")
         
         # Verifica login
         driver.refresh()
-        time.sleep(random.uniform(2, 4))
+        wait_until_ready(driver)
         if "Login" in driver.title:
             raise Exception("Falha no login - cookies inválidos")
             
@@ -311,6 +333,19 @@ def add_cookies(driver):
         log(f"ERRO crítico nos cookies: {str(e)}")
         raise
     
+# Extrai todos os cards da listagem em uma única chamada ao chromedriver
+_LISTING_CARDS_JS = """
+return Array.from(document.querySelectorAll('.andes-card.poly-card')).map(function (card) {
+    var discount = card.querySelector('.andes-money-amount__discount');
+    var title = card.querySelector('a.poly-component__title');
+    return {
+        discount: discount ? discount.innerText : null,
+        url: title ? title.href : null,
+        title: title ? title.innerText.trim() : null
+    };
+});
+"""
+
 def get_top_offers(driver):
     """Coleta top 5 ofertas de cada URL na lista"""
     all_offers = []
@@ -321,42 +356,40 @@ def get_top_offers(driver):
     for url in urls_to_process:
         try:
             log(f"\nAcessando categoria: {url}")
-            driver.get(url)
+            polite_get(driver, url)
             
-            # Espera inicial combinada com delay
+            # Espera os cards e a rede/DOM estabilizarem
             WebDriverWait(driver, 20).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, '.andes-card.poly-card'))
             )
-            time.sleep(random.uniform(2, 4))
+            wait_until_ready(driver, '.andes-card.poly-card')
             
-            # Scroll dinâmico para carregar mais itens
-            last_height = driver.execute_script("return document.body.scrollHeight")
-            for _ in range(3):
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(random.uniform(1.5, 2.5))
-                new_height = driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    break
-                last_height = new_height
+            # Scroll dinâmico até a página parar de crescer
+            scroll_until_stable(driver, '.andes-card.poly-card', max_scrolls=3)
             
-            # Coleta de cards
-            cards = driver.find_elements(By.CSS_SELECTOR, '.andes-card.poly-card')
+            # Coleta de cards (uma única ida ao navegador)
+            cards = driver.execute_script(_LISTING_CARDS_JS) or []
             log(f"Encontrados {len(cards)} produtos na categoria")
             
             # Processamento dos cards
             category_offers = []
+            category_seen = BatchDeduper(threshold=SIMILARITY_THRESHOLD)
             for card in cards:
                 try:
-                    discount = card.find_element(By.CSS_SELECTOR, '.andes-money-amount__discount').text.replace('% OFF', '')
+                    discount = card['discount'].replace('% OFF', '')
                     discount_value = float(discount)
                     
                     # Só adiciona se o desconto for maior que 10%
                     if discount_value > 5:
-                        link = card.find_element(By.CSS_SELECTOR, 'a.poly-component__title').get_attribute('href')
-                        title = card.find_element(By.CSS_SELECTOR, 'a.poly-component__title').text.strip()
+                        link = card['url']
+                        title = card['title']
+                        if not link or not title:
+                            continue
+                        if canonical_id('ml', link) in SENT_IDS:
+                            continue
                         
                         # Verifica se já existe um produto similar na lista atual
-                        if not any(is_similar(title, offer['title']) for offer in category_offers):
+                        if not category_seen.check_and_add(title):
                             category_offers.append({
                                 'discount': discount_value,
                                 'url': link,
@@ -372,9 +405,6 @@ def get_top_offers(driver):
             
             log(f"Top {TOP_N_OFFERS} coletados: {[item['discount'] for item in top_category]}")
             
-            # Intervalo aleatório entre categorias
-            time.sleep(random.uniform(5, 10))
-            
         except Exception as e:
             log(f"Falha na categoria {url}: {str(e)}")
             continue
@@ -383,34 +413,237 @@ def get_top_offers(driver):
     final_top = sorted(all_offers, key=lambda x: x['discount'], reverse=True)
     
     # Filtra produtos similares da lista final
-    filtered_offers = []
-    for offer in final_top:
-        if not any(is_similar(offer['title'], existing['title']) for existing in filtered_offers):
-            filtered_offers.append(offer)
+    filtered_offers = dedupe_batch(final_top, text_of=lambda offer: offer['title'], threshold=SIMILARITY_THRESHOLD)
     
     return [item['url'] for item in filtered_offers]
     
-def get_product_details(driver, url, max_retries=3):
-    """Extrai detalhes do produto com tentativas em caso de erro, logando cada campo individualmente"""
+def _extract_fields_selenium(driver):
+    """Extrai os campos da página do produto via WebDriver (um comando por campo)"""
+    # Título do produto
+    try:
+        log("Extraindo título do produto...")
+        product_title = driver.find_element(By.CSS_SELECTOR, "h1.ui-pdp-title").text
+        log(f"Título extraído: {product_title}")
+    except Exception as e:
+        log(f"Erro ao extrair título: {e}")
+        product_title = None
+
+    # Tipo de promoção
+    promotion_type = ""
+    try:
+        log("Extraindo tipo de promoção...")
+        for tag in driver.find_elements(By.CLASS_NAME, "ui-pdp-promotions-pill-label"):
+            txt = tag.text.upper()
+            if "OFERTA DO DIA" in txt:
+                promotion_type = "🔥 *OFERTA DO DIA*"
+                break
+            if "OFERTA RELÂMPAGO" in txt:
+                promotion_type = "⚡ *OFERTA RELÂMPAGO*"
+                break
+        log(f"Tipo de promoção extraído: {promotion_type}")
+    except Exception as e:
+        log(f"Erro ao extrair tipo de promoção: {e}")
+
+    # Avaliações
+    rating, rating_count = "Sem avaliações", ""
+    try:
+        log("Extraindo avaliações...")
+        rev = driver.find_element(By.CLASS_NAME, "ui-pdp-review__label")
+        rating = rev.find_element(By.CLASS_NAME, "ui-pdp-review__rating").text.strip()
+        rating_count = rev.find_element(By.CLASS_NAME, "ui-pdp-review__amount").text.strip().strip('()')
+        log(f"Avaliação: {rating}, Quantidade: {rating_count}")
+    except Exception as e:
+        log(f"Erro ao extrair avaliações: {e}")
+
+    # Preços
+    def parse_price(selector):
+        try:
+            block = driver.find_element(By.CSS_SELECTOR, selector)
+            frac = block.find_element(By.CLASS_NAME, "andes-money-amount__fraction").text
+            cents = block.find_elements(By.CLASS_NAME, "andes-money-amount__cents")
+            cents_text = cents[0].text if cents else "00"
+            return f"{frac},{cents_text}"
+        except NoSuchElementException:
+            return None
+        except Exception as e:
+            log(f"Erro ao extrair preço com selector {selector}: {e}")
+            return None
+
+    try:
+        log("Extraindo preço original...")
+        original_price = parse_price(".ui-pdp-price__original-value")
+        log(f"Preço original: {original_price}")
+    except Exception as e:
+        log(f"Erro ao extrair preço original: {e}")
+        original_price = None
+    try:
+        log("Extraindo preço atual...")
+        current_price = parse_price(".ui-pdp-price__second-line") or "Preço não encontrado"
+        log(f"Preço atual: {current_price}")
+    except Exception as e:
+        log(f"Erro ao extrair preço atual: {e}")
+        current_price = None
+
+    # Desconto
+    try:
+        log("Extraindo desconto...")
+        discount_text = driver.find_element(By.CSS_SELECTOR, ".andes-money-amount__discount").text
+        log(f"Desconto: {discount_text}")
+    except Exception as e:
+        log(f"Erro ao extrair desconto: {e}")
+        discount_text = ""
+
+    # Cupom
+    coupon_message = ""
+    try:
+        log("Extraindo cupom...")
+        # Tenta pelo seletor antigo
+        try:
+            cup = driver.find_element(By.CSS_SELECTOR, ".ui-pdp-promotions-label__text").text
+            m = re.search(r"(\d+%|R\$\d+)\s+OFF", cup)
+            if m:
+                coupon_message = f"🎟️ Cupom disponível: {m.group(0)}."
+        except Exception:
+            # Tenta pelo novo seletor
+            try:
+                # Procura o label do cupom
+                coupon_label = driver.find_element(By.CSS_SELECTOR, ".ui-vpp-coupons-awareness__checkbox-label")
+                coupon_text = coupon_label.text.strip()
+                m = re.search(r"(\d+%|R\$\d+)\s*OFF", coupon_text)
+                if m:
+                    valor = m.group(0)
+                    coupon_message = f"🎟️ Cupom disponível: {valor}."
+                else:
+                    # Se não encontrar padrão, apenas informa que há cupom
+                    coupon_message = f"🎟️ Cupom disponível."
+                # Procura o valor economizado
+                try:
+                    economiza = driver.find_element(By.CSS_SELECTOR, ".ui-vpp-coupons__text").text
+                    if economiza:
+                        coupon_message += f" {economiza}"
+                except Exception:
+                    pass
+            except Exception:
+                pass
+        log(f"Cupom extraído: {coupon_message}")
+    except Exception as e:
+        log(f"Erro ao extrair cupom: {e}")
+
+    # Imagem
+    try:
+        log("Extraindo imagem...")
+        image_url = driver.find_element(
+            By.CSS_SELECTOR, ".ui-pdp-image.ui-pdp-gallery__figure__image"
+        ).get_attribute("src")
+        if not image_url:
+            raise Exception("Imagem não encontrada")
+        log(f"Imagem extraída: {image_url}")
+    except Exception as e:
+        log(f"Erro ao extrair imagem: {e}")
+        image_url = None
+
+    return {
+        'product_title': product_title,
+        'promotion_type': promotion_type,
+        'rating': rating,
+        'rating_count': rating_count,
+        'original_price': original_price,
+        'current_price': current_price,
+        'discount_text': discount_text,
+        'coupon_message': coupon_message,
+        'image_url': image_url,
+    }
+
+def _extract_fields_snapshot(soup):
+    """Extrai os campos da página do produto a partir de um snapshot do DOM (sem WebDriver)"""
+    product_title = text_of(soup, "h1.ui-pdp-title")
+
+    promotion_type = ""
+    for tag in soup.select(".ui-pdp-promotions-pill-label"):
+        txt = (text_of(tag) or "").upper()
+        if "OFERTA DO DIA" in txt:
+            promotion_type = "🔥 *OFERTA DO DIA*"
+            break
+        if "OFERTA RELÂMPAGO" in txt:
+            promotion_type = "⚡ *OFERTA RELÂMPAGO*"
+            break
+
+    rating, rating_count = "Sem avaliações", ""
+    rev = soup.select_one(".ui-pdp-review__label")
+    rev_rating = text_of(rev, ".ui-pdp-review__rating")
+    rev_amount = text_of(rev, ".ui-pdp-review__amount")
+    if rev_rating:
+        rating = rev_rating
+        rating_count = rev_amount.strip('()') if rev_amount else ""
+
+    def parse_price(selector):
+        block = soup.select_one(selector)
+        frac = text_of(block, ".andes-money-amount__fraction")
+        if not frac:
+            return None
+        cents = text_of(block, ".andes-money-amount__cents") or "00"
+        return f"{frac},{cents}"
+
+    original_price = parse_price(".ui-pdp-price__original-value")
+    current_price = parse_price(".ui-pdp-price__second-line") or "Preço não encontrado"
+    discount_text = text_of(soup, ".andes-money-amount__discount") or ""
+
+    coupon_message = ""
+    cup = soup.select_one(".ui-pdp-promotions-label__text")
+    if cup is not None:
+        m = re.search(r"(\d+%|R\$\d+)\s+OFF", text_of(cup) or "")
+        if m:
+            coupon_message = f"🎟️ Cupom disponível: {m.group(0)}."
+    else:
+        coupon_label = soup.select_one(".ui-vpp-coupons-awareness__checkbox-label")
+        if coupon_label is not None:
+            m = re.search(r"(\d+%|R\$\d+)\s*OFF", text_of(coupon_label) or "")
+            coupon_message = f"🎟️ Cupom disponível: {m.group(0)}." if m else "🎟️ Cupom disponível."
+            economiza = text_of(soup, ".ui-vpp-coupons__text")
+            if economiza:
+                coupon_message += f" {economiza}"
+
+    image_url = attr_of(soup, ".ui-pdp-image.ui-pdp-gallery__figure__image", "src")
+
+    return {
+        'product_title': product_title,
+        'promotion_type': promotion_type,
+        'rating': rating,
+        'rating_count': rating_count,
+        'original_price': original_price,
+        'current_price': current_price,
+        'discount_text': discount_text,
+        'coupon_message': coupon_message,
+        'image_url': image_url,
+    }
+
+# Valor do campo com o link de afiliado gerado (vazio enquanto não fica pronto)
+_AFFILIATE_LINK_JS = """
+var textarea = document.querySelector('textarea[data-testid="text-field__label_link"]');
+return textarea && textarea.value ? textarea.value : null;
+"""
+
+def get_product_details(driver, url, max_retries=3, preloaded=False):
+    """Extrai detalhes do produto com tentativas em caso de erro, logando cada campo individualmente
+
+    Com preloaded=True a primeira tentativa usa a página já carregada na aba atual.
+    """
     for attempt in range(1, max_retries + 1):
         try:
             log(f"Tentativa {attempt} para extrair produto: {url}")
-            driver.get(url)
-            time.sleep(random.uniform(3, 5))
+            if not (preloaded and attempt == 1):
+                polite_get(driver, url)
+                wait_until_ready(driver, 'h1.ui-pdp-title')
 
             # Extrai link de afiliado
             affiliate_link = ""
             try:
                 log("Extraindo link de afiliado...")
-                generate_button = driver.find_element(By.CSS_SELECTOR, 'button[data-testid="generate_link_button"]')
+                generate_button = WebDriverWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[data-testid="generate_link_button"]'))
+                )
                 generate_button.click()
-                time.sleep(random.uniform(1.5, 2.5))
-                for _ in range(50):
-                    textarea = driver.find_element(By.CSS_SELECTOR, 'textarea[data-testid="text-field__label_link"]')
-                    if textarea.get_attribute("value"):
-                        affiliate_link = textarea.get_attribute("value").strip()
-                        break
-                    time.sleep(random.uniform(0.5, 1.5))
+                affiliate_link = (wait_for_js(driver, _AFFILIATE_LINK_JS, timeout=45) or "").strip()
                 if not affiliate_link:
                     raise Exception("Link de afiliado não gerado")
                 log(f"Link de afiliado extraído: {affiliate_link}")
@@ -423,128 +656,27 @@ def get_product_details(driver, url, max_retries=3):
                     log("Número máximo de tentativas atingido. Pulando produto.")
                     return None, None, None, ["link"]
 
-            # Título do produto
-            try:
-                log("Extraindo título do produto...")
-                product_title = driver.find_element(By.CSS_SELECTOR, "h1.ui-pdp-title").text
-                log(f"Título extraído: {product_title}")
-            except Exception as e:
-                log(f"Erro ao extrair título: {e}")
-                product_title = None
-
-            # Tipo de promoção
-            promotion_type = ""
-            try:
-                log("Extraindo tipo de promoção...")
-                for tag in driver.find_elements(By.CLASS_NAME, "ui-pdp-promotions-pill-label"):
-                    txt = tag.text.upper()
-                    if "OFERTA DO DIA" in txt:
-                        promotion_type = "🔥 *OFERTA DO DIA*"
-                        break
-                    if "OFERTA RELÂMPAGO" in txt:
-                        promotion_type = "⚡ *OFERTA RELÂMPAGO*"
-                        break
-                log(f"Tipo de promoção extraído: {promotion_type}")
-            except Exception as e:
-                log(f"Erro ao extrair tipo de promoção: {e}")
-
-            # Avaliações
-            rating, rating_count = "Sem avaliações", ""
-            try:
-                log("Extraindo avaliações...")
-                rev = driver.find_element(By.CLASS_NAME, "ui-pdp-review__label")
-                rating = rev.find_element(By.CLASS_NAME, "ui-pdp-review__rating").text.strip()
-                rating_count = rev.find_element(By.CLASS_NAME, "ui-pdp-review__amount").text.strip().strip('()')
-                log(f"Avaliação: {rating}, Quantidade: {rating_count}")
-            except Exception as e:
-                log(f"Erro ao extrair avaliações: {e}")
-
-            # Preços
-            def parse_price(selector):
-                try:
-                    block = driver.find_element(By.CSS_SELECTOR, selector)
-                    frac = block.find_element(By.CLASS_NAME, "andes-money-amount__fraction").text
-                    cents = block.find_elements(By.CLASS_NAME, "andes-money-amount__cents")
-                    cents_text = cents[0].text if cents else "00"
-                    return f"{frac},{cents_text}"
-                except NoSuchElementException:
-                    return None
-                except Exception as e:
-                    log(f"Erro ao extrair preço com selector {selector}: {e}")
-                    return None
-
-            try:
-                log("Extraindo preço original...")
-                original_price = parse_price(".ui-pdp-price__original-value")
-                log(f"Preço original: {original_price}")
-            except Exception as e:
-                log(f"Erro ao extrair preço original: {e}")
-                original_price = None
-            try:
-                log("Extraindo preço atual...")
-                current_price = parse_price(".ui-pdp-price__second-line") or "Preço não encontrado"
-                log(f"Preço atual: {current_price}")
-            except Exception as e:
-                log(f"Erro ao extrair preço atual: {e}")
-                current_price = None
-
-            # Desconto
-            try:
-                log("Extraindo desconto...")
-                discount_text = driver.find_element(By.CSS_SELECTOR, ".andes-money-amount__discount").text
-                log(f"Desconto: {discount_text}")
-            except Exception as e:
-                log(f"Erro ao extrair desconto: {e}")
-                discount_text = ""
-
-            # Cupom
-            coupon_message = ""
-            try:
-                log("Extraindo cupom...")
-                # Tenta pelo seletor antigo
-                try:
-                    cup = driver.find_element(By.CSS_SELECTOR, ".ui-pdp-promotions-label__text").text
-                    m = re.search(r"(\d+%|R\$\d+)\s+OFF", cup)
-                    if m:
-                        coupon_message = f"🎟️ Cupom disponível: {m.group(0)}."
-                except Exception:
-                    # Tenta pelo novo seletor
-                    try:
-                        # Procura o label do cupom
-                        coupon_label = driver.find_element(By.CSS_SELECTOR, ".ui-vpp-coupons-awareness__checkbox-label")
-                        coupon_text = coupon_label.text.strip()
-                        m = re.search(r"(\d+%|R\$\d+)\s*OFF", coupon_text)
-                        if m:
-                            valor = m.group(0)
-                            coupon_message = f"🎟️ Cupom disponível: {valor}."
-                        else:
-                            # Se não encontrar padrão, apenas informa que há cupom
-                            coupon_message = f"🎟️ Cupom disponível."
-                        # Procura o valor economizado
-                        try:
-                            economiza = driver.find_element(By.CSS_SELECTOR, ".ui-vpp-coupons__text").text
-                            if economiza:
-                                coupon_message += f" {economiza}"
-                        except Exception:
-                            pass
-                    except Exception:
-                        pass
-                log(f"Cupom extraído: {coupon_message}")
-            except Exception as e:
-                log(f"Erro ao extrair cupom: {e}")
-
-            # Imagem
-            try:
-                log("Extraindo imagem...")
-                image_url = driver.find_element(
-                    By.CSS_SELECTOR, ".ui-pdp-image.ui-pdp-gallery__figure__image"
-                ).get_attribute("src")
-                if not image_url:
-                    raise Exception("Imagem não encontrada")
-                log(f"Imagem extraída: {image_url}")
-            except Exception as e:
-                log(f"Erro ao extrair imagem: {e}")
-                image_url = None
+            # Demais campos: snapshot único do DOM (padrão) ou extração campo a campo
+            fields = None
+            if snapshot_enabled():
+                log("Extraindo campos do snapshot da página...")
+                fields = _extract_fields_snapshot(page_soup(driver))
+                if not fields['product_title'] or "não encontrado" in fields['current_price']:
+                    log("Snapshot incompleto, usando extração via Selenium...")
+                    fields = None
+            if fields is None:
+                fields = _extract_fields_selenium(driver)
+            log(f"Campos extraídos: {fields}")
+
+            product_title = fields['product_title']
+            promotion_type = fields['promotion_type']
+            rating = fields['rating']
+            rating_count = fields['rating_count']
+            original_price = fields['original_price']
+            current_price = fields['current_price']
+            discount_text = fields['discount_text']
+            coupon_message = fields['coupon_message']
+            image_url = fields['image_url']
 
             # ValidaÃ§Ã£o de campos obrigatÃ³rios
             missing_fields = []
@@ -559,6 +691,7 @@ def get_product_details(driver, url, max_retries=3):
             if missing_fields:
                 return product_title, None, image_url, missing_fields
 
+            PRICE_HISTORY.record(canonical_id('ml', url), price=current_price, old_price=original_price)
 
             parts = [f"🟡 *Mercado Livre*", f"🏷️ *{product_title[:150]}*"]
             if promotion_type:
@@ -591,17 +724,37 @@ def get_product_details(driver, url, max_retries=3):
     log(f"Falha definitiva ao extrair dados do produto após {max_retries} tentativas: {url}")
     return None, None, None, ["erro_extracao"]
 
+def _after_delivery(url, product_title, has_image, result):
+    """Pós-envio (thread de entrega): salva no histórico se pelo menos um dos envios foi bem-sucedido"""
+    # Sem foto o Telegram não é usado e conta como sucesso
+    telegram_success = result['telegram'] or not has_image
+    if not (telegram_success or result['whatsapp'] or result.get('queued')):
+        log(f"Falha ao enviar para Telegram e WhatsApp - Produto não será salvo: {product_title}")
+        return
+    if result.get('queued'):
+        log(f"Envio pendente na outbox, será repetido em segundo plano: {product_title}")
+    SENT_INDEX.add(product_title)
+    if TEST_MODE:
+        log("⚠️ Modo teste ativado - Produto não será salvo no histórico")
+        return
+    product_id = canonical_id('ml', url)
+    sent_promotions.append(product_title)
+    record_sent_promotion(product_title, product_id)
+    SENT_IDS.add(product_id)
+    PRICE_HISTORY.mark_posted(product_id)
+    log(f"Produto salvo no histórico: {product_title}")
+
 def check_promotions():
     log("Iniciando verificação de promoções...")
     
     if WHATSAPP_ENABLED:
-        # Se WhatsApp estiver habilitado, não faz scraping até garantir que o WPP está ONLINE.
-        if not wpp_wait_until_connected():
+        # WhatsApp fora do ar não trava o scraping: as mensagens dele ficam na outbox até reconectar
+        if not wpp_before_run():
             return
     
     driver = None
     try:
-        driver = init_driver()
+        driver = _BROWSER_POOL.acquire()
         add_cookies(driver)
 
         product_urls = get_top_offers(driver)
@@ -612,57 +765,48 @@ def check_promotions():
             product_urls = product_urls[:1]
             log("Modo teste: processando apenas 1 link")
 
-        # Coleta nomes já enviados
-        sent_names = set(sent_promotions)
+        # Páginas de produto: uma por vez ou em várias abas paralelas (DETAIL_TABS)
+        if tab_concurrency() > 1:
+            results = iter_tab_results(
+                driver, product_urls,
+                lambda d, u: get_product_details(d, u, preloaded=True),
+                ready_selector="h1.ui-pdp-title"
+            )
+        else:
+            results = ((url, get_product_details(driver, url)) for url in product_urls)
 
-        for url in product_urls:
+        for url, details in results:
             log(f"Processando promoção: {url}")
             try:
-                product_title, message, image_url, missing_fields = get_product_details(driver, url)
+                product_title, message, image_url, missing_fields = details or (None, None, None, ["erro_extracao"])
                 if missing_fields:
                     _notify_admin_missing_data(url, missing_fields, product_title)
                     continue
                 if not message:
                     continue
 
-                if any(is_similar(product_title, sent) for sent in sent_names):
+                # Já postado pelo mesmo ID: o nome sempre bate, quem decide o repost é o histórico de preços
+                product_id = canonical_id('ml', url)
+                if not PRICE_HISTORY.was_posted(product_id) and SENT_INDEX.contains_similar(product_title):
                     log(f"Produto muito parecido com um já enviado: {product_title}")
                     continue
 
-                # Envia para Telegram
-                telegram_success = True
-                if image_url:
-                    try:
-                        telegram_success = send_telegram_message(
-                            message=message,
-                            image_url=image_url,
-                            bot_token=TELEGRAM_BOT_TOKEN,
-                            chat_id=TELEGRAM_GROUP_ID
-                        )
-                    except Exception as e:
-                        log(f"Erro ao enviar com foto para Telegram: {str(e)}")
-
-                # Envia para WhatsApp se habilitado
-                whatsapp_success = False
-                if WHATSAPP_ENABLED:
-                    try:
-                        destinations = _load_whatsapp_destinations()
-                        whatsapp_success = wpp_send_message(destinations=destinations, message=message, image_url=image_url)
-                        if whatsapp_success:
-                            log("Mensagem enviada com sucesso para WhatsApp")
-                    except Exception as e:
-                        log(f"Erro ao enviar para WhatsApp: {str(e)}")
-                
-                # Salva no histórico se pelo menos um dos envios foi bem-sucedido
-                if telegram_success or whatsapp_success:
-                    if not TEST_MODE:
-                        sent_promotions.append(product_title)
-                        save_promo_history(sent_promotions)
-                        log("Produto salvo no histórico.")
-                    else:
-                        log("⚠️ Modo teste ativado - Produto não será salvo no histórico")
-                else:
-                    log("Falha ao enviar para Telegram e WhatsApp - Produto não será salvo")
+                price_ok, price_reason = PRICE_HISTORY.post_decision(product_id)
+                if not price_ok:
+                    log(f"Pulando {product_title}: {price_reason}")
+                    continue
+
+                # Telegram (só com foto) + WhatsApp em segundo plano: o navegador segue para o próximo produto
+                DELIVERY.submit(
+                    message,
+                    image_url=image_url,
+                    telegram={'bot_token': TELEGRAM_BOT_TOKEN, 'chat_id': TELEGRAM_GROUP_ID} if image_url else None,
+                    whatsapp=_load_whatsapp_destinations() if WHATSAPP_ENABLED else None,
+                    label=product_title[:50],
+                    on_done=functools.partial(_after_delivery, url, product_title, bool(image_url)),
+                    # Falhas ficam na outbox para nova tentativa (sem persistência em modo teste)
+                    idempotency_key=None if TEST_MODE else PRICE_HISTORY.post_key(product_id)
+                )
 
             except Exception as e:
                 log(f"Erro no processamento da promoção: {str(e)}")
@@ -671,14 +815,18 @@ def check_promotions():
         log(f"ERRO durante a verificação: {str(e)}")
     finally:
         if driver:
-            log("Fechando o navegador...")
-            driver.quit()
+            log("Devolvendo o navegador ao pool...")
+            _BROWSER_POOL.release(driver)
+        # Só encerra a rodada com os envios concluídos (histórico atualizado)
+        DELIVERY.drain()
 
 
 
 def schedule_scraper():
     """Configura e inicia o agendamento do scraper."""
     print("Iniciando agendamento do scraper...")
+    # Outbox de execuções anteriores volta a ser reenviada já na partida
+    DELIVERY.start()
     
     if TEST_MODE:
         print("Modo de teste ativado - Executando imediatamente e a cada hora")
@@ -715,6 +863,9 @@ def schedule_scraper():
         schedule.every().day.at("09:30").do(check_promotions)
         schedule.every().day.at("10:30").do(check_promotions)
         schedule.every().day.at("11:30").do(check_promotions)
+
+    # Deixa um navegador quente esperando o próximo horário agendado
+    _BROWSER_POOL.warm()
     
     # Mantém o script rodando
     while True:
@@ -723,6 +874,7 @@ def schedule_scraper():
             time.sleep(60)  # Verifica a cada minuto se há tarefas pendentes
         except KeyboardInterrupt:
             print("\nEncerrando o scraper...")
+            _BROWSER_POOL.close()
             break
         except Exception as e:
             print(f"Erro no agendamento: {e}")
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import functools
 import os
 import re
 from tempfile import mkdtemp
@@ -15,13 +16,24 @@ from urllib.parse import urlparse, urlunparse
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import WebDriverException
 import undetected_chromedriver as uc
-from webdriver_manager.chrome import ChromeDriverManager
-import random
 import time
-import requests
 import schedule
 import sys
 
+# PM2/cwd differences can break local imports. Ensure project root is on sys.path.
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _PROJECT_DIR not in sys.path:
+    sys.path.insert(0, _PROJECT_DIR)
+
+from browser.driver_cache import resolve_driver_path
+from state.product_ids import canonical_id
+from state.sent_ids import SentIds
+from state.store import get_store
+from delivery.pipeline import get_pipeline
+from Telegram.client import get_client as get_telegram_client
+from browser.blocking import apply_blocking_profile
+from browser.readiness import install_readiness_tracker, polite_get, scroll_until_stable, wait_until_ready
+
 sys.stdout.reconfigure(line_buffering=True)
 
 load_dotenv()
@@ -51,25 +63,40 @@ def normalize_url(url):
     except:
         return url
     
+# Estado compartilhado em SQLite: histórico e IDs enviados
+STATE = get_store()
+
 # Função para carregar o histórico de promoções
 def load_promo_history():
-    try:
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-            # Normaliza tudo na leitura
-            history = [normalize_url(url) for url in history]
-            return deque(history, maxlen=MAX_HISTORY_SIZE)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return deque(maxlen=MAX_HISTORY_SIZE)
-
-# Função para salvar o histórico
-def save_promo_history(history):
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(list(history), f)
+    STATE.import_legacy('sent_products', 'shp', HISTORY_FILE)
+    # Normaliza tudo na leitura
+    history = [normalize_url(url) for url in STATE.recent_sent('shp', MAX_HISTORY_SIZE)]
+    return deque(history, maxlen=MAX_HISTORY_SIZE)
+
+def _offer_url(offer):
+    # As ofertas chegam como dict; o histórico guarda só a URL normalizada
+    return normalize_url(offer.get('url') if isinstance(offer, dict) else offer)
+
+# Função para registrar um envio no histórico (um INSERT, sem reescrever tudo)
+def record_sent_promotion(offer):
+    url = _offer_url(offer)
+    sent_promotions.append(url)
+    STATE.add_sent('shp', url, _offer_id(url))
+    SENT_IDS.add(_offer_id(url))
 
 # Variável global para armazenar promoções já enviadas
 sent_promotions = load_promo_history()
 
+# IDs (loja.item) já enviados: checados ainda na listagem
+SENT_IDS = SentIds('shp', legacy_path='sent_ids_shp.json')
+
+# Entregas ao Telegram em uma fila assíncrona fora do loop de scraping
+DELIVERY = get_pipeline()
+
+def _offer_id(offer):
+    url = offer.get('url') if isinstance(offer, dict) else offer
+    return canonical_id('shopee', url)
+
 def log(message):
     """Função para logging com timestamp"""
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
@@ -88,9 +115,11 @@ def init_driver():
     driver = uc.Chrome(
         options=options,
         headless=False,
-        driver_executable_path=ChromeDriverManager().install()
+        driver_executable_path=resolve_driver_path()
     )
 
+    apply_blocking_profile(driver, "shopee")
+    install_readiness_tracker(driver)
     log("Navegador stealth iniciado")
     return driver
 
@@ -99,8 +128,8 @@ def add_cookies(driver):
     """Adiciona cookies da Shopee"""
     try:
         log("Abrindo domínio principal para preparar os cookies...")
-        driver.get("https://shopee.com.br/")
-        time.sleep(random.uniform(3, 5))
+        polite_get(driver, "https://shopee.com.br/")
+        wait_until_ready(driver)
         driver.delete_all_cookies()
 
         for cookie in COOKIES:
@@ -111,8 +140,9 @@ def add_cookies(driver):
                 log(f"Erro ao adicionar cookie {cookie['name']}: {e}")
         
         log("Recarregando página com cookies aplicados...")
-        driver.get("https://shopee.com.br/")
-        time.sleep(random.uniform(50, 70))
+        polite_get(driver, "https://shopee.com.br/")
+        # A sessão termina de se estabelecer em segundo plano: espera a rede e o DOM sossegarem
+        wait_until_ready(driver, network_idle_ms=2000, dom_quiet_ms=1000, timeout=70)
 
         # Verifica se o login funcionou
         if "login" in driver.current_url or "signin" in driver.current_url:
@@ -123,12 +153,33 @@ def add_cookies(driver):
         log(f"ERRO ao aplicar cookies: {str(e)}")
         raise
 
+# Extrai todos os cards de oferta em uma única chamada ao chromedriver
+_OFFER_CARDS_JS = """
+function text(card, selector) {
+    var el = card.querySelector(selector);
+    return el ? el.innerText : null;
+}
+return Array.from(document.querySelectorAll('.product-offer-item')).map(function (card) {
+    var link = card.querySelector('a');
+    var img = card.querySelector('.ItemCard__image img');
+    return {
+        discount: text(card, '.DiscountBadge__discount'),
+        sales: text(card, '.ItemCardSold__wrap span'),
+        commission: text(card, '.commRate'),
+        price: text(card, '.ItemCardPrice__wrap .price'),
+        title: text(card, '.ItemCard__name'),
+        url: link ? link.href : null,
+        image_url: img ? img.src : null
+    };
+});
+"""
+
 def get_top_offers(driver):
     """Busca ofertas da Shopee priorizando: COMISSÃO > DESCONTO > VENDAS"""
     try:
         log("Acessando página de ofertas da Shopee...")
-        driver.get('https://affiliate.shopee.com.br/offer/product_offer')
-        time.sleep(random.uniform(5, 8))  # Delay maior para carregamento
+        polite_get(driver, 'https://affiliate.shopee.com.br/offer/product_offer')
+        wait_until_ready(driver, '.product-offer-item', timeout=30)
         
         # Clica no filtro de Comissão da Marca
         try:
@@ -136,17 +187,15 @@ def get_top_offers(driver):
                 EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'rc-tabs-tab-btn') and contains(., 'Comissão da marca')]"))
             ).click()
             log("Filtro 'Comissão da marca' aplicado com sucesso")
-            time.sleep(3)  # Espera carregar os resultados
+            wait_until_ready(driver, '.product-offer-item')
         except Exception as e:
             log(f"Erro ao aplicar filtro de comissão: {str(e)}")
 
-        # Scroll gradual para carregar todos os itens
-        for _ in range(3):
-            driver.execute_script("window.scrollBy(0, 1000)")
-            time.sleep(random.uniform(1, 2))
+        # Scroll até a lista parar de crescer
+        scroll_until_stable(driver, '.product-offer-item', max_scrolls=3)
         
-        # Coleta todos os cards de oferta
-        cards = driver.find_elements(By.CSS_SELECTOR, '.product-offer-item')
+        # Coleta todos os cards de oferta (uma única ida ao navegador)
+        cards = driver.execute_script(_OFFER_CARDS_JS) or []
         offers = []
         
         for card in cards:
@@ -154,13 +203,13 @@ def get_top_offers(driver):
                 # Extrai os dados de cada card
                 discount = 0
                 try:
-                    discount_text = card.find_element(By.CSS_SELECTOR, '.DiscountBadge__discount').text
+                    discount_text = card['discount']
                     discount = float(discount_text.replace('%', '').replace(',', '.'))
                 except:
                     pass
                 
                 try:
-                    sales_text = card.find_element(By.CSS_SELECTOR, '.ItemCardSold__wrap span').text
+                    sales_text = card['sales']
                     # Trata diferentes formatos de vendas (mil, milhões, etc.)
                     if 'mil' in sales_text:
                         sales = float(sales_text.replace('mil', '').replace('vendidos', '').replace('vendas', '').strip().replace(',', '.')) * 1000
@@ -173,20 +222,25 @@ def get_top_offers(driver):
                     sales = 0
                 
                 try:
-                    commission_text = card.find_element(By.CSS_SELECTOR, '.commRate').text
+                    commission_text = card['commission']
                     commission = float(commission_text.replace('Taxa de comissão', '').replace('%', '').strip().replace(',', '.'))
                 except Exception as e:
                     log(f"Erro ao converter comissão: {str(e)}")
                     commission = 0
                 
                 try:
-                    price = card.find_element(By.CSS_SELECTOR, '.ItemCardPrice__wrap .price').text
-                    title = card.find_element(By.CSS_SELECTOR, '.ItemCard__name').text
-                    url = card.find_element(By.CSS_SELECTOR, 'a').get_attribute('href')
-                    image_url = card.find_element(By.CSS_SELECTOR, '.ItemCard__image img').get_attribute('src')
+                    price = card['price']
+                    title = card['title']
+                    url = card['url']
+                    image_url = card['image_url']
+                    if not (price and title and url and image_url):
+                        raise ValueError("campos básicos ausentes no card")
                 except Exception as e:
                     log(f"Erro ao extrair dados básicos: {str(e)}")
                     continue
+
+                if _offer_id(url) in SENT_IDS:
+                    continue
                 
                 offers.append({
                     'title': title,
@@ -233,6 +287,15 @@ def get_product_details(driver, offer):
         log(f"ERRO ao processar detalhes: {str(e)}")
         return None, None
 
+def _after_delivery(url, result):
+    """Pós-envio (thread de entrega): registra a promoção se o Telegram aceitou"""
+    if result['telegram'] or result.get('queued'):
+        record_sent_promotion(url)
+        if not result['telegram']:
+            log(f"Envio pendente na outbox, será repetido em segundo plano: {_offer_url(url)}")
+    else:
+        log(f"Erro ao enviar mensagem: {_offer_url(url)}")
+
 def check_promotions():
     """Função principal que verifica as promoções"""
     log("Iniciando verificação de promoções...")
@@ -246,7 +309,8 @@ def check_promotions():
             log("Nenhuma oferta encontrada")
             return
         
-        new_urls = [url for url in product_urls if normalize_url(url) not in [normalize_url(u) for u in sent_promotions]]
+        sent_urls = set(sent_promotions)
+        new_urls = [offer for offer in product_urls if _offer_url(offer) not in sent_urls]
         if not new_urls:
             log("Nenhuma nova promoção encontrada")
             return
@@ -259,40 +323,16 @@ def check_promotions():
                 if not message:
                     continue
                 
-                # Tenta enviar com foto se existir
-                if image_url:
-                    try:
-                        response = requests.post(
-                            f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto',
-                            data={
-                                'chat_id': TELEGRAM_CHAT_ID,
-                                'caption': message,
-                                'parse_mode': 'Markdown'
-                            },
-                            files={'photo': requests.get(image_url).content}
-                        )
-                        if response.status_code == 200:
-                            sent_promotions.append(normalize_url(url))
-                            save_promo_history(sent_promotions)
-                            continue
-                    except Exception as e:
-                        log(f"Erro ao enviar com foto: {str(e)}")
-                
-                # Se falhar ou não tiver foto, envia apenas o texto
-                response = requests.post(
-                    f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage',
-                    data={
-                        'chat_id': TELEGRAM_CHAT_ID,
-                        'text': message,
-                        'parse_mode': 'Markdown',
-                        'disable_web_page_preview': False
-                    }
+                # Envio com foto (ou só texto se falhar) em segundo plano
+                DELIVERY.submit(
+                    message,
+                    image_url=image_url,
+                    telegram={'bot_token': TELEGRAM_BOT_TOKEN, 'chat_id': TELEGRAM_CHAT_ID},
+                    label=_offer_url(url),
+                    on_done=functools.partial(_after_delivery, url),
+                    # Falhas ficam na outbox para nova tentativa
+                    idempotency_key=_offer_id(url)
                 )
-                
-                if response.status_code == 200:
-                    sent_promotions.append(normalize_url(url))
-                else:
-                    log(f"Erro ao enviar mensagem: {response.text}")
             
             except Exception as e:
                 log(f"Erro no processamento da promoção: {str(e)}")
@@ -303,17 +343,18 @@ def check_promotions():
         if driver:
             log("Fechando o navegador...")
             driver.quit()
+        # Só encerra a rodada com os envios concluídos (histórico atualizado)
+        DELIVERY.drain()
 
 def get_last_message_time():
     """Obtém o timestamp da última mensagem enviada pelo bot no chat/canal"""
     try:
-        response = requests.get(
-            f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates',
+        data = get_telegram_client(TELEGRAM_BOT_TOKEN).call(
+            'getUpdates',
             params={'limit': 20}  # Pega as últimas 20 atualizações
         )
 
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             for update in reversed(data.get('result', [])):
                 message = update.get('channel_post') or update.get('message')
                 if not message:
@@ -379,7 +420,6 @@ def safe_check_promotions():
             return
 
     check_promotions()
-    save_promo_history(sent_promotions)
 
 def should_run_bot(min_interval_hours=1):
     """Verifica se já passou o tempo mínimo desde a última execução"""
@@ -404,6 +444,8 @@ def should_run_bot(min_interval_hours=1):
 
 # Loop principal
 print("Bot iniciado.")
+# Outbox de execuções anteriores volta a ser reenviada já na partida
+DELIVERY.start()
 check_promotions()
 schedule.every(1).hours.do(check_promotions)
 print("Agendado para verificar promoções a cada 1 hora.")
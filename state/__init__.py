@@ -0,0 +1 @@
+# Persistent scraper state shared by the scrapers (product IDs, sent history).
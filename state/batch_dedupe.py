@@ -0,0 +1,89 @@
+import math
+import zlib
+from difflib import SequenceMatcher
+
+from state.fuzzy_index import band_keys
+
+
+def _token_order(token: str) -> int:
+    # Qualquer ordem total fixa serve para o filtro de prefixo; crc32 espalha bem
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class BatchDeduper:
+    """
+    Near-linear duplicate filter for one batch of listing candidates.
+
+    Candidates are blocked before any pair is verified, so a page with
+    hundreds of cards does not compare every card against every other one:
+
+    - metric="ratio":   SequenceMatcher ratio on (normalized) text, blocked by
+      MinHash LSH bands of character 3-grams (same buckets as FuzzyIndex).
+    - metric="jaccard": word-set Jaccard, blocked by prefix filtering on the
+      sorted token signature. This blocking is exact: two sets with
+      Jaccard >= threshold always share a prefix token.
+
+    The first occurrence wins, so callers sort by preference beforehand.
+    """
+
+    def __init__(self, threshold=0.95, metric="ratio", normalize=None):
+        if metric not in ("ratio", "jaccard"):
+            raise ValueError(f"Métrica desconhecida: {metric}")
+        self.threshold = threshold
+        self.metric = metric
+        self.normalize = normalize or (lambda s: s)
+        self._kept = []     # representação normalizada de cada item aceito
+        self._exact = set()
+        self._blocks = {}   # chave de bloco -> [posições]
+
+    def _signature(self, norm):
+        if self.metric == "ratio":
+            return norm, [("b", band, key) for band, key in enumerate(band_keys(norm))]
+
+        tokens = sorted(set(norm.lower().split()), key=_token_order)
+        if not tokens:
+            return tokens, []
+        prefix = len(tokens) - math.ceil(self.threshold * len(tokens)) + 1
+        return tokens, [("t", token) for token in tokens[:prefix]]
+
+    def _similar(self, value, other) -> bool:
+        if self.metric == "ratio":
+            # Limite superior do ratio pelo tamanho: 2*min/(a+b)
+            if 2 * min(len(value), len(other)) < self.threshold * (len(value) + len(other)):
+                return False
+            return SequenceMatcher(None, value, other).ratio() >= self.threshold
+
+        a, b = set(value), set(other)
+        if not a or not b:
+            return False
+        return len(a & b) / len(a | b) >= self.threshold
+
+    def check_and_add(self, text) -> bool:
+        """True when `text` duplicates an accepted item; otherwise accepts it."""
+        if not isinstance(text, str) or not text:
+            return False
+        norm = self.normalize(text)
+        if norm in self._exact:
+            return True
+
+        value, keys = self._signature(norm)
+        candidates = set()
+        for key in keys:
+            candidates.update(self._blocks.get(key, ()))
+        for pos in candidates:
+            if self._similar(value, self._kept[pos]):
+                return True
+
+        pos = len(self._kept)
+        self._kept.append(value)
+        self._exact.add(norm)
+        for key in keys:
+            self._blocks.setdefault(key, []).append(pos)
+        return False
+
+
+def dedupe_batch(items, text_of=None, threshold=0.95, metric="ratio", normalize=None):
+    """Returns `items` (in order) without near-duplicates of earlier items."""
+    text_of = text_of or (lambda item: item)
+    deduper = BatchDeduper(threshold=threshold, metric=metric, normalize=normalize)
+    return [item for item in items if not deduper.check_and_add(text_of(item))]
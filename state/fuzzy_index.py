@@ -0,0 +1,180 @@
+import os
+import random
+import threading
+import time
+import zlib
+from difflib import SequenceMatcher
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [FuzzyIndex] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+
+# Coeficientes fixos: as assinaturas gravadas em disco continuam válidas entre execuções
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+
+
+def _shingles(text: str, k: int = 3) -> set:
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def band_keys(text: str) -> list:
+    """
+    MinHash over character 3-grams, folded into one key per LSH band.
+
+    16 bands of 4 rows: two titles with 3-gram Jaccard >= 0.7 (what a 0.95
+    SequenceMatcher ratio typically leaves) share a band ~99% of the time.
+    """
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in _shingles(text)]
+    signature = [min(((a * h + b) % _PRIME) for h in hashes) for a, b in _PERMUTATIONS]
+    keys = []
+    for band in range(_BANDS):
+        chunk = signature[band * _ROWS:(band + 1) * _ROWS]
+        keys.append(zlib.crc32(",".join(map(str, chunk)).encode("ascii")))
+    return keys
+
+
+class FuzzyIndex:
+    """
+    Persistent near-duplicate index for sent product names.
+
+    Names are normalized once on insert and bucketed by MinHash LSH; a lookup
+    only runs SequenceMatcher against the few names sharing a bucket, so the
+    0.95-ratio semantics of `is_similar` are kept without scanning the whole
+    history. Each entry (with its LSH bands) is one row of the state store's
+    `fuzzy_names` table under `scope`; `scope=None` keeps the index in memory
+    only. `legacy_path` is the old JSON-lines file, imported on first use.
+
+    Env knobs:
+    - FUZZY_INDEX_MAX (default: 200000) => oldest entries dropped on compaction
+    """
+
+    def __init__(self, scope=None, threshold=0.95, normalize=None, legacy_path=None, store=None):
+        self.scope = scope
+        self.threshold = threshold
+        self.normalize = normalize or (lambda s: s)
+        self.max_size = max(1, _env_int("FUZZY_INDEX_MAX", 200000))
+        self._store = (store or get_store()) if scope else None
+
+        self._lock = threading.Lock()
+        self._row_ids = []  # linha no banco por posição
+        self._names = []    # nome original por posição
+        self._norms = []    # nome normalizado por posição
+        self._keys = []     # chaves LSH por posição
+        self._exact = {}    # normalizado -> posição
+        self._buckets = {}  # (banda, chave) -> [posições]
+        self._load(legacy_path)
+
+    # ---- internals -------------------------------------------------------
+
+    def _insert(self, name, norm, keys, row_id=None):
+        pos = len(self._names)
+        self._row_ids.append(row_id)
+        self._names.append(name)
+        self._norms.append(norm)
+        self._keys.append(keys)
+        self._exact[norm] = pos
+        for band, key in enumerate(keys):
+            self._buckets.setdefault((band, key), []).append(pos)
+
+    def _load(self, legacy_path):
+        if self._store is None:
+            return
+        if legacy_path:
+            self._store.import_legacy("fuzzy_names", self.scope, legacy_path)
+        for row_id, name, norm, keys in self._store.fuzzy_entries(self.scope):
+            self._insert(name, norm, keys, row_id)
+        if len(self._names) > self.max_size:
+            self._compact()
+
+    def _compact(self):
+        """Drops the oldest entries, keeping 90% of `max_size` (so it runs rarely)."""
+        keep = max(1, int(self.max_size * 0.9))
+        entries = list(zip(self._names, self._norms, self._keys, self._row_ids))[-keep:]
+        self._row_ids, self._names, self._norms, self._keys, self._exact, self._buckets = [], [], [], [], {}, {}
+        for name, norm, keys, row_id in entries:
+            self._insert(name, norm, keys, row_id)
+        if self._store is not None and entries and entries[0][3] is not None:
+            try:
+                self._store.trim_fuzzy(self.scope, entries[0][3])
+            except Exception as e:
+                log(f"Erro ao compactar o índice {self.scope}: {e}")
+        log(f"Índice compactado para {len(self._names)} nomes")
+
+    # ---- public API ------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def find_similar(self, name):
+        """Returns the stored name with ratio >= threshold, or None."""
+        if not isinstance(name, str) or not name:
+            return None
+        norm = self.normalize(name)
+        with self._lock:
+            pos = self._exact.get(norm)
+            if pos is not None:
+                return self._names[pos]
+
+            candidates = set()
+            for band, key in enumerate(band_keys(norm)):
+                candidates.update(self._buckets.get((band, key), ()))
+
+            for pos in candidates:
+                other = self._norms[pos]
+                # Limite superior do ratio pelo tamanho: 2*min/(a+b)
+                if 2 * min(len(norm), len(other)) < self.threshold * (len(norm) + len(other)):
+                    continue
+                if SequenceMatcher(None, norm, other).ratio() >= self.threshold:
+                    return self._names[pos]
+        return None
+
+    def contains_similar(self, name) -> bool:
+        return self.find_similar(name) is not None
+
+    def add(self, name):
+        """Indexes a sent name and inserts it into the store."""
+        if not isinstance(name, str) or not name:
+            return
+        norm = self.normalize(name)
+        keys = band_keys(norm)
+        with self._lock:
+            row_id = None
+            if self._store is not None:
+                try:
+                    row_id = self._store.add_fuzzy(self.scope, name, norm, keys)
+                except Exception as e:
+                    log(f"Erro ao gravar no índice {self.scope}: {e}")
+            self._insert(name, norm, keys, row_id)
+            if len(self._names) > self.max_size:
+                self._compact()
+
+    def seed(self, names):
+        """Imports an existing name history (only names not indexed yet)."""
+        added = 0
+        for name in names or []:
+            if isinstance(name, str) and name and self.normalize(name) not in self._exact:
+                self.add(name)
+                added += 1
+        if added:
+            log(f"{added} nomes importados do histórico antigo")
+        return added
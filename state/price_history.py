@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+import time
+from array import array
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [PriceHistory] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Colunas de cada ponto da série (em centavos; -1 = ausente):
+# - price:     preço "Por" (ML current_price, Kabum discount_price, Amazon valor_desconto)
+# - old_price: preço "De"  (ML original_price, Kabum old_price, Amazon valor_original)
+# - pix_price: preço no PIX (Kabum)
+PRICE_FIELDS = ("price", "old_price", "pix_price")
+_WIDTH = len(PRICE_FIELDS)
+_MISSING = -1
+_DAY = 86400
+
+
+def to_cents(value):
+    """Price as integer cents from a float/int or a BRL string ("R$ 1.234,56"); None if unparseable."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value * 100)) if value > 0 else None
+    match = re.search(r"\d[\d.]*(?:,\d{1,2})?", str(value))
+    if not match:
+        return None
+    number = match.group(0)
+    if "," in number:
+        integer, decimals = number.split(",")
+    elif re.search(r"\.\d{1,2}$", number):
+        integer, decimals = number.rsplit(".", 1)  # "1234.56" (ponto decimal)
+    else:
+        integer, decimals = number, "0"
+    try:
+        cents = int(integer.replace(".", "")) * 100 + int(decimals.ljust(2, "0"))
+    except ValueError:
+        return None
+    return cents if 0 < cents < 2 ** 31 else None
+
+
+def _pack(values, typecode) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()  # sempre little-endian no banco
+    return data.tobytes()
+
+
+def _unpack(blob, typecode) -> array:
+    data = array(typecode)
+    if blob:
+        data.frombytes(blob)
+        if sys.byteorder == "big":
+            data.byteswap()
+    return data
+
+
+def _effective(point):
+    """Lowest price actually payable in one point (price or PIX), in cents."""
+    candidates = [point[0], point[2]]
+    candidates = [c for c in candidates if c != _MISSING]
+    return min(candidates) if candidates else None
+
+
+class PriceHistory:
+    """
+    Price time series per canonical product ID ("kabum:123", "amazon:B0...").
+
+    Each product is one row of the state store's `price_history` table with
+    its series packed into two little-endian arrays: uint32 timestamps and
+    int32 cents (`PRICE_FIELDS` per point). Only change points are stored;
+    an observation with the same prices as the last point just refreshes
+    `last_seen`, so a product watched every hour for months stays a few
+    hundred bytes. The price in effect at a given time is the last point
+    at or before it.
+
+    Queries used by the send decision:
+    - lowest_in(product_id, days):        lowest payable price of the window
+    - changed_since_last_post(product_id): prices differ from the last post
+
+    Posted products come back here once their sent ID expires
+    (`SentIds(revisit=True)`), so every observation is recorded and an
+    unchanged price is what keeps them from being reposted. For those
+    (`was_posted`) the scrapers skip their name-based duplicate checks,
+    which would always match the product's own earlier post.
+
+    Env knobs:
+    - PRICE_HISTORY_DAYS       (default: 180) => older change points dropped
+    - PRICE_HISTORY_MAX_POINTS (default: 256) => change points kept per product
+    - PRICE_LOWEST_DAYS        (default: 0 => off) => only post products at the
+      lowest price of the last N days
+    """
+
+    def __init__(self, enabled=True, store=None):
+        self.enabled = enabled
+        self.retention_days = max(1, _env_int("PRICE_HISTORY_DAYS", 180))
+        self.max_points = max(2, _env_int("PRICE_HISTORY_MAX_POINTS", 256))
+        self.lowest_days = max(0, _env_int("PRICE_LOWEST_DAYS", 0))
+        self._store = (store or get_store()) if enabled else None
+
+    # ---- internals -------------------------------------------------------
+
+    def _load(self, product_id):
+        rows = self._store.query(
+            "SELECT ts, prices, posted_prices FROM price_history WHERE product_id = ?", (product_id,)
+        )
+        if not rows:
+            return None
+        ts_blob, prices_blob, posted_blob = rows[0]
+        return _unpack(ts_blob, "I"), _unpack(prices_blob, "i"), _unpack(posted_blob, "i")
+
+    @staticmethod
+    def _point(prices, index):
+        return tuple(prices[index * _WIDTH:(index + 1) * _WIDTH])
+
+    def _trim(self, ts, prices, now):
+        """Drops old change points, keeping the one still in effect at the cutoff."""
+        cutoff = now - self.retention_days * _DAY
+        start = 0
+        while start + 1 < len(ts) and ts[start + 1] <= cutoff:
+            start += 1
+        start = max(start, len(ts) - self.max_points)
+        if start:
+            del ts[:start]
+            del prices[:start * _WIDTH]
+
+    # ---- recording -------------------------------------------------------
+
+    def record(self, product_id, price=None, old_price=None, pix_price=None, at=None) -> bool:
+        """
+        Stores one observation (prices as float or BRL strings). Returns True
+        when it opened a new change point.
+        """
+        if not product_id or self._store is None:
+            return False
+        point = tuple(
+            _MISSING if cents is None else cents
+            for cents in (to_cents(price), to_cents(old_price), to_cents(pix_price))
+        )
+        if point == (_MISSING,) * _WIDTH:
+            return False
+        now = int(at or time.time())
+        try:
+            with self._store.transaction() as conn:
+                row = conn.execute(
+                    "SELECT ts, prices FROM price_history WHERE product_id = ?", (product_id,)
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO price_history (product_id, ts, prices, last_seen) VALUES (?, ?, ?, ?)",
+                        (product_id, _pack([now], "I"), _pack(point, "i"), now),
+                    )
+                    return True
+                ts, prices = _unpack(row[0], "I"), _unpack(row[1], "i")
+                if ts and self._point(prices, len(ts) - 1) == point:
+                    conn.execute("UPDATE price_history SET last_seen = ? WHERE product_id = ?", (now, product_id))
+                    return False
+                ts.append(now)
+                prices.extend(point)
+                self._trim(ts, prices, now)
+                conn.execute(
+                    "UPDATE price_history SET ts = ?, prices = ?, last_seen = ? WHERE product_id = ?",
+                    (_pack(ts, "I"), _pack(prices, "i"), now, product_id),
+                )
+                return True
+        except Exception as e:
+            log(f"Erro ao gravar preço de {product_id}: {e}")
+            return False
+
+    def mark_posted(self, product_id):
+        """Remembers the current prices as the ones of the last post."""
+        if not product_id or self._store is None:
+            return
+        try:
+            with self._store.transaction() as conn:
+                row = conn.execute(
+                    "SELECT ts, prices FROM price_history WHERE product_id = ?", (product_id,)
+                ).fetchone()
+                if row is None:
+                    return
+                ts, prices = _unpack(row[0], "I"), _unpack(row[1], "i")
+                if not ts:
+                    return
+                conn.execute(
+                    "UPDATE price_history SET posted_at = ?, posted_prices = ? WHERE product_id = ?",
+                    (int(time.time()), _pack(self._point(prices, len(ts) - 1), "i"), product_id),
+                )
+        except Exception as e:
+            log(f"Erro ao marcar envio de {product_id}: {e}")
+
+    # ---- queries ---------------------------------------------------------
+
+    def last_price(self, product_id):
+        """Current payable price (reais) or None."""
+        if not product_id or self._store is None:
+            return None
+        series = self._load(product_id)
+        if not series or not series[0]:
+            return None
+        cents = _effective(self._point(series[1], len(series[0]) - 1))
+        return cents / 100 if cents is not None else None
+
+    def lowest_in(self, product_id, days: int):
+        """Lowest payable price (reais) in effect during the last `days` days, or None."""
+        if not product_id or self._store is None:
+            return None
+        series = self._load(product_id)
+        if not series or not series[0]:
+            return None
+        ts, prices, _ = series
+        cutoff = time.time() - days * _DAY
+        lowest = None
+        for index in range(len(ts) - 1, -1, -1):
+            cents = _effective(self._point(prices, index))
+            if cents is not None and (lowest is None or cents < lowest):
+                lowest = cents
+            if ts[index] <= cutoff:
+                break  # este ponto já valia no início da janela
+        return lowest / 100 if lowest is not None else None
+
+    def was_posted(self, product_id) -> bool:
+        """True when a post of `product_id` was recorded (its repost is decided by `post_decision`)."""
+        if not product_id or self._store is None:
+            return False
+        series = self._load(product_id)
+        return bool(series and series[2])
+
+    def changed_since_last_post(self, product_id) -> bool:
+        """True unless the product was posted and its prices are still the same."""
+        if not product_id or self._store is None:
+            return True
+        series = self._load(product_id)
+        if not series or not series[0] or not series[2]:
+            return True
+        ts, prices, posted = series
+        return self._point(prices, len(ts) - 1) != tuple(posted)
+
+    def post_key(self, product_id):
+        """
+        Outbox idempotency key of a post at the latest recorded prices
+        ("kabum:123@15990,19990,-1"): the same offer is never queued twice,
+        while a repost at new prices is not mistaken for a duplicate.
+        """
+        if not product_id or self._store is None:
+            return product_id
+        series = self._load(product_id)
+        if not series or not series[0]:
+            return product_id
+        point = self._point(series[1], len(series[0]) - 1)
+        return f"{product_id}@{','.join(str(cents) for cents in point)}"
+
+    def post_decision(self, product_id):
+        """
+        (ok, reason) for posting `product_id` at its latest recorded price:
+        refuses reposting an unchanged price and, with PRICE_LOWEST_DAYS,
+        prices above the lowest of that window.
+        """
+        if not product_id or self._store is None:
+            return True, None
+        if not self.changed_since_last_post(product_id):
+            return False, "preço igual ao do último envio"
+        if self.lowest_days:
+            current = self.last_price(product_id)
+            lowest = self.lowest_in(product_id, self.lowest_days)
+            if current is not None and lowest is not None and current > lowest:
+                return False, f"R$ {current:.2f} acima do menor preço em {self.lowest_days} dias (R$ {lowest:.2f})"
+        return True, None
@@ -0,0 +1,96 @@
+import re
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+def _query(url: str) -> dict:
+    try:
+        return parse_qs(urlparse(url).query)
+    except Exception:
+        return {}
+
+
+def extract_asin(url: str):
+    # Common patterns: /dp/ASIN, /gp/product/ASIN, or query param pd_rd_i=ASIN
+    m = re.search(r"/dp/([A-Z0-9]{10})(?:[/?]|$)", url)
+    if m:
+        return m.group(1)
+    m = re.search(r"/gp/product/([A-Z0-9]{10})(?:[/?]|$)", url)
+    if m:
+        return m.group(1)
+    q = _query(url)
+    if "pd_rd_i" in q and q["pd_rd_i"]:
+        cand = q["pd_rd_i"][0]
+        if re.fullmatch(r"[A-Z0-9]{10}", cand):
+            return cand
+    return None
+
+
+def extract_mlb_id(url: str):
+    """
+    Mercado Livre ID from a product URL.
+
+    Item (listing) IDs win over catalog IDs because the same catalog page can
+    point to different sellers: `wid`/`item_id` in the query string or
+    `/MLB-123...` paths give "MLB123...", `/p/MLB123...` gives "p/MLB123...".
+    """
+    # wid=MLB123, item_id=MLB123 ou pdp_filters=item_id:MLB123
+    try:
+        query = unquote(urlparse(url).query)
+    except Exception:
+        query = ""
+    m = re.search(r"(?:wid|item_id)[=:]MLB-?(\d+)", query, re.IGNORECASE)
+    if m:
+        return f"MLB{m.group(1)}"
+
+    path = urlparse(url).path if url else ""
+    m = re.search(r"/p/MLB-?(\d+)", path, re.IGNORECASE)
+    if m:
+        return f"p/MLB{m.group(1)}"
+    m = re.search(r"MLB-?(\d{6,})", path, re.IGNORECASE)
+    if m:
+        return f"MLB{m.group(1)}"
+    return None
+
+
+def extract_kabum_id(url: str):
+    m = re.search(r"/produto/(\d+)", url or "")
+    return m.group(1) if m else None
+
+
+def extract_shopee_id(url: str):
+    """Shopee "shopid.itemid" from `...-i.<shop>.<item>` or `/product/<shop>/<item>` URLs."""
+    path = urlparse(url).path if url else ""
+    m = re.search(r"-i\.(\d+)\.(\d+)", path)
+    if m:
+        return f"{m.group(1)}.{m.group(2)}"
+    m = re.search(r"/product/(\d+)/(\d+)", path)
+    if m:
+        return f"{m.group(1)}.{m.group(2)}"
+    return None
+
+
+_EXTRACTORS = {
+    "amazon": extract_asin,
+    "ml": extract_mlb_id,
+    "kabum": extract_kabum_id,
+    "shopee": extract_shopee_id,
+}
+
+
+def canonical_id(retailer: str, url: str):
+    """
+    Stable key for a product, e.g. "amazon:B0ABCDEF12" or "kabum:123456".
+
+    Returns None when the URL carries no recognizable ID (ad/tracking links);
+    those items simply skip the listing-time check.
+    """
+    if not url:
+        return None
+    extractor = _EXTRACTORS.get(retailer)
+    if extractor is None:
+        raise ValueError(f"Varejista desconhecido: {retailer}")
+    try:
+        product_id = extractor(url)
+    except Exception:
+        return None
+    return f"{retailer}:{product_id}" if product_id else None
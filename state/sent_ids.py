@@ -0,0 +1,67 @@
+import os
+import time
+
+from state.store import get_store
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [SentIds] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class SentIds:
+    """
+    Persistent set of canonical product IDs that were already posted.
+
+    Checked at listing time, so an already-sent product never costs a page
+    load. IDs live in the shared state store (`sent_ids` table, one row per
+    ID with the time it was sent); the oldest ones are dropped past the
+    size cap. `legacy_path` is the old JSON file, imported on first use.
+
+    With `revisit=True` an ID only matches for SENT_IDS_REVISIT_HOURS after
+    it was sent. Past that the product is opened again, so the scrapers
+    that keep a price history record its current price and let
+    `PriceHistory.post_decision` decide on a repost (unchanged price =>
+    skipped). Without a price history behind it (Shopee) IDs never expire.
+
+    Env knobs:
+    - SENT_IDS_MAX           (default: 50000)
+    - SENT_IDS_REVISIT_HOURS (default: 24)
+    """
+
+    def __init__(self, scope, enabled=True, legacy_path=None, store=None, revisit=False):
+        self.scope = scope
+        self.enabled = enabled
+        self.max_size = max(1, _env_int("SENT_IDS_MAX", 50000))
+        self.revisit = max(1, _env_int("SENT_IDS_REVISIT_HOURS", 24)) * 3600 if revisit else 0
+        self._store = None
+        if enabled:
+            self._store = store or get_store()
+            if legacy_path:
+                self._store.import_legacy("sent_ids", scope, legacy_path)
+
+    def __contains__(self, product_id) -> bool:
+        if not product_id or self._store is None:
+            return False
+        since = time.time() - self.revisit if self.revisit else 0.0
+        return self._store.has_sent_id(self.scope, product_id, since)
+
+    def __len__(self) -> int:
+        return self._store.count_sent_ids(self.scope) if self._store is not None else 0
+
+    def add(self, product_id):
+        """Records a sent product (no-op for None or when disabled)."""
+        if not product_id or self._store is None:
+            return
+        try:
+            self._store.add_sent_id(self.scope, product_id, self.max_size)
+        except Exception as e:
+            log(f"Erro ao salvar ID enviado {product_id}: {e}")
@@ -0,0 +1,416 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [StateStore] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS used_urls (
+    scope   TEXT NOT NULL,
+    url     TEXT NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (scope, url)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sent_products (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope      TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    product_id TEXT,
+    sent_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sent_products_scope ON sent_products (scope, id);
+CREATE TABLE IF NOT EXISTS sent_ids (
+    scope      TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    sent_at    REAL NOT NULL,
+    PRIMARY KEY (scope, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sent_ids_age ON sent_ids (scope, sent_at);
+CREATE TABLE IF NOT EXISTS fuzzy_names (
+    id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    name  TEXT NOT NULL,
+    norm  TEXT NOT NULL,
+    bands TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fuzzy_names_scope ON fuzzy_names (scope, id);
+CREATE TABLE IF NOT EXISTS price_history (
+    product_id    TEXT PRIMARY KEY,
+    ts            BLOB NOT NULL,
+    prices        BLOB NOT NULL,
+    last_seen     INTEGER NOT NULL,
+    posted_at     INTEGER,
+    posted_prices BLOB
+);
+CREATE TABLE IF NOT EXISTS telegram_file_ids (
+    bot_id    TEXT NOT NULL,
+    url       TEXT NOT NULL,
+    file_id   TEXT NOT NULL,
+    cached_at REAL NOT NULL,
+    PRIMARY KEY (bot_id, url)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key           TEXT PRIMARY KEY,
+    tokens        REAL NOT NULL,
+    updated       REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS outbox (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    key           TEXT NOT NULL UNIQUE,
+    label         TEXT,
+    message       TEXT NOT NULL,
+    image_url     TEXT,
+    photo_by_url  INTEGER NOT NULL DEFAULT 0,
+    telegram_bot  TEXT,
+    telegram_chat TEXT,
+    telegram_done INTEGER NOT NULL DEFAULT 0,
+    whatsapp      TEXT NOT NULL DEFAULT '[]',
+    status        TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    next_attempt  REAL NOT NULL,
+    lease_until   REAL NOT NULL DEFAULT 0,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt);
+"""
+
+
+class StateStore:
+    """
+    Run state of every scraper in one embedded SQLite database.
+
+    Replaces the JSON files that were rewritten on every save: rows are
+    inserted incrementally, multi-statement updates run in one transaction
+    and WAL mode lets the PM2 processes read while another one writes.
+    Each scraper keeps its rows under its own `scope` ("ml", "kabum",
+    "kabum_teste", "amazon", "shp").
+
+    Tables:
+    - used_urls:     listing URLs already visited in the current rotation
+    - sent_products: names/URLs that were posted (history)
+    - sent_ids:      canonical product IDs that were posted
+    - fuzzy_names:   normalized names + LSH bands of the FuzzyIndex
+    - price_history: packed price series per canonical product ID (PriceHistory)
+    - telegram_file_ids: Telegram file_id of each uploaded image URL, per bot
+    - rate_buckets:  token buckets shared by the senders of every process
+    - outbox:        rendered messages and per-channel delivery state (delivery.outbox)
+
+    Legacy JSON files are imported once per scope (`import_legacy`).
+
+    Env knobs:
+    - STATE_DB_PATH         (default: scraper_state.db)
+    - STATE_BUSY_TIMEOUT_MS (default: 10000) => wait for another process' lock
+    - STATE_HISTORY_MAX     (default: 50000) => sent_products rows kept per scope
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("STATE_DB_PATH", "scraper_state.db")
+        self.busy_timeout_ms = max(0, _env_int("STATE_BUSY_TIMEOUT_MS", 10000))
+        self.history_max = max(1, _env_int("STATE_HISTORY_MAX", 50000))
+        self._local = threading.local()
+        # executescript faz COMMIT implícito, então roda fora de transaction()
+        self._conn().executescript(_SCHEMA)
+
+    # ---- connection / transactions ---------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 não compartilha conexões entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Atomic block: BEGIN IMMEDIATE takes the write lock up front, so a
+        read-modify-write (e.g. URL rotation) cannot interleave with another
+        process. Nested blocks join the outer transaction.
+        """
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def query(self, sql: str, params=()) -> list:
+        """Runs a read-only statement outside of any write lock."""
+        return self._conn().execute(sql, params).fetchall()
+
+    # ---- legacy JSON import ----------------------------------------------
+
+    def import_legacy(self, kind: str, scope: str, path: str):
+        """
+        Imports an old JSON file into `kind` ("used_urls", "sent_products",
+        "sent_ids", or "fuzzy_names" from a JSON-lines index) the first time
+        `scope` is used. The file is left in place.
+        """
+        if kind not in ("used_urls", "sent_products", "sent_ids", "fuzzy_names"):
+            raise ValueError(f"Tipo de estado desconhecido: {kind}")
+        key = f"imported:{kind}:{scope}"
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return
+            data = None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if kind == "fuzzy_names":
+                        data = [line for line in f if line.strip()]
+                    else:
+                        data = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (ValueError, OSError) as e:
+                log(f"Ignorando {path} ilegível: {e}")
+
+            count = 0
+            now = time.time()
+            if kind == "used_urls" and isinstance(data, list):
+                rows = [(scope, str(url), now) for url in data]
+                conn.executemany("INSERT OR IGNORE INTO used_urls VALUES (?, ?, ?)", rows)
+                count = len(rows)
+            elif kind == "sent_products" and isinstance(data, list):
+                # Histórico antigo da Shopee guarda as ofertas inteiras (dict): vale a URL
+                names = [entry.get("url") if isinstance(entry, dict) else entry for entry in data]
+                rows = [(scope, name, now) for name in names if isinstance(name, str) and name]
+                conn.executemany(
+                    "INSERT INTO sent_products (scope, name, sent_at) VALUES (?, ?, ?)", rows
+                )
+                count = len(rows)
+            elif kind == "sent_ids" and isinstance(data, dict):
+                rows = []
+                for product_id, sent_at in data.items():
+                    try:
+                        rows.append((scope, str(product_id), float(sent_at)))
+                    except (TypeError, ValueError):
+                        continue
+                conn.executemany("INSERT OR IGNORE INTO sent_ids VALUES (?, ?, ?)", rows)
+                count = len(rows)
+            elif kind == "fuzzy_names" and data:
+                rows = []
+                for line in data:
+                    try:
+                        entry = json.loads(line)
+                        rows.append((scope, entry["name"], entry["norm"], json.dumps(entry["bands"])))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # linha truncada por queda do processo
+                conn.executemany(
+                    "INSERT INTO fuzzy_names (scope, name, norm, bands) VALUES (?, ?, ?, ?)", rows
+                )
+                count = len(rows)
+
+            conn.execute("INSERT INTO meta VALUES (?, ?)", (key, str(now)))
+        if count:
+            log(f"{count} registro(s) de {path} importados ({kind}/{scope})")
+
+    # ---- rotation --------------------------------------------------------
+
+    def used_urls(self, scope: str) -> set:
+        rows = self._conn().execute("SELECT url FROM used_urls WHERE scope = ?", (scope,))
+        return {row[0] for row in rows}
+
+    def mark_used(self, scope: str, urls):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO used_urls VALUES (?, ?, ?)", [(scope, url, now) for url in urls]
+            )
+
+    def reset_rotation(self, scope: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM used_urls WHERE scope = ?", (scope,))
+
+    # ---- sent products ---------------------------------------------------
+
+    def recent_sent(self, scope: str, limit: int) -> list:
+        """The `limit` most recently sent names/URLs of `scope`, oldest first."""
+        rows = self._conn().execute(
+            "SELECT name FROM sent_products WHERE scope = ? ORDER BY id DESC LIMIT ?", (scope, limit)
+        ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def add_sent(self, scope: str, name: str, product_id=None):
+        """Appends one sent product (single INSERT; old rows past the cap are dropped)."""
+        if not name:
+            return
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO sent_products (scope, name, product_id, sent_at) VALUES (?, ?, ?, ?)",
+                (scope, name, product_id, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM sent_products WHERE scope = ? AND id <= "
+                "(SELECT id FROM sent_products WHERE scope = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (scope, scope, self.history_max),
+            )
+
+    # ---- sent IDs --------------------------------------------------------
+
+    def has_sent_id(self, scope: str, product_id: str, since: float = 0.0) -> bool:
+        """True when `product_id` was sent at or after `since` (epoch seconds; 0 = ever)."""
+        row = self._conn().execute(
+            "SELECT 1 FROM sent_ids WHERE scope = ? AND product_id = ? AND sent_at >= ?",
+            (scope, product_id, since),
+        ).fetchone()
+        return row is not None
+
+    def count_sent_ids(self, scope: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sent_ids WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def add_sent_id(self, scope: str, product_id: str, max_size: int):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sent_ids VALUES (?, ?, ?)", (scope, product_id, time.time()))
+            excess = self.count_sent_ids(scope) - max_size
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM sent_ids WHERE scope = ? AND product_id IN "
+                    "(SELECT product_id FROM sent_ids WHERE scope = ? ORDER BY sent_at LIMIT ?)",
+                    (scope, scope, excess),
+                )
+
+    # ---- fuzzy index -----------------------------------------------------
+
+    def fuzzy_entries(self, scope: str):
+        """(id, name, norm, bands) rows of `scope`, oldest first."""
+        rows = self._conn().execute(
+            "SELECT id, name, norm, bands FROM fuzzy_names WHERE scope = ? ORDER BY id", (scope,)
+        )
+        for row_id, name, norm, bands in rows:
+            try:
+                yield row_id, name, norm, json.loads(bands)
+            except ValueError:
+                continue
+
+    def add_fuzzy(self, scope: str, name: str, norm: str, bands) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO fuzzy_names (scope, name, norm, bands) VALUES (?, ?, ?, ?)",
+                (scope, name, norm, json.dumps(bands)),
+            )
+            return cursor.lastrowid
+
+    def trim_fuzzy(self, scope: str, keep_from_id: int):
+        """Drops the entries of `scope` older than row `keep_from_id`."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM fuzzy_names WHERE scope = ? AND id < ?", (scope, keep_from_id))
+
+    # ---- telegram file ids -----------------------------------------------
+
+    def get_file_id(self, bot_id: str, url: str):
+        rows = self.query("SELECT file_id FROM telegram_file_ids WHERE bot_id = ? AND url = ?", (bot_id, url))
+        return rows[0][0] if rows else None
+
+    def put_file_id(self, bot_id: str, url: str, file_id: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO telegram_file_ids VALUES (?, ?, ?, ?)", (bot_id, url, file_id, time.time())
+            )
+
+    def forget_file_id(self, bot_id: str, url: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM telegram_file_ids WHERE bot_id = ? AND url = ?", (bot_id, url))
+
+    def prune_file_ids(self, older_than: float) -> int:
+        """Drops file_ids cached before `older_than` (epoch seconds); returns how many."""
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM telegram_file_ids WHERE cached_at < ?", (older_than,)).rowcount
+
+    # ---- rate limiting ---------------------------------------------------
+
+    def reserve_tokens(self, buckets, now=None) -> float:
+        """
+        Takes one token from every `(key, rate, capacity)` bucket in a single
+        write transaction, so concurrent processes queue up behind each other.
+        Returns how long the caller must wait before sending (tokens may go
+        negative: each reservation gets its own later slot).
+        """
+        now = time.time() if now is None else now
+        wait = 0.0
+        with self.transaction() as conn:
+            for key, rate, capacity in buckets:
+                row = conn.execute(
+                    "SELECT tokens, updated, blocked_until FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated, blocked_until = row if row else (capacity, now, 0.0)
+                # Depois de um 429, `updated` fica no fim do bloqueio: o bucket só volta a encher a partir dali
+                if now > updated:
+                    tokens = min(capacity, tokens + (now - updated) * rate)
+                    updated = now
+                tokens -= 1
+                slot = (0.0 if tokens >= 0 else -tokens / rate) + (updated - now)
+                wait = max(wait, slot, blocked_until - now)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?)", (key, tokens, updated, blocked_until)
+                )
+        return wait
+
+    def block_bucket(self, key: str, until: float):
+        """
+        Nothing is reserved from `key` before the wall-clock time `until`,
+        and the bucket restarts empty then, so the reservations queued
+        behind the block are spaced at its rate instead of all firing at
+        `until`.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated, blocked_until) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "tokens = CASE WHEN excluded.updated > updated THEN MIN(tokens, 0) ELSE tokens END, "
+                "updated = MAX(updated, excluded.updated), "
+                "blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                (key, until, until),
+            )
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> StateStore:
+    """Process-wide store (created on first use)."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = StateStore()
+        return _STORE
@@ -0,0 +1,202 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [WPP-Endpoints] {message}", flush=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Respostas que indicam que não há um WPPConnect atrás da URL (proxy/porta errada)
+ENDPOINT_DOWN_STATUSES = (404, 502, 503, 504)
+
+
+class EndpointDown(Exception):
+    """The server at a base URL did not answer (connection error or ENDPOINT_DOWN_STATUSES)."""
+
+
+class _Health:
+    __slots__ = ("score", "failures", "open_until", "latency")
+
+    def __init__(self):
+        self.score = 0.5
+        self.failures = 0
+        self.open_until = 0.0
+        self.latency = None
+
+
+class EndpointResolver:
+    """
+    Picks the WPPConnect base URL to talk to.
+
+    The last base URL that answered is reused for every request, so a send
+    in steady state is a single HTTP call. Only when it fails are the other
+    candidates probed, all at once, and the first one that answers becomes
+    the preferred URL. Each URL keeps a health score (moving average of its
+    outcomes) used to order the probes, and a circuit breaker: after
+    WPP_ENDPOINT_FAILURES consecutive failures it is skipped for a cooldown
+    that doubles on every new trip (up to WPP_ENDPOINT_MAX_COOLDOWN_SECONDS).
+
+    `candidates()` returns the configured base URLs; `probe(base_url)`
+    returns a truthy value when the server there is reachable.
+
+    Env knobs:
+    - WPP_ENDPOINT_FAILURES             (default: 2)
+    - WPP_ENDPOINT_COOLDOWN_SECONDS     (default: 30)
+    - WPP_ENDPOINT_MAX_COOLDOWN_SECONDS (default: 600)
+    """
+
+    def __init__(self, candidates, probe):
+        self._candidates = candidates
+        self._probe = probe
+        self.failure_threshold = max(1, _env_int("WPP_ENDPOINT_FAILURES", 2))
+        self.cooldown = max(1.0, _env_float("WPP_ENDPOINT_COOLDOWN_SECONDS", 30.0))
+        self.max_cooldown = max(self.cooldown, _env_float("WPP_ENDPOINT_MAX_COOLDOWN_SECONDS", 600.0))
+        self._lock = threading.Lock()
+        self._health = {}
+        self._preferred = None
+
+    def _state(self, base_url) -> _Health:
+        health = self._health.get(base_url)
+        if health is None:
+            health = _Health()
+            self._health[base_url] = health
+        return health
+
+    # ---- outcomes --------------------------------------------------------
+
+    def report_success(self, base_url, latency=None, prefer=True):
+        with self._lock:
+            health = self._state(base_url)
+            health.score = health.score * 0.7 + 0.3
+            health.failures = 0
+            health.open_until = 0.0
+            if latency is not None:
+                health.latency = latency
+            if prefer and self._preferred != base_url:
+                log(f"Usando {base_url}")
+                self._preferred = base_url
+
+    def report_failure(self, base_url):
+        with self._lock:
+            health = self._state(base_url)
+            health.score *= 0.7
+            health.failures += 1
+            trips = health.failures - self.failure_threshold
+            if trips >= 0:
+                cooldown = min(self.max_cooldown, self.cooldown * (2 ** min(trips, 10)))
+                health.open_until = time.monotonic() + cooldown
+                log(f"{base_url} falhou {health.failures}x; ignorado por {cooldown:.0f}s")
+            if self._preferred == base_url:
+                self._preferred = None
+
+    # ---- selection -------------------------------------------------------
+
+    def ordered(self) -> list:
+        """Candidates whose circuit is closed, preferred first, then by health score."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [c for c in self._candidates() if self._state(c).open_until <= now]
+            candidates.sort(key=lambda c: (c != self._preferred, -self._state(c).score))
+            return candidates
+
+    def current(self):
+        """The preferred base URL, or None when it is unknown or cooling down."""
+        with self._lock:
+            preferred = self._preferred
+            if preferred and self._state(preferred).open_until <= time.monotonic():
+                return preferred
+            return None
+
+    def discover(self, exclude=()):
+        """
+        Probes the healthy candidates in parallel and returns the first base
+        URL that answers (None if none does). Slower probes finish in the
+        background and still update the health scores.
+        """
+        candidates = [c for c in self.ordered() if c not in exclude]
+        if not candidates:
+            log("Nenhum endpoint do WPPConnect disponível (todos em cooldown)")
+            return None
+
+        winner = []
+        found = threading.Event()
+        pending = [len(candidates)]
+        done_lock = threading.Lock()
+
+        def probe(base_url):
+            started = time.monotonic()
+            try:
+                ok = bool(self._probe(base_url))
+            except Exception:
+                ok = False
+            with done_lock:
+                first = ok and not winner
+                if first:
+                    winner.append(base_url)
+            if ok:
+                # Só o primeiro a responder vira o preferido; os demais só somam saúde
+                self.report_success(base_url, time.monotonic() - started, prefer=first)
+            else:
+                self.report_failure(base_url)
+            with done_lock:
+                pending[0] -= 1
+                if first or not pending[0]:
+                    found.set()
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(candidates))
+        for base_url in candidates:
+            executor.submit(probe, base_url)
+        executor.shutdown(wait=False)
+        found.wait()
+        return winner[0] if winner else None
+
+    def resolve(self):
+        """Preferred base URL, discovering one when needed."""
+        return self.current() or self.discover()
+
+    def run(self, fn):
+        """
+        Calls `fn(base_url)` on the preferred endpoint. If it raises
+        EndpointDown the endpoint is penalized, the others are probed and
+        `fn` is retried once on the winner. Returns `fn`'s result; raises
+        EndpointDown when no endpoint answers.
+        """
+        base_url = self.resolve()
+        if base_url is None:
+            raise EndpointDown("nenhum endpoint do WPPConnect respondeu")
+        try:
+            result = fn(base_url)
+        except EndpointDown:
+            self.report_failure(base_url)
+        else:
+            self.report_success(base_url)
+            return result
+
+        retry_url = self.discover(exclude=(base_url,))
+        if retry_url is None:
+            raise EndpointDown("nenhum endpoint do WPPConnect respondeu")
+        try:
+            result = fn(retry_url)
+        except EndpointDown:
+            self.report_failure(retry_url)
+            raise
+        self.report_success(retry_url)
+        return result
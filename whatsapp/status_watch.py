@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+def log(message):
+    """Função para logging simples"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [WPP-Status] {message}", flush=True)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def default_status_file() -> str:
+    """tokens/server_status.json next to wpp_server.js (project root)."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(root, "tokens", "server_status.json")
+
+
+class ConnectionStateWatcher:
+    """
+    In-memory WhatsApp connection state, pushed by the bridge server.
+
+    A daemon thread keeps a Server-Sent Events stream open on
+    /api/<session>/events and stores every state the server publishes, so
+    reading the state costs nothing. The stream is retried with backoff
+    while it is down.
+
+    The server's status file (re-read only when its mtime changes) stands
+    in for the stream only while the server answers HTTP but has no stream
+    to offer (an older bridge without /events). When the server cannot be
+    reached the file is stale by definition (a killed bridge leaves
+    CONNECTED behind), so `state()` is None and callers fall back to
+    probing over HTTP, which reports OFFLINE.
+
+    `base_url()` returns the server to connect to (or None), `parse_state`
+    maps a status payload to CONNECTED/QRCODE/...
+
+    Env knobs:
+    - WPP_STATUS_PUSH               (default: true)
+    - WPP_STATUS_FILE               (default: tokens/server_status.json in the project root)
+    - WPP_STATUS_RETRY_MAX_SECONDS  (default: 60) => stream reconnect backoff cap
+    """
+
+    def __init__(self, base_url, events_path, parse_state, status_file=None):
+        self._base_url = base_url
+        self._events_path = events_path
+        self._parse_state = parse_state
+        self.enabled = os.getenv("WPP_STATUS_PUSH", "true").lower() == "true"
+        self.status_file = status_file or os.getenv("WPP_STATUS_FILE") or default_status_file()
+        self.retry_max = max(1.0, _env_float("WPP_STATUS_RETRY_MAX_SECONDS", 60.0))
+        self._lock = threading.Lock()
+        self._started = False
+        self._streaming = False
+        self._stream_state = None
+        self._use_file = False
+        self._file_state = None
+        self._file_mtime = None
+        self._http = requests.Session()
+        self._http.trust_env = False
+
+    def start(self):
+        with self._lock:
+            if self._started or not self.enabled:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="wpp-status", daemon=True).start()
+
+    def state(self):
+        """Latest pushed state (stream first, then status file), or None if unknown."""
+        self.start()
+        with self._lock:
+            if self._streaming and self._stream_state:
+                return self._stream_state
+            use_file = self._use_file
+        return self._read_file() if use_file else None
+
+    # ---- sources ---------------------------------------------------------
+
+    def _set_stream_state(self, state):
+        with self._lock:
+            previous = self._stream_state
+            self._stream_state = state
+        if state != previous:
+            log(f"Estado do WhatsApp: {state}")
+
+    def _read_file(self):
+        try:
+            mtime = os.path.getmtime(self.status_file)
+        except OSError:
+            return None
+        if mtime != self._file_mtime:
+            try:
+                with open(self.status_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                state = self._parse_state(data) if isinstance(data, dict) else ""
+            except (OSError, ValueError):
+                return self._file_state
+            self._file_state = state or None
+            self._file_mtime = mtime
+        return self._file_state
+
+    def _stream(self, base_url):
+        url = f"{base_url}{self._events_path}"
+        # Timeout de leitura acima do keep-alive de 25s do servidor
+        with self._http.get(url, stream=True, timeout=(3, 60), headers={"Accept": "text/event-stream"}) as r:
+            r.raise_for_status()
+            event, data = None, []
+            # chunk_size=1: cada evento é entregue assim que chega, sem esperar encher um buffer
+            for line in r.iter_lines(chunk_size=1, decode_unicode=True):
+                if line is None:
+                    continue
+                if not line:
+                    if event in (None, "status") and data:
+                        try:
+                            payload = json.loads("\n".join(data))
+                        except ValueError:
+                            payload = None
+                        if isinstance(payload, dict):
+                            with self._lock:
+                                self._streaming = True
+                            self._set_stream_state(self._parse_state(payload) or None)
+                    event, data = None, []
+                elif line.startswith(":"):
+                    continue
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+
+    def _run(self):
+        delay = 1.0
+        warned = False
+        while True:
+            base_url = None
+            try:
+                base_url = self._base_url()
+            except Exception:
+                pass
+            use_file = False
+            if base_url:
+                started = time.monotonic()
+                try:
+                    self._stream(base_url)
+                except requests.HTTPError as e:
+                    # O servidor respondeu, só não tem o stream: o arquivo dele é confiável
+                    # (502/503/504 vêm de um proxy com a ponte fora do ar)
+                    use_file = e.response is not None and e.response.status_code < 500
+                    if not warned:
+                        fallback = "usando o arquivo de status" if use_file else "consultando por HTTP"
+                        log(f"Stream de status indisponível ({str(e)[:120]}); {fallback}")
+                        warned = True
+                except Exception as e:
+                    # Avisa uma vez por queda, não a cada nova tentativa
+                    if not warned:
+                        log(f"Servidor do WhatsApp inacessível ({str(e)[:120]}); consultando por HTTP")
+                        warned = True
+                with self._lock:
+                    if self._streaming:
+                        warned = False
+                    self._streaming = False
+                    self._use_file = use_file
+                if time.monotonic() - started > 30:
+                    delay = 1.0  # a conexão durou: recomeça o backoff
+            else:
+                with self._lock:
+                    self._use_file = False
+            # Servidor vivo sem stream: o arquivo de status é a fonte; fora do ar: state() é None
+            time.sleep(delay)
+            delay = min(self.retry_max, delay * 2)
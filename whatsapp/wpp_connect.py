@@ -4,6 +4,9 @@ import requests
 import sys
 from dotenv import load_dotenv
 
+from whatsapp.endpoints import ENDPOINT_DOWN_STATUSES, EndpointDown, EndpointResolver
+from whatsapp.status_watch import ConnectionStateWatcher
+
 # Garante que as variáveis do .env estão disponíveis
 load_dotenv()
 
@@ -65,11 +68,81 @@ def _debug(msg: str):
     if _wpp_debug_enabled():
         log(msg)
 
+def wpp_connect_timeout() -> float:
+    """
+    Seconds to wait for the TCP connection to a WPPConnect base URL; a dead
+    candidate fails this fast instead of holding the whole request timeout.
+
+    Env knobs:
+    - WPP_CONNECT_TIMEOUT_SECONDS (default: 3)
+    """
+    try:
+        return max(0.5, float(os.getenv("WPP_CONNECT_TIMEOUT_SECONDS", "3")))
+    except Exception:
+        return 3.0
+
+def _request(method: str, url: str, read_timeout: float, down_statuses=ENDPOINT_DOWN_STATUSES, **kwargs):
+    """
+    HTTP call to the WPPConnect server. Raises EndpointDown when nothing
+    (or not our server) answers at `url`; a read timeout is not an endpoint
+    failure, since the message may already be on its way.
+    """
+    try:
+        r = _HTTP.request(
+            method, url, headers=_wpp_headers(), timeout=(wpp_connect_timeout(), read_timeout), **kwargs
+        )
+    except requests.exceptions.ReadTimeout:
+        raise
+    except requests.exceptions.RequestException as e:
+        raise EndpointDown(str(e)) from e
+    if r.status_code in down_statuses:
+        raise EndpointDown(f"HTTP {r.status_code} via {url}")
+    return r
+
+def _probe_health(base_url: str):
+    """Reachability probe used by the endpoint resolver: GET /health."""
+    r = _request("GET", f"{base_url}/health", 5)
+    return r.status_code == 200
+
+_RESOLVER = EndpointResolver(_candidate_base_urls, _probe_health)
+
+def wpp_endpoints() -> EndpointResolver:
+    """Shared resolver that remembers the working base URL and its health."""
+    return _RESOLVER
+
+def _parse_state(data) -> str:
+    """Maps a status/health payload to CONNECTED, QRCODE, another state, or ''."""
+    # Tenta extrair o estado de vários campos possíveis
+    state = str(data.get("state") or data.get("internalStatus") or data.get("sessionStatus") or "").upper()
+    # "status" (success/ok) means the HTTP endpoint responded, not that WhatsApp is connected.
+    is_ready = data.get("isReady") is True
+
+    # Treat only "connected-like" states as ready. STARTING/SYNCING are not ready for sending.
+    valid_states = ("CONNECTED", "INCHAT", "ISLOGGED", "MAIN", "NORMAL", "QRCODE")
+    if state in valid_states or is_ready:
+        if state == "QRCODE":
+            return "QRCODE"
+        return "CONNECTED"
+    return state
+
+_WATCHER = ConnectionStateWatcher(
+    _RESOLVER.resolve,
+    f"/api/{os.getenv('WPP_SESSION', 'default') or 'default'}/events",
+    _parse_state,
+)
+
 def wpp_check_connection_state():
     """
-    Verifica o status do WhatsApp via API HTTP.
+    Verifica o status do WhatsApp.
     Retorna 'CONNECTED' se estiver ok, ou o estado retornado pela API.
+
+    O estado empurrado pelo servidor (SSE, ou o arquivo de status como
+    reserva) é lido da memória; só sem ele a API HTTP é consultada.
     """
+    pushed = _WATCHER.state()
+    if pushed:
+        return pushed
+
     session = os.getenv("WPP_SESSION", "default")
 
     # Try cheap/compatible endpoints first.
@@ -79,41 +152,40 @@ def wpp_check_connection_state():
         "/api/status",
     ]
 
-    for base_url in _candidate_base_urls():
+    def read_state(base_url):
         for path in paths:
             url = f"{base_url}{path}"
             try:
-                r = _HTTP.get(url, headers=_wpp_headers(), timeout=5, allow_redirects=True)
-                if r.status_code != 200:
-                    _debug(f"Status check non-200 via {url}: {r.status_code}")
-                    continue
-
-                try:
-                    data = r.json()
-                except Exception:
-                    _debug(f"Status check non-JSON via {url}")
-                    return "CONNECTED"
-
-                # Tenta extrair o estado de vários campos possíveis
-                state = str(data.get("state") or data.get("internalStatus") or data.get("sessionStatus") or "").upper()
-                # "status" (success/ok) means the HTTP endpoint responded, not that WhatsApp is connected.
-                is_ready = data.get("isReady") is True
-
-                # Treat only "connected-like" states as ready. STARTING/SYNCING are not ready for sending.
-                valid_states = ("CONNECTED", "INCHAT", "ISLOGGED", "MAIN", "NORMAL", "QRCODE")
-                if state in valid_states or is_ready:
-                    if state == "QRCODE":
-                        return "QRCODE"
-                    return "CONNECTED"
-
-                if state:
-                    return state
-
-                _debug(f"Status check empty-state via {url}: {str(data)[:200]}")
-            except Exception as e:
+                r = _request("GET", url, 5, allow_redirects=True)
+            except EndpointDown:
+                if path == paths[0]:
+                    raise
+                _debug(f"Status check failed via {url}")
+                continue
+            except requests.exceptions.RequestException as e:
                 _debug(f"Status check failed via {url}: {e}")
                 continue
-    return 'OFFLINE'
+            if r.status_code != 200:
+                _debug(f"Status check non-200 via {url}: {r.status_code}")
+                continue
+
+            try:
+                data = r.json()
+            except Exception:
+                _debug(f"Status check non-JSON via {url}")
+                return "CONNECTED"
+
+            state = _parse_state(data) if isinstance(data, dict) else ""
+            if state:
+                return state
+            _debug(f"Status check empty-state via {url}: {str(data)[:200]}")
+        return None
+
+    try:
+        return _RESOLVER.run(read_state) or 'OFFLINE'
+    except EndpointDown as e:
+        _debug(f"Status check failed: {e}")
+        return 'OFFLINE'
 
 
 def wpp_wait_until_connected():
@@ -154,6 +226,174 @@ def wpp_wait_until_connected():
 
         time.sleep(interval)
 
+def wpp_before_run() -> bool:
+    """
+    Called by the scrapers before a run when WhatsApp delivery is enabled.
+
+    By default a disconnected WhatsApp no longer stops scraping: the run
+    goes on, Telegram is published as usual and the WhatsApp messages wait
+    in the delivery outbox until the server reports CONNECTED again.
+    Returns False only when the run should be skipped.
+
+    Env knobs:
+    - WPP_BLOCK_WHEN_OFFLINE (default: false) => old behaviour, wait via wpp_wait_until_connected()
+    """
+    if os.getenv("WPP_BLOCK_WHEN_OFFLINE", "false").lower() == "true":
+        return wpp_wait_until_connected()
+
+    state = wpp_check_connection_state()
+    if state != "CONNECTED":
+        log(f"⚠️ WhatsApp não está pronto (state={state}). Seguindo com o scraping; mensagens do WhatsApp ficam na fila.")
+    return True
+
+def wpp_base_urls() -> list:
+    """Base URLs of the WPPConnect server that are not cooling down, working one first."""
+    return _RESOLVER.ordered()
+
+
+def wpp_build_request(dest, message, image_url=None):
+    """
+    Returns (url_path, payload) for sending `message` to one destination,
+    or None when the destination is empty/invalid.
+    """
+    session = os.getenv("WPP_SESSION", "default") or "default"
+
+    dest = (dest or "").strip()
+    if not dest:
+        return None
+
+    # Constrói o payload básico
+    if image_url:
+        url_path = f"/api/{session}/send-file"
+        payload = {"caption": message, "url": image_url, "fileName": "image.jpg"}
+    else:
+        url_path = f"/api/{session}/send-message"
+        payload = {"message": message}
+
+    # Define o destinatário:
+    # - grupos: use groupId (ex: 120...@g.us)
+    # - destinos com '@' (ex: canais/newsletter): mande como "phone" sem mutilar o sufixo
+    # - telefones: extrai apenas dígitos
+    if "@g.us" in dest:
+        payload.update({"groupId": dest})
+    elif "@" in dest:
+        payload.update({"phone": dest})
+    else:
+        phone = "".join(filter(str.isdigit, dest))
+        if not phone:
+            log(f"⚠️ Destino inválido ignorado: {dest}")
+            return None
+        payload.update({"phone": phone})
+
+    return url_path, payload
+
+
+def wpp_build_batch_request(destinations, message, image_url=None):
+    """
+    Returns (url_path, payload, targets) for one send-batch call, where
+    `targets` are the valid destinations in the order of the server's
+    results, or None when no destination is valid.
+    """
+    session = os.getenv("WPP_SESSION", "default") or "default"
+
+    targets = []
+    chat_ids = []
+    for dest in destinations or []:
+        request = wpp_build_request(dest, message, image_url)
+        if request is None:
+            continue
+        single = request[1]
+        targets.append(dest.strip())
+        chat_ids.append(single.get("groupId") or single.get("phone"))
+    if not targets:
+        return None
+
+    if image_url:
+        payload = {"caption": message, "url": image_url, "fileName": "image.jpg"}
+    else:
+        payload = {"message": message}
+    payload["destinations"] = chat_ids
+    return f"/api/{session}/send-batch", payload, targets
+
+
+def _send_one(dest, message, image_url=None) -> bool:
+    """Sends to a single destination through send-message/send-file."""
+    request = wpp_build_request(dest, message, image_url)
+    if request is None:
+        return False
+    url_path, payload = request
+    dest = dest.strip()
+
+    def post(base_url):
+        url = f"{base_url}{url_path}"
+        log(f"Enviando para {dest} via {url}...")
+        return _request("POST", url, 45, json=payload)
+
+    # Um único POST no endpoint que já funcionou; os outros só são sondados se ele cair
+    try:
+        r = _RESOLVER.run(post)
+    except (EndpointDown, requests.exceptions.RequestException) as e:
+        log(f"❌ Falha ao enviar para {dest}: {str(e)[:200]}")
+        return False
+
+    if r.status_code == 200:
+        log(f"✅ Sucesso ao enviar para {dest}")
+        return True
+    log(f"❌ Falha ao enviar para {dest}: HTTP {r.status_code}: {r.text[:200]}")
+    return False
+
+
+def wpp_send_batch(destinations, message, image_url=None) -> dict:
+    """
+    Sends one message (or image + caption) to every destination with a
+    single request to /send-batch; the server downloads the media once and
+    fans out with bounded concurrency. Returns {destination: bool}.
+
+    Servers without the batch route (HTTP 404) get one request per
+    destination, as before.
+    """
+    request = wpp_build_batch_request(destinations, message, image_url)
+    if request is None:
+        log("Nenhum destino válido fornecido para envio.")
+        return {}
+    url_path, payload, targets = request
+    # O servidor só responde depois de atender todos os destinos
+    read_timeout = 45 + 15 * len(targets)
+
+    def post(base_url):
+        url = f"{base_url}{url_path}"
+        log(f"Enviando lote para {len(targets)} destino(s) via {url}...")
+        # 404 aqui é servidor antigo sem a rota de lote, não endpoint errado
+        return _request("POST", url, read_timeout, down_statuses=(502, 503, 504), json=payload)
+
+    try:
+        r = _RESOLVER.run(post)
+    except (EndpointDown, requests.exceptions.RequestException) as e:
+        log(f"❌ Falha ao enviar lote: {str(e)[:200]}")
+        return {dest: False for dest in targets}
+
+    if r.status_code == 404:
+        _debug("Servidor sem /send-batch; enviando um destino por vez")
+        return {dest: _send_one(dest, message, image_url) for dest in targets}
+    if r.status_code != 200:
+        log(f"❌ Falha ao enviar lote: HTTP {r.status_code}: {r.text[:200]}")
+        return {dest: False for dest in targets}
+
+    try:
+        results = r.json().get("results") or []
+    except Exception:
+        results = []
+    outcome = {}
+    for index, dest in enumerate(targets):
+        result = results[index] if index < len(results) else {}
+        outcome[dest] = result.get("ok") is True
+        if outcome[dest]:
+            log(f"✅ Sucesso ao enviar para {dest}")
+        else:
+            log(f"❌ Falha ao enviar para {dest}: {str(result.get('error') or 'sem resposta')[:200]}")
+    return outcome
+
+
 def wpp_send_message(destinations, message, image_url=None):
     """
     Envia mensagem direta para a API WPPConnect com suporte a fallback.
@@ -162,67 +402,12 @@ def wpp_send_message(destinations, message, image_url=None):
         log("Nenhum destino fornecido para envio.")
         return False
 
-    session = os.getenv("WPP_SESSION", "default")
-    
-    if not session:
+    if not os.getenv("WPP_SESSION", "default"):
         log("ERRO: WPP_SESSION não configurado no .env. Usando 'default'.")
-        session = 'default'
-
-    success_count = 0
-    
-    for dest in destinations:
-        try:
-            # Constrói o payload básico
-            payload = {}
-            if image_url:
-                url_path = f"/api/{session}/send-file"
-                payload = {"caption": message, "url": image_url, "fileName": "image.jpg"}
-            else:
-                url_path = f"/api/{session}/send-message"
-                payload = {"message": message}
-
-            dest = (dest or "").strip()
-            if not dest:
-                continue
 
-            # Define o destinatário:
-            # - grupos: use groupId (ex: 120...@g.us)
-            # - destinos com '@' (ex: canais/newsletter): mande como "phone" sem mutilar o sufixo
-            # - telefones: extrai apenas dígitos
-            if "@g.us" in dest:
-                payload.update({"groupId": dest})
-            elif "@" in dest:
-                payload.update({"phone": dest})
-            else:
-                phone = "".join(filter(str.isdigit, dest))
-                if phone:
-                    payload.update({"phone": phone})
-                else:
-                    log(f"⚠️ Destino inválido ignorado: {dest}")
-                    continue
-
-            sent = False
-            last_err = None
-            for base_url in _candidate_base_urls():
-                url = f"{base_url}{url_path}"
-                log(f"Enviando para {dest} via {url}...")
-                try:
-                    r = _HTTP.post(url, headers=_wpp_headers(), json=payload, timeout=45)
-                    if r.status_code == 200:
-                        success_count += 1
-                        log(f"✅ Sucesso ao enviar para {dest}")
-                        sent = True
-                        break
-                    last_err = f"HTTP {r.status_code}: {r.text[:200]}"
-                    _debug(f"Send failed via {url}: {last_err}")
-                except requests.exceptions.RequestException as e:
-                    last_err = str(e)
-                    _debug(f"Send network error via {url}: {e}")
-
-            if not sent and last_err:
-                log(f"❌ Falha ao enviar para {dest}: {last_err[:200]}")
-
-        except Exception as e:
-            log(f"🚨 Erro inesperado ao processar envio para {dest}: {e}")
-            
-    return success_count > 0
+    try:
+        results = wpp_send_batch(destinations, message, image_url)
+    except Exception as e:
+        log(f"🚨 Erro inesperado ao processar envio: {e}")
+        return False
+    return any(results.values())
@@ -3,6 +3,7 @@ const express = require('express');
 const bodyParser = require('body-parser');
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
 const axios = require('axios');
 const FormData = require('form-data');
 require('dotenv').config();
@@ -37,16 +38,33 @@ const statusFilePath = path.join(tokensPath, 'server_status.json');
 // Garante que a pasta base existe
 if (!fs.existsSync(tokensPath)) fs.mkdirSync(tokensPath, { recursive: true });
 
+// Clientes inscritos em /api/:session/events (Server-Sent Events)
+const statusSubscribers = new Set();
+let lastStatusEvent = null;
+
+function publishStatus(data) {
+    lastStatusEvent = data;
+    const frame = `event: status\ndata: ${JSON.stringify(data)}\n\n`;
+    for (const res of statusSubscribers) {
+        try {
+            res.write(frame);
+        } catch (e) {
+            statusSubscribers.delete(res);
+        }
+    }
+}
+
 function updateStatusFile(extra = {}) {
+    const data = {
+        status: 'success',
+        state: status,
+        internalStatus: status,
+        updatedAt: new Date().toISOString(),
+        session: SESSION_NAME,
+        ...extra
+    };
+    publishStatus(data);
     try {
-        const data = {
-            status: 'success',
-            state: status,
-            internalStatus: status,
-            updatedAt: new Date().toISOString(),
-            session: SESSION_NAME,
-            ...extra
-        };
         fs.writeFileSync(statusFilePath, JSON.stringify(data, null, 2));
     } catch (e) {
         log('ERROR', `Erro ao salvar status file: ${e.message}`);
@@ -188,6 +206,7 @@ async function initializeClient() {
 
                 if (statusSession === 'desconnectedMobile' || statusSession === 'notLogged') {
                     status = 'DISCONNECTED';
+                    updateStatusFile();
                     log('WARN', 'WhatsApp desconectado no celular.');
                 }
 
@@ -196,6 +215,7 @@ async function initializeClient() {
                     client = null;
                     status = 'DISCONNECTED';
                     starting = false;
+                    updateStatusFile();
                     setTimeout(initializeClient, 10000);
                 }
             },
@@ -228,6 +248,7 @@ async function initializeClient() {
         log('ERROR', `Erro na inicialização: ${error.message}`);
         status = 'DISCONNECTED';
         client = null;
+        updateStatusFile();
         starting = false;
         setTimeout(initializeClient, 10000);
     }
@@ -308,7 +329,8 @@ app.post('/api/:session/send-file', async (req, res) => {
 
     try {
         const dest = groupId || (phone.includes('@') ? phone : `${phone}@c.us`);
-        const result = await client.sendFile(dest, url, fileName || 'arquivo', caption || '');
+        const media = await resolveMedia(url);
+        const result = await client.sendFile(dest, media, fileName || 'arquivo', caption || '');
         res.json({ status: 'success', result });
     } catch (e) {
         log('ERROR', `Falha envio arquivo: ${e.message}`);
@@ -316,6 +338,257 @@ app.post('/api/:session/send-file', async (req, res) => {
     }
 });
 
+// Envio em lote: uma mensagem/mídia para N destinos numa única requisição.
+// A mídia é baixada uma vez só e os destinos são atendidos por uma fila com
+// concorrência limitada (WPP_BATCH_CONCURRENCY).
+const BATCH_CONCURRENCY = Math.max(1, parseInt(process.env.WPP_BATCH_CONCURRENCY || '3', 10) || 3);
+const MEDIA_MAX_BYTES = Math.max(1, parseInt(process.env.WPP_MEDIA_MAX_BYTES || String(16 * 1024 * 1024), 10) || 16 * 1024 * 1024);
+
+function toChatId(destination) {
+    const dest = String(destination || '').trim();
+    if (!dest) return null;
+    if (dest.includes('@')) return dest;
+    const digits = dest.replace(/\D/g, '');
+    return digits ? `${digits}@c.us` : null;
+}
+
+// Cache de mídia: cada URL é baixada uma vez e servida de um LRU em memória,
+// com cópia em disco (chave = sha1 da URL) que sobrevive a reinícios.
+// Ambos expiram por TTL e são podados por tamanho.
+const MEDIA_CACHE_DIR = process.env.WPP_MEDIA_CACHE_DIR || path.join(__dirname, 'media_cache');
+const MEDIA_CACHE_TTL_MS = Math.max(1, parseInt(process.env.WPP_MEDIA_CACHE_TTL_SECONDS || '86400', 10) || 86400) * 1000;
+const MEDIA_CACHE_MEMORY_BYTES = Math.max(0, parseInt(process.env.WPP_MEDIA_CACHE_MEMORY_BYTES || String(64 * 1024 * 1024), 10) || 0);
+const MEDIA_CACHE_DISK_BYTES = Math.max(0, parseInt(process.env.WPP_MEDIA_CACHE_DISK_BYTES || String(512 * 1024 * 1024), 10) || 0);
+
+class MediaCache {
+    constructor() {
+        this.memory = new Map(); // hash -> { buffer, mime, fetchedAt } (ordem de inserção = LRU)
+        this.memoryBytes = 0;
+        this.inflight = new Map(); // hash -> Promise (downloads simultâneos da mesma URL viram um só)
+        this.hits = 0;
+        this.misses = 0;
+        try {
+            fs.mkdirSync(MEDIA_CACHE_DIR, { recursive: true });
+        } catch (e) {
+            log('WARN', `Cache de mídia em disco indisponível: ${e.message}`);
+        }
+    }
+
+    key(url) {
+        return crypto.createHash('sha1').update(url).digest('hex');
+    }
+
+    fresh(entry) {
+        return entry && Date.now() - entry.fetchedAt < MEDIA_CACHE_TTL_MS;
+    }
+
+    remember(hash, entry) {
+        const old = this.memory.get(hash);
+        if (old) {
+            this.memory.delete(hash);
+            this.memoryBytes -= old.buffer.length;
+        }
+        if (entry.buffer.length > MEDIA_CACHE_MEMORY_BYTES) return;
+        this.memory.set(hash, entry);
+        this.memoryBytes += entry.buffer.length;
+        for (const [oldest, value] of this.memory) {
+            if (this.memoryBytes <= MEDIA_CACHE_MEMORY_BYTES) break;
+            this.memory.delete(oldest);
+            this.memoryBytes -= value.buffer.length;
+        }
+    }
+
+    readDisk(hash) {
+        try {
+            const meta = JSON.parse(fs.readFileSync(path.join(MEDIA_CACHE_DIR, `${hash}.json`), 'utf8'));
+            if (!this.fresh(meta)) return null;
+            const buffer = fs.readFileSync(path.join(MEDIA_CACHE_DIR, `${hash}.bin`));
+            return { buffer, mime: meta.mime, fetchedAt: meta.fetchedAt };
+        } catch (e) {
+            return null;
+        }
+    }
+
+    writeDisk(hash, url, entry) {
+        if (!MEDIA_CACHE_DISK_BYTES || entry.buffer.length > MEDIA_CACHE_DISK_BYTES) return;
+        try {
+            fs.writeFileSync(path.join(MEDIA_CACHE_DIR, `${hash}.bin`), entry.buffer);
+            fs.writeFileSync(
+                path.join(MEDIA_CACHE_DIR, `${hash}.json`),
+                JSON.stringify({ url, mime: entry.mime, fetchedAt: entry.fetchedAt })
+            );
+            this.pruneDisk();
+        } catch (e) {
+            log('WARN', `Falha ao gravar mídia em cache: ${e.message}`);
+        }
+    }
+
+    pruneDisk() {
+        // Remove expirados e, se ainda passar do limite, os mais antigos
+        const now = Date.now();
+        const files = [];
+        let total = 0;
+        for (const name of fs.readdirSync(MEDIA_CACHE_DIR)) {
+            if (!name.endsWith('.bin')) continue;
+            const file = path.join(MEDIA_CACHE_DIR, name);
+            try {
+                const stat = fs.statSync(file);
+                files.push({ hash: name.slice(0, -4), size: stat.size, mtime: stat.mtimeMs });
+                total += stat.size;
+            } catch (e) {}
+        }
+        files.sort((a, b) => a.mtime - b.mtime);
+        for (const f of files) {
+            if (now - f.mtime < MEDIA_CACHE_TTL_MS && total <= MEDIA_CACHE_DISK_BYTES) break;
+            for (const ext of ['.bin', '.json']) {
+                try { fs.unlinkSync(path.join(MEDIA_CACHE_DIR, `${f.hash}${ext}`)); } catch (e) {}
+            }
+            total -= f.size;
+        }
+    }
+
+    async download(url) {
+        const resp = await axios.get(url, {
+            responseType: 'arraybuffer',
+            timeout: 30000,
+            maxContentLength: MEDIA_MAX_BYTES
+        });
+        const mime = (resp.headers['content-type'] || 'image/jpeg').split(';')[0].trim();
+        return { buffer: Buffer.from(resp.data), mime, fetchedAt: Date.now() };
+    }
+
+    async get(url) {
+        const hash = this.key(url);
+        let entry = this.memory.get(hash);
+        if (this.fresh(entry)) {
+            // Reinsere para marcar como usado recentemente
+            this.memory.delete(hash);
+            this.memory.set(hash, entry);
+            this.hits++;
+            return entry;
+        }
+        entry = this.readDisk(hash);
+        if (entry) {
+            this.remember(hash, entry);
+            this.hits++;
+            return entry;
+        }
+
+        if (!this.inflight.has(hash)) {
+            this.misses++;
+            const pending = this.download(url)
+                .then((fetched) => {
+                    this.remember(hash, fetched);
+                    this.writeDisk(hash, url, fetched);
+                    return fetched;
+                })
+                .finally(() => this.inflight.delete(hash));
+            this.inflight.set(hash, pending);
+        }
+        return this.inflight.get(hash);
+    }
+
+    async dataUri(url) {
+        const entry = await this.get(url);
+        return `data:${entry.mime};base64,${entry.buffer.toString('base64')}`;
+    }
+}
+
+const mediaCache = new MediaCache();
+
+// Mídia local para envio; se o download falhar, devolve a própria URL (comportamento antigo)
+async function resolveMedia(url) {
+    try {
+        return await mediaCache.dataUri(url);
+    } catch (e) {
+        log('WARN', `Falha ao baixar mídia (${e.message}); enviando pela URL`);
+        return url;
+    }
+}
+
+async function runLimited(items, limit, worker) {
+    const results = new Array(items.length);
+    let next = 0;
+    async function lane() {
+        while (next < items.length) {
+            const index = next++;
+            results[index] = await worker(items[index], index);
+        }
+    }
+    await Promise.all(Array.from({ length: Math.min(limit, items.length) }, lane));
+    return results;
+}
+
+app.post('/api/:session/send-batch', async (req, res) => {
+    if (status !== 'CONNECTED' || !client) {
+        return res.status(400).json({
+            status: 'error',
+            message: status === 'QRCODE' ? 'Necessário ler QR Code' : 'WhatsApp não está conectado',
+            state: status
+        });
+    }
+
+    const { destinations, message, url, caption, fileName } = req.body;
+    if (!Array.isArray(destinations) || destinations.length === 0 || (!message && !url)) {
+        return res.status(400).json({ status: 'error', message: 'Parâmetros insuficientes' });
+    }
+
+    // Baixa a mídia uma vez (ou pega do cache); se falhar, cada envio usa a URL como antes
+    const media = url ? await resolveMedia(url) : null;
+
+    const started = Date.now();
+    const results = await runLimited(destinations, BATCH_CONCURRENCY, async (destination) => {
+        const chatId = toChatId(destination);
+        if (!chatId) {
+            return { destination, ok: false, error: 'Destino inválido' };
+        }
+        try {
+            if (url) {
+                await client.sendFile(chatId, media, fileName || 'arquivo', caption || message || '');
+            } else {
+                await client.sendText(chatId, message);
+            }
+            return { destination, ok: true };
+        } catch (e) {
+            log('ERROR', `Falha envio em lote para ${chatId}: ${e.message}`);
+            return { destination, ok: false, error: e.toString() };
+        }
+    });
+
+    const sent = results.filter((r) => r.ok).length;
+    log('INFO', `Lote: ${sent}/${results.length} enviados em ${Date.now() - started}ms`);
+    res.json({
+        status: sent === results.length ? 'success' : (sent > 0 ? 'partial' : 'error'),
+        results
+    });
+});
+
+// Push do estado da conexão (SSE): manda o estado atual ao conectar e cada mudança depois,
+// com um comentário de keep-alive a cada 25s para proxies não derrubarem a conexão.
+app.get('/api/:session/events', (req, res) => {
+    res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive'
+    });
+    res.write('retry: 5000\n\n');
+    const current = lastStatusEvent || {
+        status: 'success',
+        state: status,
+        internalStatus: status,
+        updatedAt: new Date().toISOString(),
+        session: SESSION_NAME
+    };
+    res.write(`event: status\ndata: ${JSON.stringify(current)}\n\n`);
+    statusSubscribers.add(res);
+
+    const keepAlive = setInterval(() => res.write(': keep-alive\n\n'), 25000);
+    req.on('close', () => {
+        clearInterval(keepAlive);
+        statusSubscribers.delete(res);
+    });
+});
+
 app.get('/api/:session/check-connection-state', (req, res) => {
     res.json({ status: 'success', state: status });
 });
@@ -331,6 +604,8 @@ app.get('/api-docs', (req, res) => {
             '/api/:session/status',
             '/api/:session/send-message',
             '/api/:session/send-file',
+            '/api/:session/send-batch',
+            '/api/:session/events',
             '/api/:session/check-connection-state'
         ]
     });
@@ -338,7 +613,18 @@ app.get('/api-docs', (req, res) => {
 
 // Rota de saúde simples
 app.get('/health', (req, res) => {
-    res.json({ status: 'ok', server: 'WPPConnect Bridge', session: SESSION_NAME, state: status });
+    res.json({
+        status: 'ok',
+        server: 'WPPConnect Bridge',
+        session: SESSION_NAME,
+        state: status,
+        mediaCache: {
+            entries: mediaCache.memory.size,
+            memoryBytes: mediaCache.memoryBytes,
+            hits: mediaCache.hits,
+            misses: mediaCache.misses
+        }
+    });
 });
 
 app.get('/', (req, res) => {